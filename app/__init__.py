@@ -10,6 +10,7 @@ from application_roles.model_utils import get_db
 from . import constants
 from .pipelines import models as pipeline_models
 from .pipelines import pipeline_bp, run_bp
+from .pipelines.services import preload_run_state_types
 from .workflows import workflow_bp, workflow_pipeline_bp, workflow_run_bp
 from .tasks import make_celery
 
@@ -31,6 +32,48 @@ CONFIG_VARS = (
     constants.S3_REGION_NAME,
     constants.S3_BUCKET,
     constants.S3_PRESIGNED_TIMEOUT,
+    constants.WORKER_CACHE_DIR,
+    constants.WORKER_GIT_CACHE_SIZE,
+    constants.WORKER_IMAGE_CACHE_TTL,
+    constants.WORKER_INPUT_CACHE_SIZE,
+    constants.WORKER_DOWNLOAD_THREADS,
+    constants.WORKER_DIRECT_UPLOADS,
+    constants.WORKER_UPLOAD_THREADS,
+    constants.WORKER_ARTIFACT_BUNDLE_SIZE,
+    constants.WORKER_RUN_TIMEOUT,
+    constants.WORKER_SLOTS,
+    constants.RUN_STARVATION_TIMEOUT,
+    constants.CELERY_LONG_JOBS,
+    constants.MAX_RUN_TIMEOUT,
+    constants.RUN_HEARTBEAT_TIMEOUT,
+    constants.WORKER_CONSOLE_LIMIT,
+    constants.WORKER_CONCURRENCY,
+    constants.WORKER_EARLY_UPLOADS,
+)
+
+# Configurable variables that are booleans:
+BOOL_CONFIG_VARS = (
+    constants.WORKER_DIRECT_UPLOADS,
+    constants.CELERY_LONG_JOBS,
+    constants.WORKER_EARLY_UPLOADS,
+)
+
+# Configurable variables that are integers:
+INT_CONFIG_VARS = (
+    constants.MAX_CONTENT_LENGTH,
+    constants.WORKER_GIT_CACHE_SIZE,
+    constants.WORKER_IMAGE_CACHE_TTL,
+    constants.WORKER_INPUT_CACHE_SIZE,
+    constants.WORKER_DOWNLOAD_THREADS,
+    constants.WORKER_UPLOAD_THREADS,
+    constants.WORKER_ARTIFACT_BUNDLE_SIZE,
+    constants.WORKER_RUN_TIMEOUT,
+    constants.WORKER_SLOTS,
+    constants.RUN_STARVATION_TIMEOUT,
+    constants.MAX_RUN_TIMEOUT,
+    constants.RUN_HEARTBEAT_TIMEOUT,
+    constants.WORKER_CONSOLE_LIMIT,
+    constants.WORKER_CONCURRENCY,
 )
 
 
@@ -48,16 +91,21 @@ def create_app(config=None):
     if config is not None:
         app.config.from_mapping(config)
 
-    if app.config[constants.MAX_CONTENT_LENGTH] is not None:
-        app.config[constants.MAX_CONTENT_LENGTH] = int(
-            app.config[constants.MAX_CONTENT_LENGTH]
-        )
+    for var in BOOL_CONFIG_VARS:
+        if isinstance(app.config[var], str):
+            app.config[var] = app.config[var].lower() in ("1", "true", "yes")
+
+    for var in INT_CONFIG_VARS:
+        if app.config[var] is not None:
+            app.config[var] = int(app.config[var])
 
     db.init_app(app)
     migrate = Migrate(app, db)
 
     celery = make_celery(app)
 
+    app.before_first_request(preload_run_state_types)
+
     app.register_blueprint(pipeline_bp, url_prefix="/v1/pipelines")
     app.register_blueprint(run_bp, url_prefix="/v1/pipelines")
     app.register_blueprint(workflow_bp, url_prefix="/v1/workflows")
@@ -0,0 +1,390 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import urllib
+import urllib.request
+from contextlib import ExitStack, contextmanager
+from os.path import join
+
+from celery.utils.log import get_task_logger
+
+# make the request lib mockable for testing:
+urllib_request = urllib.request
+
+logger = get_task_logger(__name__)
+
+# Size of the blocks input files are downloaded in:
+DOWNLOAD_BLOCK_SIZE = 1024 * 1024
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    """Hold an flock() on path (created if missing) for the duration.
+
+    Locks are shared between the worker processes of a host, so that concurrent
+    runs can safely use the same cache.
+    """
+    with open(path, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield lock
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def directory_size(path):
+    """ Return the total size in bytes of the files within a directory. """
+    size = 0
+    for (root, _, files) in os.walk(path):
+        for name in files:
+            file_path = join(root, name)
+            if not os.path.islink(file_path):
+                size += os.path.getsize(file_path)
+    return size
+
+
+def file_sha256(path):
+    """ Return the sha256 of a file's contents. """
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(DOWNLOAD_BLOCK_SIZE), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _cache_key(value):
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def _image_repo_digests(image):
+    """ Return the repository digests of a local docker image, or None. """
+    result = subprocess.run(
+        ["docker", "image", "inspect", "--format", "{{json .RepoDigests}}", image],
+        capture_output=True,
+    )
+    if result.returncode != 0:
+        return None
+
+    return json.loads(result.stdout) or []
+
+
+def docker_image_digest(image):
+    """Return the repository digest (name@sha256:...) of a local docker image.
+
+    Returns None for images without one, such as locally built images.
+    """
+    repo_digests = _image_repo_digests(image)
+    if not repo_digests:
+        return None
+
+    name = image.split("@")[0]
+    if ":" in name.rsplit("/", 1)[-1]:
+        name = name.rsplit(":", 1)[0]
+    for repo_digest in repo_digests:
+        if repo_digest.split("@")[0] == name:
+            return repo_digest
+    return repo_digests[0]
+
+
+class DockerImageCache:
+    """Pulls docker images only when they aren't known to be up to date.
+
+    A pulled image reference (such as python:3) is revalidated with the registry
+    once ttl seconds have passed since it was last pulled. References pinned to
+    a digest (name@sha256:...) can't change, and are only pulled when missing.
+    """
+
+    def __init__(self, directory, ttl):
+        self.directory = directory
+        self.ttl = ttl
+
+    def _is_fresh(self, image, pulled_path):
+        if _image_repo_digests(image) is None:
+            return False
+        if "@" in image:
+            return True
+        return (
+            os.path.exists(pulled_path)
+            and time.time() - os.path.getmtime(pulled_path) < self.ttl
+        )
+
+    def pull(self, executor, image):
+        """Pull an image unless the local copy is fresh.
+
+        Concurrent runs that need the same image wait for a single pull.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        key = _cache_key(image)
+        pulled_path = join(self.directory, f"{key}.pulled")
+
+        with file_lock(join(self.directory, f"{key}.lock")):
+            if self._is_fresh(image, pulled_path):
+                executor.update_run_output(f"Using cached image {image}")
+                return
+
+            executor.run(f"docker pull {image}", self.directory)
+            with open(pulled_path, "a"):
+                os.utime(pulled_path)
+
+
+class GitMirrorCache:
+    """Bare mirrors of pipeline repositories, keyed by repository URL.
+
+    Each run fetches only the new commits of a repository into its mirror, and
+    then clones the branch it needs from the mirror rather than the remote.
+    """
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+
+    def mirror_path(self, url):
+        return join(self.directory, f"{_cache_key(url)}.git")
+
+    def _lock_path(self, mirror):
+        return f"{mirror[:-len('.git')]}.lock"
+
+    def _update_mirror(self, executor, url, mirror):
+        if os.path.exists(mirror):
+            executor.run("git remote update --prune", mirror)
+            return
+
+        try:
+            executor.run(f"git clone --mirror {url} {mirror}", self.directory)
+        except Exception:
+            # don't leave a partial mirror behind for the next run to update.
+            shutil.rmtree(mirror, ignore_errors=True)
+            raise
+
+    def clone(self, executor, url, branch, destination):
+        """ Clone a branch of a repository into destination, via its mirror. """
+        os.makedirs(self.directory, exist_ok=True)
+        mirror = self.mirror_path(url)
+        lock_path = self._lock_path(mirror)
+
+        with file_lock(lock_path) as lock:
+            self._update_mirror(executor, url, mirror)
+
+            # Other runs may clone from the mirror now, but not update it:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            executor.run(
+                f"git clone --depth 1 --branch {branch} file://{mirror} {destination}",
+                self.directory,
+            )
+            # the lock file's modification time records when it was last used.
+            os.utime(lock_path)
+
+        self.evict(keep=mirror)
+
+    def evict(self, keep=None):
+        """Remove the least recently used mirrors until the cache fits in
+        max_size bytes.
+
+        Mirrors in use by other runs are skipped.
+        """
+        mirrors = [
+            join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".git")
+        ]
+        sizes = {mirror: directory_size(mirror) for mirror in mirrors}
+        total_size = sum(sizes.values())
+
+        mirrors.sort(key=lambda mirror: os.path.getmtime(self._lock_path(mirror)))
+        for mirror in mirrors:
+            if total_size <= self.max_size:
+                break
+            if mirror == keep:
+                continue
+
+            with open(self._lock_path(mirror), "a") as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+
+                logger.info("Evicting git mirror %s", mirror)
+                shutil.rmtree(mirror, ignore_errors=True)
+                total_size -= sizes[mirror]
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class InputFileCache:
+    """Input files downloaded by runs, stored by the sha256 of their contents.
+
+    Each URL (ignoring its query string, which for presigned URLs changes every
+    time) records the ETag/Last-Modified of its last download. Later downloads
+    are conditional requests: when the server reports the file is unchanged,
+    the cached copy is copied into place instead.
+
+    Runs get copies rather than hard links: the run's directory is made world
+    writable, and a shared inode would let one run's changes to its inputs
+    leak into the inputs of others.
+    """
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+
+    def _blob_path(self, sha256):
+        return join(self.directory, "blobs", sha256)
+
+    def _entry_path(self, url):
+        return join(self.directory, f"{_cache_key(url.split('?')[0])}.json")
+
+    def _lock_path(self, entry_path):
+        return f"{entry_path[:-len('.json')]}.lock"
+
+    def _blobs_lock_path(self):
+        return join(self.directory, "blobs.lock")
+
+    def _load_entry(self, entry_path):
+        """ Return the cache entry of a URL, if its cached copy is unmodified. """
+        if not os.path.exists(entry_path):
+            return None
+
+        with open(entry_path) as f:
+            entry = json.load(f)
+        blob_path = self._blob_path(entry["sha256"])
+        try:
+            stat = os.stat(blob_path)
+            if stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]:
+                return entry
+        except FileNotFoundError:
+            return None
+
+        logger.warning("Discarding modified cached input %s", entry["sha256"])
+        os.unlink(blob_path)
+        return None
+
+    def _download(self, response):
+        """ Save a response's body to a temporary file, return (path, sha256). """
+        hasher = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(
+            dir=join(self.directory, "tmp"), delete=False
+        ) as f:
+            try:
+                for block in iter(lambda: response.read(DOWNLOAD_BLOCK_SIZE), b""):
+                    hasher.update(block)
+                    f.write(block)
+            except Exception:
+                os.unlink(f.name)
+                raise
+
+        return (f.name, hasher.hexdigest())
+
+    def _store(self, download_path, sha256, headers):
+        """Move a download into the blobs, and return its cache entry.
+
+        (Callers hold the blobs lock, so that it isn't evicted meanwhile)
+        """
+        blob_path = self._blob_path(sha256)
+        if os.path.exists(blob_path):
+            os.unlink(download_path)
+        else:
+            os.replace(download_path, blob_path)
+
+        stat = os.stat(blob_path)
+        return {
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "sha256": sha256,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+
+    def fetch(self, url, destination):
+        """Download url to destination, using the cached copy when unchanged.
+
+        Concurrent runs that need the same URL wait for a single download.
+        """
+        os.makedirs(join(self.directory, "blobs"), exist_ok=True)
+        os.makedirs(join(self.directory, "tmp"), exist_ok=True)
+        entry_path = self._entry_path(url)
+
+        with file_lock(self._lock_path(entry_path)):
+            entry = self._load_entry(entry_path)
+            headers = {}
+            if entry is not None and entry["etag"] is not None:
+                headers["If-None-Match"] = entry["etag"]
+            if entry is not None and entry["last_modified"] is not None:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+            download = None
+            try:
+                request = urllib_request.Request(url, headers=headers)
+                with urllib_request.urlopen(request) as response:
+                    (download_path, sha256) = self._download(response)
+                    download = (download_path, sha256, response.headers)
+            except urllib.error.HTTPError as http_err:
+                if http_err.code != 304 or entry is None:
+                    raise
+
+            # Blobs can be shared by several URLs, or have no entry until it is
+            # written below: evict() only removes blobs while holding the
+            # blobs lock exclusively.
+            with file_lock(self._blobs_lock_path(), shared=True):
+                if download is not None:
+                    entry = self._store(*download)
+                    with open(entry_path, "w") as f:
+                        json.dump(entry, f)
+
+                # the entry's modification time records when it was last used.
+                os.utime(entry_path)
+                shutil.copyfile(self._blob_path(entry["sha256"]), destination)
+
+    def evict(self):
+        """Remove the least recently used files until the cache fits in
+        max_size bytes.
+
+        Files that another run is downloading are skipped, and fetch() waits
+        for the eviction to finish before storing or copying blobs.
+        """
+        with file_lock(self._blobs_lock_path()):
+            self._evict()
+
+    def _evict(self):
+        blob_dir = join(self.directory, "blobs")
+        sizes = {
+            name: os.path.getsize(join(blob_dir, name)) for name in os.listdir(blob_dir)
+        }
+        total_size = sum(sizes.values())
+
+        entries = {}
+        last_used = {}
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            entry_path = join(self.directory, name)
+            with open(entry_path) as f:
+                sha256 = json.load(f)["sha256"]
+            entries[entry_path] = sha256
+            last_used[sha256] = max(
+                last_used.get(sha256, 0), os.path.getmtime(entry_path)
+            )
+
+        for sha256 in sorted(sizes, key=lambda sha256: last_used.get(sha256, 0)):
+            if total_size <= self.max_size:
+                break
+
+            entry_paths = [path for (path, s) in entries.items() if s == sha256]
+            with ExitStack() as stack:
+                try:
+                    for entry_path in entry_paths:
+                        lock = stack.enter_context(
+                            open(self._lock_path(entry_path), "a")
+                        )
+                        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+
+                logger.info("Evicting cached input %s", sha256)
+                for entry_path in entry_paths:
+                    os.unlink(entry_path)
+                os.unlink(self._blob_path(sha256))
+                total_size -= sizes[sha256]
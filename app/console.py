@@ -0,0 +1,104 @@
+import shutil
+import tempfile
+from collections import deque
+from os.path import join
+
+
+class ConsoleCapture:
+    """Bounds the console output of a run that is held in memory.
+
+    The first head_size characters of each stream are passed on as they
+    arrive. After that only the last tail_size characters are kept, to be sent
+    (and replaced) as the run goes on (see tail()). Everything is also written to a log
+    file per stream, so that the full output of a truncated stream can be
+    uploaded as an artifact.
+    """
+
+    def __init__(self, head_size, tail_size):
+        self.head_size = head_size
+        self.tail_size = tail_size
+        # (created once there is output to log)
+        self.directory = None
+        self.closed = False
+        self._logs = {}
+        self._head_lengths = {}
+        self._tails = {}
+        self._tail_lengths = {}
+        self._omitted = {}
+
+    def log_path(self, name):
+        """ The log file of a stream. """
+        return join(self.directory, f"{name}.log")
+
+    def _log(self, name, text):
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix="openfido-console-")
+        if name not in self._logs:
+            self._logs[name] = open(self.log_path(name), "w", encoding="utf-8")
+        self._logs[name].write(text)
+
+    def write(self, name, text):
+        """Capture text written to a stream.
+
+        Returns the part of it within the head of the stream, to send now.
+        """
+        if len(text) == 0:
+            return text
+        self._log(name, text)
+
+        head_length = self._head_lengths.get(name, 0)
+        head = text[: max(self.head_size - head_length, 0)]
+        self._head_lengths[name] = head_length + len(head)
+
+        rest = text[len(head) :]
+        if len(rest) > 0:
+            tail = self._tails.setdefault(name, deque())
+            tail.append(rest)
+            length = self._tail_lengths.get(name, 0) + len(rest)
+            omitted = 0
+            while length > self.tail_size:
+                excess = length - self.tail_size
+                if len(tail[0]) <= excess:
+                    dropped = len(tail.popleft())
+                else:
+                    tail[0] = tail[0][excess:]
+                    dropped = excess
+                omitted += dropped
+                length -= dropped
+            self._tail_lengths[name] = length
+            self._omitted[name] = self._omitted.get(name, 0) + omitted
+
+        return head
+
+    def is_truncated(self, name):
+        """ Return True when some of a stream's output won't be sent. """
+        return self._omitted.get(name, 0) > 0
+
+    def tail(self, name):
+        """Return the kept tail of a stream.
+
+        Truncated tails start with a note of how much output was omitted.
+        """
+        text = "".join(self._tails.get(name, []))
+        if self.is_truncated(name):
+            note = (
+                f"\n... {self._omitted[name]} characters omitted "
+                f"(see the console/{name}.log artifact) ...\n"
+            )
+            text = note + text
+        return text
+
+    def flush(self):
+        """ Write buffered output to the log files. """
+        for log in self._logs.values():
+            log.flush()
+
+    def close(self):
+        """ Close and remove the log files. """
+        for log in self._logs.values():
+            log.close()
+        self._logs = {}
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+        self.closed = True
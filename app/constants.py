@@ -9,6 +9,96 @@ MAX_CONTENT_LENGTH = "MAX_CONTENT_LENGTH"
 WORKER_API_SERVER = "WORKER_API_SERVER"
 WORKER_API_TOKEN = "WORKER_API_TOKEN"
 S3_PRESIGNED_TIMEOUT = "S3_PRESIGNED_TIMEOUT"
+WORKER_CACHE_DIR = "WORKER_CACHE_DIR"
+WORKER_GIT_CACHE_SIZE = "WORKER_GIT_CACHE_SIZE"
+WORKER_IMAGE_CACHE_TTL = "WORKER_IMAGE_CACHE_TTL"
+WORKER_INPUT_CACHE_SIZE = "WORKER_INPUT_CACHE_SIZE"
+WORKER_DOWNLOAD_THREADS = "WORKER_DOWNLOAD_THREADS"
+WORKER_DIRECT_UPLOADS = "WORKER_DIRECT_UPLOADS"
+WORKER_UPLOAD_THREADS = "WORKER_UPLOAD_THREADS"
+WORKER_ARTIFACT_BUNDLE_SIZE = "WORKER_ARTIFACT_BUNDLE_SIZE"
+WORKER_RUN_TIMEOUT = "WORKER_RUN_TIMEOUT"
+WORKER_SLOTS = "WORKER_SLOTS"
+RUN_STARVATION_TIMEOUT = "RUN_STARVATION_TIMEOUT"
+CELERY_LONG_JOBS = "CELERY_LONG_JOBS"
+MAX_RUN_TIMEOUT = "MAX_RUN_TIMEOUT"
+RUN_HEARTBEAT_TIMEOUT = "RUN_HEARTBEAT_TIMEOUT"
+WORKER_CONSOLE_LIMIT = "WORKER_CONSOLE_LIMIT"
+WORKER_CONCURRENCY = "WORKER_CONCURRENCY"
+WORKER_EARLY_UPLOADS = "WORKER_EARLY_UPLOADS"
 
 # Application constants:
 CALLBACK_TIMEOUT = 100
+# Workers send streamed console output to the API at most every
+# CONSOLE_FLUSH_INTERVAL seconds, or sooner once CONSOLE_FLUSH_SIZE characters
+# have been buffered.
+CONSOLE_FLUSH_INTERVAL = 5
+CONSOLE_FLUSH_SIZE = 64 * 1024
+# Past the head of a stream, workers send its tail (replacing the tail they sent
+# before) at most every CONSOLE_TAIL_INTERVAL seconds, and once a run finishes.
+CONSOLE_TAIL_INTERVAL = 60
+# Lines of output (of up to CONSOLE_FLUSH_SIZE characters) read from a command
+# but not yet sent; once full, the command waits.
+CONSOLE_QUEUE_SIZE = 64
+# Maximum number of characters of console output stored in each
+# PipelineRunOutput row.
+CONSOLE_CHUNK_SIZE = 64 * 1024
+# Presigned artifact upload URLs expire after UPLOAD_PRESIGNED_TIMEOUT seconds.
+# Artifacts larger than UPLOAD_PART_SIZE bytes are uploaded in parts (S3
+# multipart uploads support at most UPLOAD_MAX_PARTS parts).
+UPLOAD_PRESIGNED_TIMEOUT = 6 * 60 * 60
+UPLOAD_PART_SIZE = 64 * 1024 * 1024
+UPLOAD_MAX_PARTS = 10000
+# List endpoints return pages of PAGE_LIMIT items by default (a 'limit' of at
+# most MAX_PAGE_LIMIT can be asked for), with the cursor of the next page in
+# their NEXT_CURSOR_HEADER header.
+PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Name of the archive workers bundle small output files into:
+ARTIFACT_BUNDLE_NAME = "outputs.tar.gz"
+# Workers share a pool of keep-alive connections to the API. Requests time out
+# when connecting or waiting for a response takes WORKER_API_TIMEOUT seconds,
+# and failed ones are retried up to WORKER_API_RETRIES times, waiting
+# WORKER_API_BACKOFF * 2^attempt seconds between attempts. Only the methods in
+# WORKER_API_IDEMPOTENT_METHODS are retried once they may have been received
+# (console PATCHes are: they write at explicit offsets); other requests are
+# only retried when they couldn't connect.
+#
+# Besides its WORKER_UPLOAD_THREADS, each run has WORKER_API_RUN_THREADS threads
+# that make requests (the run itself, its heartbeat, output watcher and
+# container watchdog): the pool keeps a connection for each of them, for every
+# run of the worker process.
+WORKER_API_RUN_THREADS = 4
+WORKER_API_TIMEOUT = 30
+WORKER_API_IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "DELETE", "PATCH")
+WORKER_API_RETRIES = 4
+WORKER_API_BACKOFF = 0.5
+WORKER_API_RETRY_STATUSES = (429, 502, 503, 504)
+# Uploads (of artifacts, or parts of them) may wait an extra second for their
+# response per WORKER_UPLOAD_MIN_RATE bytes uploaded.
+WORKER_UPLOAD_MIN_RATE = 256 * 1024
+# Workers sample the resource usage of a run's container every
+# CONTAINER_STATS_INTERVAL seconds.
+CONTAINER_STATS_INTERVAL = 5
+# While a run's container is running, workers check whether the run has been
+# cancelled every RUN_STATE_POLL_INTERVAL seconds.
+RUN_STATE_POLL_INTERVAL = 10
+# With early uploads, workers look for output files that haven't changed for
+# OUTPUT_WATCH_INTERVAL seconds (and upload them) while a container runs.
+OUTPUT_WATCH_INTERVAL = 10
+# Runs that don't fit in a worker's free slots are retried after
+# SLOT_RETRY_DELAY seconds (possibly by another worker). The slots of a host are
+# lock files in the SLOTS_DIRNAME directory of its temporary directory.
+SLOT_RETRY_DELAY = 60
+SLOTS_DIRNAME = "openfido-slots"
+# In long job mode (CELERY_LONG_JOBS) the broker redelivers a task that hasn't
+# been acknowledged VISIBILITY_TIMEOUT_MARGIN seconds after the longest run
+# could have ended (MAX_RUN_TIMEOUT), allowing time for its other phases.
+VISIBILITY_TIMEOUT_MARGIN = 60 * 60
+# Workers send a heartbeat for each of their runs every HEARTBEAT_INTERVAL
+# seconds. RUNNING runs without a heartbeat for RUN_HEARTBEAT_TIMEOUT seconds
+# are restarted by another worker, at most MAX_RUN_RESTARTS times before they
+# fail.
+HEARTBEAT_INTERVAL = 60
+MAX_RUN_RESTARTS = 2
@@ -0,0 +1,169 @@
+import json
+import re
+import subprocess
+import threading
+import time
+
+from celery.utils.log import get_task_logger
+from flask import current_app
+
+logger = get_task_logger(__name__)
+
+# Multipliers of the units in the sizes reported by 'docker stats':
+SIZE_UNITS = {
+    "b": 1,
+    "kb": 1000,
+    "mb": 1000 ** 2,
+    "gb": 1000 ** 3,
+    "tb": 1000 ** 4,
+    "kib": 1024,
+    "mib": 1024 ** 2,
+    "gib": 1024 ** 3,
+    "tib": 1024 ** 4,
+}
+
+
+def parse_size(value):
+    """ Convert a size reported by docker (such as '1.5MiB') to bytes. """
+    match = re.fullmatch(r"\s*([0-9.]+)\s*([a-zA-Z]+)\s*", value)
+    if match is None or match.group(2).lower() not in SIZE_UNITS:
+        raise ValueError(f"Unknown size: {value}")
+
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).lower()])
+
+
+def container_stats(name):
+    """Return the current resource usage of a running container, or None.
+
+    Returns a dict of the container's cpu_percent, memory_bytes, and cumulative
+    block_read_bytes and block_write_bytes.
+    """
+    result = subprocess.run(
+        ["docker", "stats", "--no-stream", "--format", "{{json .}}", name],
+        capture_output=True,
+    )
+    if result.returncode != 0 or not result.stdout.strip():
+        return None
+
+    stats = json.loads(result.stdout)
+    (block_read, block_write) = stats["BlockIO"].split("/")
+    return {
+        "cpu_percent": float(stats["CPUPerc"].rstrip("%")),
+        "memory_bytes": parse_size(stats["MemUsage"].split("/")[0]),
+        "block_read_bytes": parse_size(block_read),
+        "block_write_bytes": parse_size(block_write),
+    }
+
+
+class ContainerStatsSampler(threading.Thread):
+    """Samples the resource usage of a container while it runs.
+
+    CPU seconds are estimated from the CPU percentage of each sample, over the
+    time since the previous one. Peak memory is the largest sample taken, so
+    short spikes between samples may be missed.
+    """
+
+    def __init__(self, name, interval):
+        super().__init__(daemon=True)
+        self.name = name
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.usage = {
+            "peak_memory_bytes": None,
+            "cpu_seconds": None,
+            "block_read_bytes": None,
+            "block_write_bytes": None,
+        }
+
+    def sample(self, elapsed):
+        """ Add a sample of the container's usage to the totals. """
+        stats = container_stats(self.name)
+        if stats is None:
+            # the container isn't running (yet, or any more).
+            return
+
+        self.usage["peak_memory_bytes"] = max(
+            self.usage["peak_memory_bytes"] or 0, stats["memory_bytes"]
+        )
+        self.usage["cpu_seconds"] = round(
+            (self.usage["cpu_seconds"] or 0) + stats["cpu_percent"] / 100 * elapsed,
+            3,
+        )
+        self.usage["block_read_bytes"] = stats["block_read_bytes"]
+        self.usage["block_write_bytes"] = stats["block_write_bytes"]
+
+    def run(self):
+        last_sample = time.monotonic()
+        while not self.stopped.wait(self.interval):
+            now = time.monotonic()
+            try:
+                self.sample(now - last_sample)
+            except (ValueError, KeyError) as err:
+                logger.warning("Unable to read container stats: %s", err)
+            last_sample = now
+
+    def stop(self):
+        """ Stop sampling, and return the usage of the container. """
+        self.stopped.set()
+        self.join()
+        return self.usage
+
+
+def kill_container(name):
+    """ Kill a running container (its run fails with a nonzero code). """
+    result = subprocess.run(["docker", "kill", name], capture_output=True)
+    if result.returncode != 0:
+        logger.warning("Unable to kill container %s: %s", name, result.stderr)
+
+
+class ContainerWatchdog(threading.Thread):
+    """Kills a container that runs for too long, or whose run is cancelled.
+
+    is_cancelled is called (in an app context) every interval seconds while the
+    container runs. Once the container has been killed, reason is "timeout" or
+    "cancelled".
+    """
+
+    def __init__(self, name, timeout, is_cancelled, interval):
+        super().__init__(daemon=True)
+        self.name = name
+        self.timeout = timeout
+        self.is_cancelled = is_cancelled
+        self.interval = interval
+        self.app = current_app._get_current_object()  # pylint: disable=protected-access
+        self.stopped = threading.Event()
+        self.reason = None
+
+    def check(self, elapsed):
+        """ Return the reason the container should be killed, or None. """
+        if self.timeout is not None and elapsed >= self.timeout:
+            return "timeout"
+        try:
+            if self.is_cancelled():
+                return "cancelled"
+        except Exception as err:  # pylint: disable=broad-except
+            # keep watching: a temporary failure shouldn't stop the run.
+            logger.warning("Unable to check whether run was cancelled: %s", err)
+        return None
+
+    def run(self):
+        start = time.monotonic()
+        with self.app.app_context():
+            while True:
+                wait = self.interval
+                if self.timeout is not None:
+                    wait = max(min(wait, self.timeout - (time.monotonic() - start)), 0)
+                if self.stopped.wait(wait):
+                    return
+
+                reason = self.check(time.monotonic() - start)
+                if reason is not None:
+                    self.reason = reason
+                    kill_container(self.name)
+                    return
+
+    def stop(self):
+        """ Stop watching, and return the reason the container was killed. """
+        self.stopped.set()
+        self.join()
+        return self.reason
@@ -3,3 +3,45 @@ S3_BUCKET = "workflow-service"
 S3_REGION_NAME = "us-east-1"
 S3_PRESIGNED_TIMEOUT = 604800
 CALLBACK_TIMEOUT = 100
+# Run priorities (RunPriorityEnum) are task priorities in the broker, where HIGH
+# (9) must be consumed before LOW (1): CELERY_BROKER_URL has to be a RabbitMQ
+# broker, since Redis consumes lower numbers first.
+# Seconds a run may wait to start before its priority is raised (see
+# promote_starved_pipeline_runs()):
+RUN_STARVATION_TIMEOUT = 30 * 60
+# Acknowledge run tasks once they have finished, so that the broker redelivers
+# the runs of workers that die (RabbitMQ's consumer_timeout must then be longer
+# than MAX_RUN_TIMEOUT: see rabbitmq.conf):
+CELERY_LONG_JOBS = True
+# Longest timeout (in seconds) of a pipeline, and of runs when long jobs are
+# enabled:
+MAX_RUN_TIMEOUT = 24 * 60 * 60
+# Seconds without a heartbeat after which a RUNNING run's worker is presumed
+# dead (see reap_stale_pipeline_runs()):
+RUN_HEARTBEAT_TIMEOUT = 10 * 60
+# Directory for worker caches shared between runs (disabled when None):
+WORKER_CACHE_DIR = None
+WORKER_GIT_CACHE_SIZE = 5 * 1024 * 1024 * 1024
+WORKER_IMAGE_CACHE_TTL = 300
+WORKER_INPUT_CACHE_SIZE = 10 * 1024 * 1024 * 1024
+WORKER_DOWNLOAD_THREADS = 4
+# Upload artifacts straight to S3 (rather than through the API server):
+WORKER_DIRECT_UPLOADS = True
+WORKER_UPLOAD_THREADS = 4
+# Upload output files while the container is still running, once they stop
+# changing (rather than only once it has exited):
+WORKER_EARLY_UPLOADS = False
+# Output files smaller than this are uploaded together in one archive (0 to
+# upload every file separately):
+WORKER_ARTIFACT_BUNDLE_SIZE = 0
+# Seconds a run's container may run for, unless its pipeline has a timeout
+# (unlimited when None):
+WORKER_RUN_TIMEOUT = None
+# Number of slots for concurrent runs on a worker host (unlimited when None):
+WORKER_SLOTS = None
+# Characters of each console stream of a run sent to the API (its head and its
+# tail): the full output of longer streams is uploaded as an artifact.
+WORKER_CONSOLE_LIMIT = 1024 * 1024
+# Number of runs each worker process executes at once, in threads (one run per
+# process when None):
+WORKER_CONCURRENCY = None
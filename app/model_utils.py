@@ -1,3 +1,4 @@
+import base64
 import importlib
 import os
 import uuid as uuid_lib
@@ -5,6 +6,7 @@ from datetime import datetime
 from enum import IntEnum, unique
 
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import tuple_
 
 
 @unique
@@ -15,6 +17,41 @@ class SystemPermissionEnum(IntEnum):
     PIPELINES_WORKER = 2
 
 
+@unique
+class ResourceClassEnum(IntEnum):
+    """Sizes of pipeline runs.
+
+    Each value is the number of worker slots (see WORKER_SLOTS) a run uses.
+    """
+
+    SMALL = 1
+    MEDIUM = 2
+    LARGE = 4
+
+    def queue(self):
+        """ The celery queue that runs of this size are sent to. """
+        if self == ResourceClassEnum.SMALL:
+            return "celery"
+        return f"pipelines-{self.name.lower()}"
+
+
+@unique
+class RunPriorityEnum(IntEnum):
+    """Priorities of pipeline runs.
+
+    Each value is the priority of the run's celery task in the broker.
+    """
+
+    LOW = 1
+    NORMAL = 5
+    HIGH = 9
+
+    def promoted(self):
+        """ Return the next higher priority (HIGH stays HIGH). """
+        higher = [p for p in RunPriorityEnum if p > self]
+        return min(higher) if len(higher) > 0 else self
+
+
 @unique
 class RunStateEnum(IntEnum):
     """ Run states currently supported in PipelineRunState """
@@ -57,3 +94,35 @@ class RunStateEnum(IntEnum):
             RunStateEnum.COMPLETED,
             RunStateEnum.CANCELLED,
         ]
+
+
+def encode_cursor(row):
+    """ Return the cursor of the page of rows following a row. """
+    key = f"{row.created_at.isoformat()} {row.id}"
+    return base64.urlsafe_b64encode(key.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """ Return the (created_at, id) of a cursor, raising ValueError if invalid. """
+    try:
+        (created_at, row_id) = (
+            base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split(" ")
+        )
+        return (datetime.fromisoformat(created_at), int(row_id))
+    except ValueError as value_err:
+        raise ValueError(f"invalid cursor {cursor!r}") from value_err
+
+
+def paginate(query, model, limit, after=None):
+    """Return a page of the rows of a query, in (created_at, id) order.
+
+    The page is a tuple of at most limit rows following the (created_at, id)
+    of after, and the cursor of the next page (None on the last page).
+    """
+    if after is not None:
+        query = query.filter(tuple_(model.created_at, model.id) > tuple_(*after))
+    rows = query.order_by(model.created_at, model.id).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return (rows, None)
+
+    return (rows[:limit], encode_cursor(rows[limit - 1]))
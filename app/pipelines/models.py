@@ -1,18 +1,34 @@
-from flask import current_app
+from datetime import datetime
 from urllib.parse import quote
 
+from flask import current_app
+from sqlalchemy import event
+
 from application_roles.model_utils import CommonColumnsMixin, get_db
 from blob_utils import create_url
 
-from ..model_utils import RunStateEnum
+from ..model_utils import ResourceClassEnum, RunPriorityEnum, RunStateEnum
 
 db = get_db()
 
+# Streams of console output stored in PipelineRunOutput:
+OUTPUT_STREAMS = ("std_out", "std_err")
+
 
 class Pipeline(CommonColumnsMixin, db.Model):
     """ Represents a 'pipeline' job. """
 
     __tablename__ = "pipeline"
+    __table_args__ = (
+        db.Index("ix_pipeline_uuid", "uuid", unique=True),
+        # (pages of pipelines, see paginate())
+        db.Index(
+            "ix_pipeline_created_at_id_active",
+            "created_at",
+            "id",
+            postgresql_where=db.text("is_deleted = false"),
+        ),
+    )
 
     name = db.Column(db.String(50), nullable=False)
     description = db.Column(db.String(300), nullable=True)
@@ -20,6 +36,14 @@ class Pipeline(CommonColumnsMixin, db.Model):
     repository_ssh_url = db.Column(db.String(2000), nullable=True)
     repository_branch = db.Column(db.String(100), nullable=True)
     repository_script = db.Column(db.String(4096), nullable=True)
+    # Seconds a run's container may run for (the worker's default when null):
+    timeout = db.Column(db.Integer, nullable=True)
+    # ResourceClassEnum of its runs:
+    resource_class = db.Column(
+        db.Integer, default=ResourceClassEnum.SMALL.value, nullable=False
+    )
+    # Reuse the artifacts of an identical earlier run, rather than running again:
+    use_run_cache = db.Column(db.Boolean(), default=False, nullable=False)
     is_deleted = db.Column(db.Boolean(), default=False, nullable=False)
 
     pipeline_runs = db.relationship("PipelineRun", backref="pipeline", lazy="select")
@@ -38,10 +62,10 @@ class RunStateType(CommonColumnsMixin, db.Model):
     code = db.Column(db.Numeric(), nullable=False)
 
     pipeline_run_states = db.relationship(
-        "PipelineRunState", backref="run_state_type", lazy="immediate"
+        "PipelineRunState", backref="run_state_type", lazy="select"
     )
     workflow_run_states = db.relationship(
-        "WorkflowRunState", backref="run_state_type", lazy="immediate"
+        "WorkflowRunState", backref="run_state_type", lazy="select"
     )
 
 
@@ -57,9 +81,11 @@ class PipelineRunState(CommonColumnsMixin, db.Model):
         db.Integer, db.ForeignKey("runstatetype.id"), nullable=False
     )
     pipeline_run_id = db.Column(
-        db.Integer, db.ForeignKey("pipelinerun.id"), nullable=False
+        db.Integer, db.ForeignKey("pipelinerun.id"), nullable=False, index=True
     )
 
+    pipeline_run = db.relationship("PipelineRun", back_populates="pipeline_run_states")
+
 
 class PipelineRunArtifact(CommonColumnsMixin, db.Model):
     """ An artifact created by a PipelineRun. """
@@ -69,11 +95,22 @@ class PipelineRunArtifact(CommonColumnsMixin, db.Model):
     name = db.Column(db.String(255), nullable=False)
 
     pipeline_run_id = db.Column(
-        db.Integer, db.ForeignKey("pipelinerun.id"), nullable=False
+        db.Integer, db.ForeignKey("pipelinerun.id"), nullable=False, index=True
+    )
+    # The artifact whose file this one shares (for runs completed from the run
+    # cache):
+    source_artifact_id = db.Column(
+        db.Integer, db.ForeignKey("pipelinerunartifact.id"), nullable=True, index=True
+    )
+
+    source_artifact = db.relationship(
+        "PipelineRunArtifact", remote_side="PipelineRunArtifact.id", lazy="select"
     )
 
     def public_url(self):
         """ Generate a publicly visible URL for this artifact. """
+        if self.source_artifact is not None:
+            return self.source_artifact.public_url()
 
         return create_url(
             f"{self.pipeline_run.pipeline.uuid}/{self.pipeline_run.uuid}/{self.uuid}-{quote(self.name)}",
@@ -89,41 +126,152 @@ class PipelineRunInput(CommonColumnsMixin, db.Model):
     filename = db.Column(db.String(255), nullable=False)
     url = db.Column(db.String(2000), nullable=False)
 
+    pipeline_run_id = db.Column(
+        db.Integer, db.ForeignKey("pipelinerun.id"), nullable=False, index=True
+    )
+
+
+class PipelineRunOutput(CommonColumnsMixin, db.Model):
+    """A chunk of the console output of a PipelineRun.
+
+    Output is stored as ordered chunks per stream (std_out, std_err) so that it
+    can be appended to, and read a page at a time, without loading all of it.
+    """
+
+    __tablename__ = "pipelinerunoutput"
+    __table_args__ = (
+        db.Index(
+            "ix_pipelinerunoutput_pipeline_run_id_stream_position",
+            "pipeline_run_id",
+            "stream",
+            "position",
+        ),
+    )
+
+    stream = db.Column(db.String(10), nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    length = db.Column(db.Integer, nullable=False)
+    content = db.Column(db.Unicode, nullable=False)
+
     pipeline_run_id = db.Column(
         db.Integer, db.ForeignKey("pipelinerun.id"), nullable=False
     )
 
 
+class PipelineRunPhase(CommonColumnsMixin, db.Model):
+    """ The time taken (and bytes transferred) by a phase of a PipelineRun. """
+
+    __tablename__ = "pipelinerunphase"
+
+    name = db.Column(db.String(50), nullable=False)
+    # wall clock seconds:
+    duration = db.Column(db.Float, nullable=False)
+    byte_count = db.Column(db.BigInteger, nullable=True)
+
+    pipeline_run_id = db.Column(
+        db.Integer, db.ForeignKey("pipelinerun.id"), nullable=False, index=True
+    )
+
+
 class PipelineRun(CommonColumnsMixin, db.Model):
     """ A pipeline run """
 
     __tablename__ = "pipelinerun"
+    __table_args__ = (
+        db.Index("ix_pipelinerun_uuid", "uuid", unique=True),
+        # (pages of the runs of a pipeline)
+        db.Index(
+            "ix_pipelinerun_pipeline_id_created_at_id_active",
+            "pipeline_id",
+            "created_at",
+            "id",
+            postgresql_where=db.text("is_deleted = false"),
+        ),
+        # (for promote_starved_pipeline_runs() and reap_stale_pipeline_runs())
+        db.Index(
+            "ix_pipelinerun_dispatched_at_active",
+            "dispatched_at",
+            postgresql_where=db.text("is_deleted = false"),
+        ),
+        db.Index(
+            "ix_pipelinerun_heartbeat_at_active",
+            "heartbeat_at",
+            postgresql_where=db.text("is_deleted = false"),
+        ),
+    )
 
     sequence = db.Column(db.Integer, nullable=False)
     worker_ip = db.Column(db.String(50), nullable=True)
     callback_url = db.Column(db.String(2000), nullable=True)
+    # RunPriorityEnum of the run:
+    priority = db.Column(
+        db.Integer, default=RunPriorityEnum.NORMAL.value, nullable=False
+    )
+    # When the run was last sent to the workers:
+    dispatched_at = db.Column(db.DateTime, nullable=True)
+    # When the worker of a RUNNING run last reported that it is alive:
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    # Hash of everything that determines the run's outputs (see run_cache_key()):
+    cache_key = db.Column(db.String(64), nullable=True, index=True)
+    # RunStateEnum of the last of pipeline_run_states (see run_state_enum()):
+    current_state = db.Column(db.Integer, nullable=True, index=True)
+    # When the run last started RUNNING, and when it reached a final state:
     started_at = db.Column(db.DateTime, nullable=True)
     completed_at = db.Column(db.DateTime, nullable=True)
-    std_out = db.Column(db.Unicode, nullable=True)
-    std_err = db.Column(db.Unicode, nullable=True)
+    # The image the run used, pinned to a digest (name@sha256:...):
+    docker_image_digest = db.Column(db.String(2000), nullable=True)
+    # Resource usage of the run's container:
+    peak_memory_bytes = db.Column(db.BigInteger, nullable=True)
+    cpu_seconds = db.Column(db.Float, nullable=True)
+    block_read_bytes = db.Column(db.BigInteger, nullable=True)
+    block_write_bytes = db.Column(db.BigInteger, nullable=True)
     is_deleted = db.Column(db.Boolean(), default=False, nullable=False)
 
-    pipeline_id = db.Column(db.Integer, db.ForeignKey("pipeline.id"), nullable=False)
+    pipeline_id = db.Column(
+        db.Integer, db.ForeignKey("pipeline.id"), nullable=False, index=True
+    )
 
+    # Loaded when used: queries that serialize runs load them up front (see
+    # pipeline_run_export_options()). New states are added by setting their
+    # pipeline_run, which doesn't load the others.
     pipeline_run_states = db.relationship(
-        "PipelineRunState", backref="pipeline_run", lazy="immediate"
+        "PipelineRunState",
+        back_populates="pipeline_run",
+        lazy="select",
+        order_by="PipelineRunState.id",
     )
     pipeline_run_artifacts = db.relationship(
-        "PipelineRunArtifact", backref="pipeline_run", lazy="immediate"
+        "PipelineRunArtifact", backref="pipeline_run", lazy="select"
     )
     pipeline_run_inputs = db.relationship(
-        "PipelineRunInput", backref="pipeline_run", lazy="immediate"
+        "PipelineRunInput", backref="pipeline_run", lazy="select"
+    )
+    pipeline_run_phases = db.relationship(
+        "PipelineRunPhase", backref="pipeline_run", lazy="select"
     )
 
     workflow_pipeline_run = db.relationship(
-        "WorkflowPipelineRun", backref="pipeline_run", lazy="immediate", uselist=False
+        "WorkflowPipelineRun", backref="pipeline_run", lazy="select", uselist=False
     )
 
     def run_state_enum(self):
         """ Return the current stat of this run (the last run state) """
-        return RunStateEnum(self.pipeline_run_states[-1].code)
+        return RunStateEnum(self.current_state)
+
+
+@event.listens_for(PipelineRunState.pipeline_run, "set")
+def _pipeline_run_state_added(pipeline_run_state, pipeline_run, oldvalue, initiator):
+    """Maintain the current state (and start and completion times) of a run as
+    states are added to its history, in the same transaction.
+
+    (also when they are appended to pipeline_run_states, through the backref)
+    """
+    # pylint: disable=unused-argument
+    if pipeline_run is None:
+        return
+    run_state_enum = RunStateEnum(pipeline_run_state.code)
+    pipeline_run.current_state = run_state_enum.value
+    if run_state_enum == RunStateEnum.RUNNING:
+        pipeline_run.started_at = datetime.utcnow()
+    elif run_state_enum.in_final_state():
+        pipeline_run.completed_at = datetime.utcnow()
@@ -3,16 +3,20 @@ import logging
 from flask import Blueprint, jsonify, request
 from marshmallow.exceptions import ValidationError
 
-from .models import db
-from ..model_utils import SystemPermissionEnum
-from .queries import find_pipeline, find_pipelines
-from .schemas import PipelineSchema
+from .models import Pipeline, db
+from ..model_utils import SystemPermissionEnum, paginate
+from .queries import find_pipeline, find_pipeline_resources, find_pipelines
+from .schemas import PageQuerySchema, PipelineResourcesSchema, PipelineSchema
 from .services import (
     create_pipeline,
     delete_pipeline,
     update_pipeline,
 )
-from ..utils import verify_content_type_and_params, permissions_required
+from ..utils import (
+    paginated_response,
+    permissions_required,
+    verify_content_type_and_params,
+)
 
 logger = logging.getLogger("pipelines")
 
@@ -30,6 +34,9 @@ pipeline_bp = Blueprint("pipelines", __name__)
         "description",
         "repository_branch",
         "repository_script",
+        "timeout",
+        "resource_class",
+        "use_run_cache",
     ],
 )
 @permissions_required([SystemPermissionEnum.PIPELINES_CLIENT])
@@ -62,6 +69,16 @@ def create():
                 type: string
               repository_branch:
                 type: string
+              timeout:
+                type: integer
+                description: Seconds a run may take (optional).
+              resource_class:
+                type: string
+                enum: [SMALL, MEDIUM, LARGE]
+                description: Size of the pipeline's runs (default SMALL).
+              use_run_cache:
+                type: boolean
+                description: Reuse the artifacts of identical earlier runs (default false).
     responses:
       "200":
         description: "Created"
@@ -82,6 +99,13 @@ def create():
                   type: string
                 repository_branch:
                   type: string
+                timeout:
+                  type: integer
+                resource_class:
+                  type: string
+                  example: SMALL
+                use_run_cache:
+                  type: boolean
                 created_at:
                   type: string
                 updated_at:
@@ -134,6 +158,13 @@ def get(pipeline_uuid):
                   type: string
                 repository_branch:
                   type: string
+                timeout:
+                  type: integer
+                resource_class:
+                  type: string
+                  example: SMALL
+                use_run_cache:
+                  type: boolean
                 created_at:
                   type: string
                 updated_at:
@@ -148,6 +179,56 @@ def get(pipeline_uuid):
     return jsonify(PipelineSchema().dump(pipeline))
 
 
+@pipeline_bp.route("/<pipeline_uuid>/resources", methods=["GET"])
+@permissions_required([SystemPermissionEnum.PIPELINES_CLIENT])
+def get_resources(pipeline_uuid):
+    """Get the resources used by the runs of a pipeline.
+    ---
+    tags:
+      - pipelines
+    parameters:
+      - in: header
+        name: Workflow-API-Key
+        description: Requires key type PIPELINES_CLIENT
+        schema:
+          type: string
+      - name: uuid
+        in: path
+        required: true
+        description: UUID of a pipeline.
+    responses:
+      "200":
+        description: "Fetched"
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                run_count:
+                  type: integer
+                  description: Number of runs with recorded resource usage.
+                max_peak_memory_bytes:
+                  type: integer
+                avg_peak_memory_bytes:
+                  type: integer
+                total_cpu_seconds:
+                  type: number
+                avg_cpu_seconds:
+                  type: number
+                total_block_read_bytes:
+                  type: integer
+                total_block_write_bytes:
+                  type: integer
+      "404":
+        description: "Not found"
+    """
+    pipeline = find_pipeline(pipeline_uuid)
+    if pipeline is None:
+        return {"message": "Pipeline not found"}, 404
+
+    return jsonify(PipelineResourcesSchema().dump(find_pipeline_resources(pipeline)))
+
+
 @pipeline_bp.route("/<pipeline_uuid>", methods=["DELETE"])
 @verify_content_type_and_params([], [])
 @permissions_required([SystemPermissionEnum.PIPELINES_CLIENT])
@@ -194,9 +275,24 @@ def list_pipelines():
         description: Requires key type PIPELINES_CLIENT
         schema:
           type: string
+      - in: query
+        name: limit
+        description: Maximum number of pipelines to return (100 by default, at most 1000).
+        schema:
+          type: integer
+      - in: query
+        name: after
+        description: Cursor of the page to return (from the X-Next-Cursor header).
+        schema:
+          type: string
     responses:
       "200":
         description: "Listed"
+        headers:
+          X-Next-Cursor:
+            description: Cursor of the next page, if there is one.
+            schema:
+              type: string
         content:
           application/json:
             schema:
@@ -223,8 +319,15 @@ def list_pipelines():
       "400":
         description: "Bad request"
     """
-    pipelines = find_pipelines()
-    return jsonify([PipelineSchema().dump(p) for p in pipelines])
+    try:
+        page = PageQuerySchema().load(request.args)
+    except ValidationError as validation_err:
+        logger.warning(validation_err)
+        return {"message": "Validation error", "errors": validation_err.messages}, 400
+
+    return paginated_response(
+        PipelineSchema(), paginate(find_pipelines(), Pipeline, **page)
+    )
 
 
 @pipeline_bp.route("/<pipeline_uuid>", methods=["PUT"])
@@ -238,6 +341,9 @@ def list_pipelines():
         "description",
         "repository_branch",
         "repository_script",
+        "timeout",
+        "resource_class",
+        "use_run_cache",
     ],
 )
 @permissions_required([SystemPermissionEnum.PIPELINES_CLIENT])
@@ -271,6 +377,16 @@ def update(pipeline_uuid):
                 type: string
               repository_branch:
                 type: string
+              timeout:
+                type: integer
+                description: Seconds a run may take (optional).
+              resource_class:
+                type: string
+                enum: [SMALL, MEDIUM, LARGE]
+                description: Size of the pipeline's runs (default SMALL).
+              use_run_cache:
+                type: boolean
+                description: Reuse the artifacts of identical earlier runs (default false).
     responses:
       "200":
         description: "Updated"
@@ -291,6 +407,13 @@ def update(pipeline_uuid):
                   type: string
                 repository_branch:
                   type: string
+                timeout:
+                  type: integer
+                resource_class:
+                  type: string
+                  example: SMALL
+                use_run_cache:
+                  type: boolean
                 created_at:
                   type: string
                 updated_at:
@@ -1,6 +1,18 @@
-from sqlalchemy import and_
+from flask import current_app
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import joinedload, selectinload
 
-from .models import Pipeline, PipelineRun, RunStateType, db
+from ..model_utils import RunPriorityEnum, RunStateEnum
+from .models import (
+    OUTPUT_STREAMS,
+    Pipeline,
+    PipelineRun,
+    PipelineRunArtifact,
+    PipelineRunOutput,
+    PipelineRunState,
+    RunStateType,
+    db,
+)
 from .schemas import SearchPipelinesSchema
 
 
@@ -25,23 +37,141 @@ def find_pipelines(uuids=None):
     return query
 
 
-def find_run_state_type(run_state_enum):
-    """Find a specific RunStateType.
+def pipeline_run_export_options():
+    """Loader options for what PipelineRunSchema exports of runs: a query per
+    relationship, however many runs are loaded, rather than queries per run.
+    """
+    return (
+        joinedload(PipelineRun.pipeline),
+        selectinload(PipelineRun.pipeline_run_inputs),
+        selectinload(PipelineRun.pipeline_run_states),
+        selectinload(PipelineRun.pipeline_run_phases),
+        # (the URLs of artifacts are those of their source artifacts, if any)
+        selectinload(PipelineRun.pipeline_run_artifacts)
+        .joinedload(PipelineRunArtifact.source_artifact)
+        .joinedload(PipelineRunArtifact.pipeline_run)
+        .joinedload(PipelineRun.pipeline),
+    )
+
+
+def find_pipeline_runs(pipeline):
+    """ Find the PipelineRuns of a pipeline (to export them). """
+    return PipelineRun.query.filter(
+        PipelineRun.pipeline_id == pipeline.id,
+        PipelineRun.is_deleted == False,
+    ).options(*pipeline_run_export_options())
+
+
+def find_pipeline_resources(pipeline):
+    """ Summarize the resources used by the runs of a pipeline. """
+    (
+        run_count,
+        max_peak_memory_bytes,
+        avg_peak_memory_bytes,
+        total_cpu_seconds,
+        avg_cpu_seconds,
+        total_block_read_bytes,
+        total_block_write_bytes,
+    ) = (
+        db.session.query(
+            func.count(PipelineRun.peak_memory_bytes),
+            func.max(PipelineRun.peak_memory_bytes),
+            func.avg(PipelineRun.peak_memory_bytes),
+            func.sum(PipelineRun.cpu_seconds),
+            func.avg(PipelineRun.cpu_seconds),
+            func.sum(PipelineRun.block_read_bytes),
+            func.sum(PipelineRun.block_write_bytes),
+        )
+        .filter(
+            PipelineRun.pipeline_id == pipeline.id,
+            PipelineRun.is_deleted == False,
+        )
+        .one()
+    )
 
-    If the RunStateType doesn't exist, create it and return it.
+    return {
+        "run_count": run_count,
+        "max_peak_memory_bytes": max_peak_memory_bytes,
+        "avg_peak_memory_bytes": avg_peak_memory_bytes,
+        "total_cpu_seconds": total_cpu_seconds,
+        "avg_cpu_seconds": avg_cpu_seconds,
+        "total_block_read_bytes": total_block_read_bytes,
+        "total_block_write_bytes": total_block_write_bytes,
+    }
+
+
+def _run_state_type_cache():
+    """ The app's cached maps of RunStateType ids by enum, and enums by id. """
+    return current_app.extensions.setdefault("run_state_types", ({}, {}))
+
+
+def load_run_state_types():
+    """Find the ids of every RunStateType by RunStateEnum, creating the missing
+    ones.
+
+    The rows never change, so once they all exist their ids are cached for the
+    life of the app (ids of rows created by this call are not cached, as the
+    transaction creating them may yet be rolled back).
     """
-    run_state_type = RunStateType.query.filter(
-        RunStateType.code == run_state_enum.value
-    ).one_or_none()
-    if run_state_type is None:
-        run_state_type = RunStateType(
+    run_state_type_ids = {
+        RunStateEnum(code): run_state_type_id
+        for (run_state_type_id, code) in db.session.query(
+            RunStateType.id, RunStateType.code
+        )
+    }
+    missing = [
+        run_state_enum
+        for run_state_enum in RunStateEnum
+        if run_state_enum not in run_state_type_ids
+    ]
+    if len(missing) == 0:
+        (cached_ids, cached_enums) = _run_state_type_cache()
+        cached_ids.update(run_state_type_ids)
+        cached_enums.update(
+            (run_state_type_id, run_state_enum)
+            for (run_state_enum, run_state_type_id) in run_state_type_ids.items()
+        )
+        return run_state_type_ids
+
+    run_state_types = [
+        RunStateType(
             name=run_state_enum.name,
             description=run_state_enum.name,
             code=run_state_enum.value,
         )
-        db.session.add(run_state_type)
+        for run_state_enum in missing
+    ]
+    db.session.add_all(run_state_types)
+    db.session.flush()
+    for (run_state_enum, run_state_type) in zip(missing, run_state_types):
+        run_state_type_ids[run_state_enum] = run_state_type.id
 
-    return run_state_type
+    return run_state_type_ids
+
+
+def find_run_state_type_id(run_state_enum):
+    """Find the id of a specific RunStateType, without querying once the ids
+    are cached.
+    """
+    run_state_type_id = _run_state_type_cache()[0].get(run_state_enum)
+    if run_state_type_id is None:
+        run_state_type_id = load_run_state_types()[run_state_enum]
+
+    return run_state_type_id
+
+
+def find_run_state_enum(run_state_type_id):
+    """Find the RunStateEnum of a RunStateType id, without querying once the
+    ids are cached.
+    """
+    run_state_enum = _run_state_type_cache()[1].get(run_state_type_id)
+    if run_state_enum is None:
+        run_state_enum = {
+            run_state_type_id: run_state_enum
+            for (run_state_enum, run_state_type_id) in load_run_state_types().items()
+        }[run_state_type_id]
+
+    return run_state_enum
 
 
 def find_pipeline_run(uuid):
@@ -57,3 +187,145 @@ def find_pipeline_run(uuid):
         )
         .one_or_none()
     )
+
+
+def find_starved_pipeline_runs(dispatched_before):
+    """Find NOT_STARTED PipelineRuns dispatched before a time, whose priority
+    can still be raised.
+    """
+    return (
+        PipelineRun.query.join(Pipeline)
+        .filter(
+            PipelineRun.current_state == RunStateEnum.NOT_STARTED.value,
+            PipelineRun.dispatched_at < dispatched_before,
+            PipelineRun.priority < max(RunPriorityEnum),
+            PipelineRun.is_deleted == False,
+            Pipeline.is_deleted == False,
+        )
+        .order_by(PipelineRun.dispatched_at)
+        .all()
+    )
+
+
+def find_stale_pipeline_runs(heartbeat_before):
+    """Find RUNNING PipelineRuns whose last heartbeat (and dispatch) was before
+    a time.
+
+    (Runs dispatched before dispatched_at was recorded have none)
+    """
+    return (
+        PipelineRun.query.join(Pipeline)
+        .filter(
+            PipelineRun.current_state == RunStateEnum.RUNNING.value,
+            PipelineRun.heartbeat_at < heartbeat_before,
+            or_(
+                PipelineRun.dispatched_at == None,
+                PipelineRun.dispatched_at < heartbeat_before,
+            ),
+            PipelineRun.is_deleted == False,
+            Pipeline.is_deleted == False,
+        )
+        .order_by(PipelineRun.heartbeat_at)
+        .all()
+    )
+
+
+def count_pipeline_run_states(pipeline_run, run_state_enum):
+    """ Count the times a PipelineRun has entered a state. """
+    return (
+        db.session.query(func.count(PipelineRunState.id))
+        .filter(
+            PipelineRunState.pipeline_run_id == pipeline_run.id,
+            PipelineRunState.code == run_state_enum.value,
+        )
+        .scalar()
+    )
+
+
+def find_cached_pipeline_run(cache_key):
+    """ Find the latest COMPLETED PipelineRun with a cache key. """
+    return (
+        PipelineRun.query.join(Pipeline)
+        .filter(
+            PipelineRun.cache_key == cache_key,
+            PipelineRun.current_state == RunStateEnum.COMPLETED.value,
+            PipelineRun.is_deleted == False,
+            Pipeline.is_deleted == False,
+        )
+        .order_by(PipelineRun.created_at.desc())
+        .first()
+    )
+
+
+def _pipeline_run_output_query(pipeline_run, stream):
+    return PipelineRunOutput.query.filter(
+        PipelineRunOutput.pipeline_run_id == pipeline_run.id,
+        PipelineRunOutput.stream == stream,
+    )
+
+
+def find_pipeline_run_output_length(pipeline_run, stream):
+    """ Return the length of a stream (std_out/std_err) of a PipelineRun. """
+    last_chunk = (
+        _pipeline_run_output_query(pipeline_run, stream)
+        .order_by(PipelineRunOutput.position.desc())
+        .first()
+    )
+    if last_chunk is None:
+        return 0
+
+    return last_chunk.position + last_chunk.length
+
+
+def find_pipeline_run_output_lengths(pipeline_run):
+    """ Return the (std_out, std_err) lengths of a PipelineRun's output. """
+    return tuple(
+        find_pipeline_run_output_length(pipeline_run, stream)
+        for stream in OUTPUT_STREAMS
+    )
+
+
+def find_pipeline_run_output(pipeline_run, stream, offset=0, limit=None):
+    """ Return the output of a stream from offset, up to limit characters. """
+    first_position = (
+        db.session.query(func.max(PipelineRunOutput.position))
+        .filter(
+            PipelineRunOutput.pipeline_run_id == pipeline_run.id,
+            PipelineRunOutput.stream == stream,
+            PipelineRunOutput.position <= offset,
+        )
+        .scalar()
+    )
+    query = _pipeline_run_output_query(pipeline_run, stream).filter(
+        PipelineRunOutput.position >= (first_position or 0)
+    )
+    if limit is not None:
+        query = query.filter(PipelineRunOutput.position < offset + limit)
+
+    chunks = query.order_by(PipelineRunOutput.position).all()
+    if len(chunks) == 0:
+        return ""
+
+    start = offset - chunks[0].position
+    end = None if limit is None else start + limit
+    return "".join(chunk.content for chunk in chunks)[start:end]
+
+
+def find_pipeline_run_console(pipeline_run, offset=0, limit=None, tail=None):
+    """Return a page of the console output of a PipelineRun.
+
+    Each stream is read from offset (up to limit characters), or when tail is
+    supplied, its last tail characters.
+    """
+    result = {}
+    for stream in OUTPUT_STREAMS:
+        length = find_pipeline_run_output_length(pipeline_run, stream)
+        (start, size) = (offset, limit)
+        if tail is not None:
+            (start, size) = (max(length - tail, 0), tail)
+
+        result[stream] = find_pipeline_run_output(pipeline_run, stream, start, size)
+        result[f"{stream}_offset"] = min(start, length)
+        result[f"{stream}_length"] = length
+
+    return result
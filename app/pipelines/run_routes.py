@@ -3,16 +3,41 @@ import logging
 from flask import Blueprint, jsonify, request
 from marshmallow.exceptions import ValidationError
 
-from ..model_utils import SystemPermissionEnum
-from ..utils import permissions_required, verify_content_type_and_params
-from .queries import find_pipeline, find_pipeline_run
-from .schemas import PipelineRunSchema
+from ..model_utils import SystemPermissionEnum, paginate
+from ..utils import (
+    paginated_response,
+    permissions_required,
+    verify_content_type_and_params,
+)
+from .models import PipelineRun
+from .queries import (
+    find_pipeline,
+    find_pipeline_run,
+    find_pipeline_run_console,
+    find_pipeline_runs,
+)
+from .schemas import (
+    ArtifactSchema,
+    ConsoleQuerySchema,
+    PageQuerySchema,
+    PipelineRunSchema,
+    RunStateExportSchema,
+)
 from .services import (
+    append_pipeline_run_output,
+    cancel_pipeline_run,
+    check_pipeline_run_cache,
+    complete_pipeline_run_artifact_upload,
     create_pipeline_run,
     create_pipeline_run_artifact,
+    create_pipeline_run_artifact_upload,
+    update_pipeline_run_environment,
+    update_pipeline_run_heartbeat,
+    update_pipeline_run_metrics,
     update_pipeline_run_output,
     update_pipeline_run_state,
     delete_pipeline_run,
+    restart_pipeline_run,
 )
 
 logger = logging.getLogger("pipeline-runs")
@@ -21,7 +46,7 @@ run_bp = Blueprint("pipeline-runs", __name__)
 
 
 @run_bp.route("/<pipeline_uuid>/runs", methods=["POST"])
-@verify_content_type_and_params(["inputs"], ["callback_url"])
+@verify_content_type_and_params(["inputs"], ["callback_url", "priority"])
 @permissions_required([SystemPermissionEnum.PIPELINES_CLIENT])
 def create_run(pipeline_uuid):
     """Create a new pipeline run.
@@ -45,6 +70,10 @@ def create_run(pipeline_uuid):
             properties:
               callback_url:
                 type: string
+              priority:
+                type: string
+                enum: [LOW, NORMAL, HIGH]
+                description: Priority of the run (default NORMAL).
               inputs:
                 type: array
                 items:
@@ -70,9 +99,21 @@ def create_run(pipeline_uuid):
                 sequence:
                   type: integer
                   example: 1
+                priority:
+                  type: string
+                  example: NORMAL
                 created_at:
                   type: string
                   example: "2020-08-05T08:15:30-05:00"
+                started_at:
+                  type: string
+                  example: "2020-08-05T08:16:30-05:00"
+                completed_at:
+                  type: string
+                  example: "2020-08-05T08:25:30-05:00"
+                docker_image_digest:
+                  type: string
+                  example: python@sha256:4c4e8f3d2a...
                 inputs:
                   type: array
                   items:
@@ -87,6 +128,35 @@ def create_run(pipeline_uuid):
                       url:
                         type: string
                         example: https://example.com/name.pdf
+                phases:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      name:
+                        type: string
+                        example: pull
+                      duration:
+                        type: number
+                        example: 12.5
+                      byte_count:
+                        type: integer
+                        example: 1024
+                resources:
+                  type: object
+                  properties:
+                    peak_memory_bytes:
+                      type: integer
+                      example: 104857600
+                    cpu_seconds:
+                      type: number
+                      example: 42.5
+                    block_read_bytes:
+                      type: integer
+                      example: 1048576
+                    block_write_bytes:
+                      type: integer
+                      example: 2097152
                 states:
                   type: array
                   items:
@@ -143,9 +213,21 @@ def get_run(pipeline_uuid, pipeline_run_uuid):
                 sequence:
                   type: integer
                   example: 1
+                priority:
+                  type: string
+                  example: NORMAL
                 created_at:
                   type: string
                   example: "2020-08-05T08:15:30-05:00"
+                started_at:
+                  type: string
+                  example: "2020-08-05T08:16:30-05:00"
+                completed_at:
+                  type: string
+                  example: "2020-08-05T08:25:30-05:00"
+                docker_image_digest:
+                  type: string
+                  example: python@sha256:4c4e8f3d2a...
                 inputs:
                   type: array
                   items:
@@ -160,6 +242,35 @@ def get_run(pipeline_uuid, pipeline_run_uuid):
                       url:
                         type: string
                         example: https://example.com/name.pdf
+                phases:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      name:
+                        type: string
+                        example: pull
+                      duration:
+                        type: number
+                        example: 12.5
+                      byte_count:
+                        type: integer
+                        example: 1024
+                resources:
+                  type: object
+                  properties:
+                    peak_memory_bytes:
+                      type: integer
+                      example: 104857600
+                    cpu_seconds:
+                      type: number
+                      example: 42.5
+                    block_read_bytes:
+                      type: integer
+                      example: 1048576
+                    block_write_bytes:
+                      type: integer
+                      example: 2097152
                 states:
                   type: array
                   items:
@@ -219,7 +330,7 @@ def delete_run(pipeline_uuid, pipeline_run_uuid):
 @run_bp.route("/<pipeline_uuid>/runs", methods=["GET"])
 @permissions_required([SystemPermissionEnum.PIPELINES_CLIENT])
 def get_runs(pipeline_uuid):
-    """Get a all pipeline runs for a pipeline.
+    """Get the pipeline runs of a pipeline, a page at a time.
     ---
 
     tags:
@@ -230,9 +341,24 @@ def get_runs(pipeline_uuid):
         description: Requires key type PIPELINES_CLIENT
         schema:
           type: string
+      - in: query
+        name: limit
+        description: Maximum number of runs to return (100 by default, at most 1000).
+        schema:
+          type: integer
+      - in: query
+        name: after
+        description: Cursor of the page to return (from the X-Next-Cursor header).
+        schema:
+          type: string
     responses:
       "200":
         description: "Fetched"
+        headers:
+          X-Next-Cursor:
+            description: Cursor of the next page, if there is one.
+            schema:
+              type: string
         content:
           application/json:
             schema:
@@ -246,9 +372,21 @@ def get_runs(pipeline_uuid):
                   sequence:
                     type: integer
                     example: 1
+                  priority:
+                    type: string
+                    example: NORMAL
                   created_at:
                     type: string
                     example: "2020-08-05T08:15:30-05:00"
+                  started_at:
+                    type: string
+                    example: "2020-08-05T08:16:30-05:00"
+                  completed_at:
+                    type: string
+                    example: "2020-08-05T08:25:30-05:00"
+                  docker_image_digest:
+                    type: string
+                    example: python@sha256:4c4e8f3d2a...
                   inputs:
                     type: array
                     items:
@@ -263,6 +401,35 @@ def get_runs(pipeline_uuid):
                         url:
                           type: string
                           example: https://example.com/name.pdf
+                  phases:
+                    type: array
+                    items:
+                      type: object
+                      properties:
+                        name:
+                          type: string
+                          example: pull
+                        duration:
+                          type: number
+                          example: 12.5
+                        byte_count:
+                          type: integer
+                          example: 1024
+                  resources:
+                    type: object
+                    properties:
+                      peak_memory_bytes:
+                        type: integer
+                        example: 104857600
+                      cpu_seconds:
+                        type: number
+                        example: 42.5
+                      block_read_bytes:
+                        type: integer
+                        example: 1048576
+                      block_write_bytes:
+                        type: integer
+                        example: 2097152
                   states:
                     type: array
                     items:
@@ -282,12 +449,15 @@ def get_runs(pipeline_uuid):
         logger.warning("no pipeline found")
         return {}, 404
 
-    return jsonify(
-        [
-            PipelineRunSchema().dump(pr)
-            for pr in pipeline.pipeline_runs
-            if not pr.is_deleted
-        ]
+    try:
+        page = PageQuerySchema().load(request.args)
+    except ValidationError as validation_err:
+        logger.warning(validation_err)
+        return {"message": "Validation error", "errors": validation_err.messages}, 400
+
+    return paginated_response(
+        PipelineRunSchema(),
+        paginate(find_pipeline_runs(pipeline), PipelineRun, **page),
     )
 
 
@@ -295,6 +465,9 @@ def get_runs(pipeline_uuid):
 @permissions_required([SystemPermissionEnum.PIPELINES_CLIENT])
 def get_run_output(pipeline_uuid, pipeline_run_uuid):
     """Get the console output of a run.
+
+    All output is returned by default. Large output can be paged through with
+    the offset and limit parameters, or its end fetched with tail.
     ---
 
     tags:
@@ -305,6 +478,21 @@ def get_run_output(pipeline_uuid, pipeline_run_uuid):
         description: Requires key type PIPELINES_CLIENT
         schema:
           type: string
+      - in: query
+        name: offset
+        description: Character offset to start reading each stream from.
+        schema:
+          type: integer
+      - in: query
+        name: limit
+        description: Maximum number of characters to return from each stream.
+        schema:
+          type: integer
+      - in: query
+        name: tail
+        description: Return the last 'tail' characters of each stream.
+        schema:
+          type: integer
     responses:
       "200":
         description: "Fetched"
@@ -315,8 +503,16 @@ def get_run_output(pipeline_uuid, pipeline_run_uuid):
               properties:
                 std_out:
                   type: string
+                std_out_offset:
+                  type: integer
+                std_out_length:
+                  type: integer
                 std_err:
                   type: string
+                std_err_offset:
+                  type: integer
+                std_err_length:
+                  type: integer
       "400":
         description: "Bad request"
     """
@@ -330,10 +526,13 @@ def get_run_output(pipeline_uuid, pipeline_run_uuid):
         logger.warning("no pipeline run found")
         return {}, 404
 
-    return jsonify(
-        std_out=pipeline_run.std_out or "",
-        std_err=pipeline_run.std_err or "",
-    )
+    try:
+        query = ConsoleQuerySchema().load(request.args)
+    except ValidationError as validation_err:
+        logger.warning(validation_err)
+        return {"message": "Validation error", "errors": validation_err.messages}, 400
+
+    return jsonify(find_pipeline_run_console(pipeline_run, **query))
 
 
 @run_bp.route("/<pipeline_uuid>/runs/<pipeline_run_uuid>/console", methods=["PUT"])
@@ -386,6 +585,208 @@ def upload_run_output(pipeline_uuid, pipeline_run_uuid):
     return {}, 200
 
 
+@run_bp.route("/<pipeline_uuid>/runs/<pipeline_run_uuid>/console", methods=["PATCH"])
+@verify_content_type_and_params(
+    ["std_out_offset", "std_err_offset"], ["std_out", "std_err"]
+)
+@permissions_required([SystemPermissionEnum.PIPELINES_WORKER])
+def append_run_output(pipeline_uuid, pipeline_run_uuid):
+    """Append to the console output.
+
+    Output is written at the supplied offsets (the length of the output already
+    sent), replacing any output stored past them.
+    ---
+
+    tags:
+      - pipeline runs
+    parameters:
+      - in: header
+        name: Workflow-API-Key
+        description: Requires key type PIPELINES_WORKER
+        schema:
+          type: string
+    requestBody:
+      description: "new standard output and error"
+      required: true
+      content:
+        application/json:
+          schema:
+            type: object
+            properties:
+              std_out:
+                type: string
+              std_out_offset:
+                type: integer
+                example: 0
+              std_err:
+                type: string
+              std_err_offset:
+                type: integer
+                example: 0
+    responses:
+      "200":
+        description: "Updated"
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                std_out_length:
+                  type: integer
+                std_err_length:
+                  type: integer
+      "400":
+        description: "Bad request, or an offset past the end of the output"
+    """
+    pipeline = find_pipeline(pipeline_uuid)
+    if pipeline is None:
+        logger.warning("no pipeline found")
+        return {}, 404
+
+    pipeline_run = find_pipeline_run(pipeline_run_uuid)
+    if pipeline_run is None:
+        logger.warning("no pipeline run found")
+        return {}, 404
+
+    try:
+        (std_out_length, std_err_length) = append_pipeline_run_output(
+            pipeline_run.uuid, request.json
+        )
+    except ValidationError as validation_err:
+        logger.warning(validation_err)
+        return {"message": "Validation error", "errors": validation_err.messages}, 400
+    except ValueError as value_err:
+        logger.warning(value_err)
+        return {"message": str(value_err)}, 400
+
+    return {"std_out_length": std_out_length, "std_err_length": std_err_length}, 200
+
+
+@run_bp.route("/<pipeline_uuid>/runs/<pipeline_run_uuid>/state", methods=["GET"])
+@permissions_required(
+    [SystemPermissionEnum.PIPELINES_CLIENT, SystemPermissionEnum.PIPELINES_WORKER]
+)
+def get_run_state(pipeline_uuid, pipeline_run_uuid):
+    """Get the current state of a run.
+    ---
+
+    tags:
+      - pipeline runs
+    parameters:
+      - in: header
+        name: Workflow-API-Key
+        description: Requires key type PIPELINES_CLIENT or PIPELINES_WORKER
+        schema:
+          type: string
+    responses:
+      "200":
+        description: "Fetched"
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                state:
+                  type: string
+                  example: RUNNING
+      "404":
+        description: "Not found"
+    """
+    pipeline = find_pipeline(pipeline_uuid)
+    if pipeline is None:
+        return {}, 404
+
+    pipeline_run = find_pipeline_run(pipeline_run_uuid)
+    if pipeline_run is None:
+        return {}, 404
+
+    return jsonify(RunStateExportSchema().dump(pipeline_run))
+
+
+@run_bp.route("/<pipeline_uuid>/runs/<pipeline_run_uuid>/cancel", methods=["POST"])
+@permissions_required([SystemPermissionEnum.PIPELINES_CLIENT])
+def cancel_run(pipeline_uuid, pipeline_run_uuid):
+    """Cancel a run.
+
+    Running runs are stopped by their worker shortly afterwards.
+    ---
+
+    tags:
+      - pipeline runs
+    parameters:
+      - in: header
+        name: Workflow-API-Key
+        description: Requires key type PIPELINES_CLIENT
+        schema:
+          type: string
+    responses:
+      "200":
+        description: "Cancelled"
+      "400":
+        description: "Bad request (the run has already finished)"
+      "404":
+        description: "Not found"
+    """
+    pipeline = find_pipeline(pipeline_uuid)
+    if pipeline is None:
+        return {}, 404
+
+    pipeline_run = find_pipeline_run(pipeline_run_uuid)
+    if pipeline_run is None:
+        return {}, 404
+
+    try:
+        cancel_pipeline_run(pipeline_run.uuid)
+    except ValueError as value_err:
+        logger.warning(value_err)
+        return {"message": "Unable to cancel pipeline run"}, 400
+
+    return {}, 200
+
+
+@run_bp.route("/<pipeline_uuid>/runs/<pipeline_run_uuid>/restart", methods=["POST"])
+@permissions_required([SystemPermissionEnum.PIPELINES_WORKER])
+def restart_run(pipeline_uuid, pipeline_run_uuid):
+    """Start a RUNNING run over again.
+
+    Used by a worker that received the run again after its previous worker
+    died. The output, metrics and artifacts of the run are discarded.
+    Runs with a recent heartbeat can't be restarted.
+    ---
+
+    tags:
+      - pipeline runs
+    parameters:
+      - in: header
+        name: Workflow-API-Key
+        description: Requires key type PIPELINES_WORKER
+        schema:
+          type: string
+    responses:
+      "200":
+        description: "Restarted"
+      "400":
+        description: "Bad request (the run is not RUNNING, or is still alive)"
+      "404":
+        description: "Not found"
+    """
+    pipeline = find_pipeline(pipeline_uuid)
+    if pipeline is None:
+        return {}, 404
+
+    pipeline_run = find_pipeline_run(pipeline_run_uuid)
+    if pipeline_run is None:
+        return {}, 404
+
+    try:
+        restart_pipeline_run(pipeline_run.uuid)
+    except ValueError as value_err:
+        logger.warning(value_err)
+        return {"message": "Unable to restart pipeline run"}, 400
+
+    return {}, 200
+
+
 @run_bp.route("/<pipeline_uuid>/runs/<pipeline_run_uuid>/state", methods=["PUT"])
 @verify_content_type_and_params(["state"], [])
 @permissions_required([SystemPermissionEnum.PIPELINES_WORKER])
@@ -440,10 +841,11 @@ def upload_run_state(pipeline_uuid, pipeline_run_uuid):
     return {}, 200
 
 
-@run_bp.route("/<pipeline_uuid>/runs/<pipeline_run_uuid>/artifacts", methods=["POST"])
+@run_bp.route("/<pipeline_uuid>/runs/<pipeline_run_uuid>/environment", methods=["PUT"])
+@verify_content_type_and_params(["docker_image_digest"], [])
 @permissions_required([SystemPermissionEnum.PIPELINES_WORKER])
-def upload_run_artifact(pipeline_uuid, pipeline_run_uuid):
-    """Upload an artifact associated with a pipeline run.
+def upload_run_environment(pipeline_uuid, pipeline_run_uuid):
+    """Record the environment of a run.
     ---
 
     tags:
@@ -454,29 +856,23 @@ def upload_run_artifact(pipeline_uuid, pipeline_run_uuid):
         description: Requires key type PIPELINES_WORKER
         schema:
           type: string
-      - in: query
-        name: name
-        schema:
-          type: string
     requestBody:
-      description: "binary file content"
+      description: "run environment"
       required: true
+      content:
+        application/json:
+          schema:
+            type: object
+            properties:
+              docker_image_digest:
+                type: string
+                example: python@sha256:4c4e8f3d2a...
     responses:
       "200":
         description: "Updated"
       "400":
         description: "Bad request"
-      "413":
-        description: "Payload Too Large"
     """
-    if "name" not in request.args:
-        logger.warning("Invalid query arguments")
-        return {}, 400
-    filename = request.args["name"]
-    if len(filename) > 255:
-        logger.warning("filename too long")
-        return {}, 400
-
     pipeline = find_pipeline(pipeline_uuid)
     if pipeline is None:
         logger.warning("no pipeline found")
@@ -488,8 +884,423 @@ def upload_run_artifact(pipeline_uuid, pipeline_run_uuid):
         return {}, 404
 
     try:
-        create_pipeline_run_artifact(pipeline_run.uuid, filename, request.stream)
-        return {}, 200
-    except ValueError as value_err:
-        logger.warning(value_err)
-        return {}, 400
+        update_pipeline_run_environment(pipeline_run.uuid, request.json)
+    except ValidationError as validation_err:
+        logger.warning(validation_err)
+        return {"message": "Validation error", "errors": validation_err.messages}, 400
+
+    return {}, 200
+
+
+@run_bp.route("/<pipeline_uuid>/runs/<pipeline_run_uuid>/cache", methods=["PUT"])
+@verify_content_type_and_params(["cache_key"], [])
+@permissions_required([SystemPermissionEnum.PIPELINES_WORKER])
+def check_run_cache(pipeline_uuid, pipeline_run_uuid):
+    """Record the cache key of a RUNNING run, and complete it with the artifacts
+    of an identical earlier run if its pipeline uses the run cache.
+    ---
+
+    tags:
+      - pipeline runs
+    parameters:
+      - in: header
+        name: Workflow-API-Key
+        description: Requires key type PIPELINES_WORKER
+        schema:
+          type: string
+    requestBody:
+      description: "the cache key of the run"
+      required: true
+      content:
+        application/json:
+          schema:
+            type: object
+            properties:
+              cache_key:
+                type: string
+                description: sha256 of the run's image, commit, script and inputs.
+    responses:
+      "200":
+        description: "Checked"
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                cached_run_uuid:
+                  type: string
+                  description: The earlier run (null when the run should go ahead).
+      "400":
+        description: "Bad request (the run is not RUNNING)"
+      "404":
+        description: "Not found"
+    """
+    pipeline = find_pipeline(pipeline_uuid)
+    if pipeline is None:
+        logger.warning("no pipeline found")
+        return {}, 404
+
+    pipeline_run = find_pipeline_run(pipeline_run_uuid)
+    if pipeline_run is None:
+        logger.warning("no pipeline run found")
+        return {}, 404
+
+    try:
+        cached_run = check_pipeline_run_cache(pipeline_run.uuid, request.json)
+    except ValidationError as validation_err:
+        logger.warning(validation_err)
+        return {"message": "Validation error", "errors": validation_err.messages}, 400
+    except ValueError as value_err:
+        logger.warning(value_err)
+        return {"message": "Unable to check run cache"}, 400
+
+    cached_run_uuid = cached_run.uuid if cached_run is not None else None
+    return {"cached_run_uuid": cached_run_uuid}, 200
+
+
+@run_bp.route("/<pipeline_uuid>/runs/<pipeline_run_uuid>/heartbeat", methods=["PUT"])
+@verify_content_type_and_params(["worker_ip"], [])
+@permissions_required([SystemPermissionEnum.PIPELINES_WORKER])
+def upload_run_heartbeat(pipeline_uuid, pipeline_run_uuid):
+    """Record that the worker of a RUNNING run is alive.
+
+    Runs whose heartbeats stop are restarted (see reap_stale_pipeline_runs()).
+    ---
+
+    tags:
+      - pipeline runs
+    parameters:
+      - in: header
+        name: Workflow-API-Key
+        description: Requires key type PIPELINES_WORKER
+        schema:
+          type: string
+    requestBody:
+      description: "the worker of the run"
+      required: true
+      content:
+        application/json:
+          schema:
+            type: object
+            properties:
+              worker_ip:
+                type: string
+                example: 10.0.1.15
+    responses:
+      "200":
+        description: "Updated"
+      "400":
+        description: "Bad request (the run is not RUNNING)"
+      "404":
+        description: "Not found"
+    """
+    pipeline = find_pipeline(pipeline_uuid)
+    if pipeline is None:
+        logger.warning("no pipeline found")
+        return {}, 404
+
+    pipeline_run = find_pipeline_run(pipeline_run_uuid)
+    if pipeline_run is None:
+        logger.warning("no pipeline run found")
+        return {}, 404
+
+    try:
+        update_pipeline_run_heartbeat(pipeline_run.uuid, request.json)
+    except ValidationError as validation_err:
+        logger.warning(validation_err)
+        return {"message": "Validation error", "errors": validation_err.messages}, 400
+    except ValueError as value_err:
+        logger.warning(value_err)
+        return {"message": "Unable to update heartbeat"}, 400
+
+    return {}, 200
+
+
+@run_bp.route("/<pipeline_uuid>/runs/<pipeline_run_uuid>/metrics", methods=["PUT"])
+@verify_content_type_and_params(["phases"], ["resources"])
+@permissions_required([SystemPermissionEnum.PIPELINES_WORKER])
+def upload_run_metrics(pipeline_uuid, pipeline_run_uuid):
+    """Record the time taken by each phase of a run, and its resource usage.
+    ---
+
+    tags:
+      - pipeline runs
+    parameters:
+      - in: header
+        name: Workflow-API-Key
+        description: Requires key type PIPELINES_WORKER
+        schema:
+          type: string
+    requestBody:
+      description: "run phase timings and resource usage"
+      required: true
+      content:
+        application/json:
+          schema:
+            type: object
+            properties:
+              phases:
+                type: array
+                items:
+                  type: object
+                  properties:
+                    name:
+                      type: string
+                      example: pull
+                    duration:
+                      type: number
+                      example: 12.5
+                    byte_count:
+                      type: integer
+                      example: 1024
+              resources:
+                type: object
+                properties:
+                  peak_memory_bytes:
+                    type: integer
+                    example: 104857600
+                  cpu_seconds:
+                    type: number
+                    example: 42.5
+                  block_read_bytes:
+                    type: integer
+                    example: 1048576
+                  block_write_bytes:
+                    type: integer
+                    example: 2097152
+    responses:
+      "200":
+        description: "Updated"
+      "400":
+        description: "Bad request"
+    """
+    pipeline = find_pipeline(pipeline_uuid)
+    if pipeline is None:
+        logger.warning("no pipeline found")
+        return {}, 404
+
+    pipeline_run = find_pipeline_run(pipeline_run_uuid)
+    if pipeline_run is None:
+        logger.warning("no pipeline run found")
+        return {}, 404
+
+    try:
+        update_pipeline_run_metrics(pipeline_run.uuid, request.json)
+    except ValidationError as validation_err:
+        logger.warning(validation_err)
+        return {"message": "Validation error", "errors": validation_err.messages}, 400
+
+    return {}, 200
+
+
+@run_bp.route("/<pipeline_uuid>/runs/<pipeline_run_uuid>/artifacts", methods=["POST"])
+@permissions_required([SystemPermissionEnum.PIPELINES_WORKER])
+def upload_run_artifact(pipeline_uuid, pipeline_run_uuid):
+    """Upload an artifact associated with a pipeline run.
+    ---
+
+    tags:
+      - pipeline runs
+    parameters:
+      - in: header
+        name: Workflow-API-Key
+        description: Requires key type PIPELINES_WORKER
+        schema:
+          type: string
+      - in: query
+        name: name
+        schema:
+          type: string
+    requestBody:
+      description: "binary file content"
+      required: true
+    responses:
+      "200":
+        description: "Updated"
+      "400":
+        description: "Bad request"
+      "413":
+        description: "Payload Too Large"
+    """
+    if "name" not in request.args:
+        logger.warning("Invalid query arguments")
+        return {}, 400
+    filename = request.args["name"]
+    if len(filename) > 255:
+        logger.warning("filename too long")
+        return {}, 400
+
+    pipeline = find_pipeline(pipeline_uuid)
+    if pipeline is None:
+        logger.warning("no pipeline found")
+        return {}, 404
+
+    pipeline_run = find_pipeline_run(pipeline_run_uuid)
+    if pipeline_run is None:
+        logger.warning("no pipeline run found")
+        return {}, 404
+
+    try:
+        create_pipeline_run_artifact(pipeline_run.uuid, filename, request.stream)
+        return {}, 200
+    except ValueError as value_err:
+        logger.warning(value_err)
+        return {}, 400
+
+
+@run_bp.route(
+    "/<pipeline_uuid>/runs/<pipeline_run_uuid>/artifacts/uploads", methods=["POST"]
+)
+@verify_content_type_and_params(["name", "size"], [])
+@permissions_required([SystemPermissionEnum.PIPELINES_WORKER])
+def create_run_artifact_upload(pipeline_uuid, pipeline_run_uuid):
+    """Create presigned URLs to upload an artifact to directly.
+
+    Files larger than part_size are uploaded in parts: upload each part_size
+    block of the file to the next URL, and keep the ETag of each response to
+    complete the upload.
+    ---
+
+    tags:
+      - pipeline runs
+    parameters:
+      - in: header
+        name: Workflow-API-Key
+        description: Requires key type PIPELINES_WORKER
+        schema:
+          type: string
+    requestBody:
+      description: "artifact to upload"
+      required: true
+      content:
+        application/json:
+          schema:
+            type: object
+            properties:
+              name:
+                type: string
+                example: output.csv
+              size:
+                type: integer
+                example: 1024
+    responses:
+      "200":
+        description: "Created"
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                uuid:
+                  type: string
+                  example: "5ea9102b2abd498f9830389debb21fb8"
+                upload_id:
+                  type: string
+                  description: Only set for multipart uploads.
+                part_size:
+                  type: integer
+                urls:
+                  type: array
+                  items:
+                    type: string
+      "400":
+        description: "Bad request"
+    """
+    pipeline = find_pipeline(pipeline_uuid)
+    if pipeline is None:
+        logger.warning("no pipeline found")
+        return {}, 404
+
+    pipeline_run = find_pipeline_run(pipeline_run_uuid)
+    if pipeline_run is None:
+        logger.warning("no pipeline run found")
+        return {}, 404
+
+    try:
+        return create_pipeline_run_artifact_upload(pipeline_run.uuid, request.json)
+    except ValidationError as validation_err:
+        logger.warning(validation_err)
+        return {"message": "Validation error", "errors": validation_err.messages}, 400
+
+
+@run_bp.route(
+    "/<pipeline_uuid>/runs/<pipeline_run_uuid>/artifacts/uploads/<artifact_uuid>/complete",
+    methods=["POST"],
+)
+@verify_content_type_and_params(["name"], ["upload_id", "parts"])
+@permissions_required([SystemPermissionEnum.PIPELINES_WORKER])
+def complete_run_artifact_upload(pipeline_uuid, pipeline_run_uuid, artifact_uuid):
+    """Record an artifact uploaded to presigned URLs.
+    ---
+
+    tags:
+      - pipeline runs
+    parameters:
+      - in: header
+        name: Workflow-API-Key
+        description: Requires key type PIPELINES_WORKER
+        schema:
+          type: string
+    requestBody:
+      description: "the completed upload"
+      required: true
+      content:
+        application/json:
+          schema:
+            type: object
+            properties:
+              name:
+                type: string
+                example: output.csv
+              upload_id:
+                type: string
+              parts:
+                type: array
+                items:
+                  type: object
+                  properties:
+                    part_number:
+                      type: integer
+                      example: 1
+                    etag:
+                      type: string
+    responses:
+      "200":
+        description: "Created"
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                uuid:
+                  type: string
+                  example: "5ea9102b2abd498f9830389debb21fb8"
+                name:
+                  type: string
+                  example: output.csv
+                url:
+                  type: string
+      "400":
+        description: "Bad request, or the upload is incomplete"
+    """
+    pipeline = find_pipeline(pipeline_uuid)
+    if pipeline is None:
+        logger.warning("no pipeline found")
+        return {}, 404
+
+    pipeline_run = find_pipeline_run(pipeline_run_uuid)
+    if pipeline_run is None:
+        logger.warning("no pipeline run found")
+        return {}, 404
+
+    try:
+        artifact = complete_pipeline_run_artifact_upload(
+            pipeline_run.uuid, artifact_uuid, request.json
+        )
+        return jsonify(ArtifactSchema().dump(artifact))
+    except ValidationError as validation_err:
+        logger.warning(validation_err)
+        return {"message": "Validation error", "errors": validation_err.messages}, 400
+    except ValueError as value_err:
+        logger.warning(value_err)
+        return {"message": str(value_err)}, 400
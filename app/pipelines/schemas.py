@@ -1,8 +1,14 @@
-from marshmallow import Schema, fields, validate
+from marshmallow import Schema, ValidationError, fields, validate
 from blob_utils.schemas import UUID
 from marshmallow_enum import EnumField
 
-from ..model_utils import RunStateEnum
+from ..constants import MAX_PAGE_LIMIT, PAGE_LIMIT
+from ..model_utils import (
+    ResourceClassEnum,
+    RunPriorityEnum,
+    RunStateEnum,
+    decode_cursor,
+)
 
 
 class InputSchema(Schema):
@@ -28,6 +34,9 @@ class CreatePipelineSchema(Schema):
     repository_ssh_url = fields.Str(required=True, validate=validate.Length(min=1))
     repository_branch = fields.Str(missing="master")
     repository_script = fields.Str(missing="openfido.sh")
+    timeout = fields.Int(missing=None, allow_none=True, validate=validate.Range(min=1))
+    resource_class = EnumField(ResourceClassEnum, missing=ResourceClassEnum.SMALL)
+    use_run_cache = fields.Bool(missing=False)
 
 
 class CreateRunSchema(Schema):
@@ -35,6 +44,65 @@ class CreateRunSchema(Schema):
 
     inputs = fields.Nested(InputSchema, many=True, required=True)
     callback_url = fields.Url(missing="", require_tld=True)
+    priority = EnumField(RunPriorityEnum, missing=RunPriorityEnum.NORMAL)
+
+
+class AppendRunOutputSchema(Schema):
+    """ Validation schema for append_pipeline_run_output() """
+
+    std_out = fields.Str(missing="")
+    std_err = fields.Str(missing="")
+    std_out_offset = fields.Int(required=True, validate=validate.Range(min=0))
+    std_err_offset = fields.Int(required=True, validate=validate.Range(min=0))
+
+
+class CreateUploadSchema(Schema):
+    """ Validation schema for create_pipeline_run_artifact_upload() """
+
+    name = fields.Str(required=True, validate=validate.Length(min=1, max=255))
+    size = fields.Int(required=True, validate=validate.Range(min=0))
+
+
+class UploadPartSchema(Schema):
+    """ A part of a multipart upload. """
+
+    part_number = fields.Int(required=True, validate=validate.Range(min=1))
+    etag = fields.Str(required=True)
+
+
+class CompleteUploadSchema(Schema):
+    """ Validation schema for complete_pipeline_run_artifact_upload() """
+
+    name = fields.Str(required=True, validate=validate.Length(min=1, max=255))
+    upload_id = fields.Str(missing=None)
+    parts = fields.Nested(UploadPartSchema, many=True, missing=[])
+
+
+class ConsoleQuerySchema(Schema):
+    """ Validation schema for get_run_output() query parameters. """
+
+    offset = fields.Int(missing=0, validate=validate.Range(min=0))
+    limit = fields.Int(missing=None, validate=validate.Range(min=1))
+    tail = fields.Int(missing=None, validate=validate.Range(min=1))
+
+
+class Cursor(fields.Field):
+    """ A page cursor, loaded as the (created_at, id) that the page follows. """
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        try:
+            return decode_cursor(value)
+        except ValueError as value_err:
+            raise ValidationError("Not a valid cursor.") from value_err
+
+
+class PageQuerySchema(Schema):
+    """ Validation schema for the query parameters of list endpoints. """
+
+    limit = fields.Int(
+        missing=PAGE_LIMIT, validate=validate.Range(min=1, max=MAX_PAGE_LIMIT)
+    )
+    after = Cursor(missing=None)
 
 
 class UpdateRunStateSchema(Schema):
@@ -43,6 +111,76 @@ class UpdateRunStateSchema(Schema):
     state = EnumField(RunStateEnum, required=True)
 
 
+class UpdateRunEnvironmentSchema(Schema):
+    """ Validation schema for update_run_environment() """
+
+    docker_image_digest = fields.Str(required=True, validate=validate.Length(min=1))
+
+
+class RunHeartbeatSchema(Schema):
+    """ Validation schema for update_run_heartbeat() """
+
+    worker_ip = fields.Str(required=True, validate=validate.Length(min=1, max=50))
+
+
+class RunCacheSchema(Schema):
+    """ Validation schema for check_run_cache() """
+
+    cache_key = fields.Str(required=True, validate=validate.Length(equal=64))
+
+
+class RunPhaseSchema(Schema):
+    """ The timing of a phase of a run. """
+
+    name = fields.Str(required=True, validate=validate.Length(min=1, max=50))
+    duration = fields.Float(required=True, validate=validate.Range(min=0))
+    byte_count = fields.Int(
+        missing=None, allow_none=True, validate=validate.Range(min=0)
+    )
+
+
+class RunResourcesSchema(Schema):
+    """ The resources used by the container of a run. """
+
+    peak_memory_bytes = fields.Int(
+        missing=None, allow_none=True, validate=validate.Range(min=0)
+    )
+    cpu_seconds = fields.Float(
+        missing=None, allow_none=True, validate=validate.Range(min=0)
+    )
+    block_read_bytes = fields.Int(
+        missing=None, allow_none=True, validate=validate.Range(min=0)
+    )
+    block_write_bytes = fields.Int(
+        missing=None, allow_none=True, validate=validate.Range(min=0)
+    )
+
+
+class UpdateRunMetricsSchema(Schema):
+    """ Validation schema for update_run_metrics() """
+
+    phases = fields.Nested(RunPhaseSchema, many=True, required=True)
+    resources = fields.Nested(RunResourcesSchema, missing=None, allow_none=True)
+
+
+class PipelineResourcesSchema(Schema):
+    """ Export the resources used by the runs of a pipeline. """
+
+    run_count = fields.Int()
+    max_peak_memory_bytes = fields.Int()
+    avg_peak_memory_bytes = fields.Int()
+    total_cpu_seconds = fields.Float()
+    avg_cpu_seconds = fields.Float()
+    total_block_read_bytes = fields.Int()
+    total_block_write_bytes = fields.Int()
+
+
+class RunStateExportSchema(Schema):
+    """ Export the current state of a run. """
+
+    state = fields.Function(lambda obj: obj.run_state_enum().name)
+
+
 class RunStateSchema(Schema):
     """ Export RunState """
 
@@ -60,6 +198,11 @@ class PipelineSchema(Schema):
     repository_ssh_url = fields.Str()
     repository_branch = fields.Str()
     repository_script = fields.Str()
+    timeout = fields.Int(allow_none=True)
+    resource_class = fields.Function(
+        lambda obj: ResourceClassEnum(obj.resource_class).name
+    )
+    use_run_cache = fields.Bool()
     created_at = fields.DateTime()
     updated_at = fields.DateTime()
 
@@ -83,7 +226,11 @@ class PipelineRunSchema(Schema):
 
     uuid = UUID()
     sequence = fields.Int()
+    priority = fields.Function(lambda obj: RunPriorityEnum(obj.priority).name)
     created_at = fields.DateTime()
+    started_at = fields.DateTime(allow_none=True)
+    completed_at = fields.DateTime(allow_none=True)
+    docker_image_digest = fields.Str(allow_none=True)
     inputs = fields.Nested(
         InputExportSchema, many=True, attribute="pipeline_run_inputs"
     )
@@ -91,3 +238,5 @@ class PipelineRunSchema(Schema):
     artifacts = fields.Nested(
         ArtifactSchema, many=True, attribute="pipeline_run_artifacts"
     )
+    phases = fields.Nested(RunPhaseSchema, many=True, attribute="pipeline_run_phases")
+    resources = fields.Function(lambda obj: RunResourcesSchema().dump(obj))
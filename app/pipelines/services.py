@@ -1,28 +1,74 @@
 import json
 import logging
+import math
+import re
 import urllib
 import urllib.request
 import uuid
+from datetime import datetime, timedelta
 from urllib.error import URLError
 from urllib.parse import quote
 from blob_utils import upload_stream
 
+import boto3
+from botocore.exceptions import ClientError
 from flask import current_app
+from marshmallow.exceptions import ValidationError
 from werkzeug.utils import secure_filename
 
-from ..constants import CALLBACK_TIMEOUT, S3_BUCKET
-from ..model_utils import RunStateEnum
+from ..constants import (
+    CALLBACK_TIMEOUT,
+    CONSOLE_CHUNK_SIZE,
+    MAX_RUN_RESTARTS,
+    MAX_RUN_TIMEOUT,
+    RUN_HEARTBEAT_TIMEOUT,
+    RUN_STARVATION_TIMEOUT,
+    S3_ACCESS_KEY_ID,
+    S3_BUCKET,
+    S3_ENDPOINT_URL,
+    S3_REGION_NAME,
+    S3_SECRET_ACCESS_KEY,
+    UPLOAD_MAX_PARTS,
+    UPLOAD_PART_SIZE,
+    UPLOAD_PRESIGNED_TIMEOUT,
+)
+from ..model_utils import RunPriorityEnum, RunStateEnum
 from ..tasks import execute_pipeline
 from .models import (
+    OUTPUT_STREAMS,
     Pipeline,
     PipelineRun,
     PipelineRunArtifact,
     PipelineRunInput,
+    PipelineRunOutput,
+    PipelineRunPhase,
     PipelineRunState,
     db,
 )
-from .queries import find_pipeline, find_pipeline_run, find_run_state_type
-from .schemas import CreateRunSchema, UpdateRunStateSchema, CreatePipelineSchema
+from .queries import (
+    count_pipeline_run_states,
+    find_pipeline,
+    find_cached_pipeline_run,
+    find_pipeline_run,
+    find_pipeline_run_output_lengths,
+    find_run_state_type_id,
+    load_run_state_types,
+    find_stale_pipeline_runs,
+    find_starved_pipeline_runs,
+)
+from .schemas import (
+    AppendRunOutputSchema,
+    CompleteUploadSchema,
+    CreatePipelineSchema,
+    CreateRunSchema,
+    CreateUploadSchema,
+    RunCacheSchema,
+    RunHeartbeatSchema,
+    RunResourcesSchema,
+    UpdateRunEnvironmentSchema,
+    UpdateRunMetricsSchema,
+    UpdateRunStateSchema,
+)
 
 # make the request lib mockable for testing:
 urllib_request = urllib.request
@@ -64,12 +110,24 @@ def delete_pipeline_run(pipeline_uuid, pipeline_run_uuid):
     db.session.commit()
 
 
+def _load_pipeline(pipeline_json):
+    """ Validate the JSON of a Pipeline. """
+    data = CreatePipelineSchema().load(pipeline_json)
+
+    # the broker redelivers runs that outlast MAX_RUN_TIMEOUT (see make_celery())
+    max_timeout = current_app.config[MAX_RUN_TIMEOUT]
+    if data["timeout"] is not None and data["timeout"] > max_timeout:
+        raise ValidationError(f"Must be at most {max_timeout} seconds.", "timeout")
+
+    return data
+
+
 def create_pipeline(pipeline_json):
     """Create a Pipeline.
 
     Note: The db.session is not committed. Be sure to commit the session.
     """
-    data = CreatePipelineSchema().load(pipeline_json)
+    data = _load_pipeline(pipeline_json)
 
     pipeline = Pipeline(
         name=data["name"],
@@ -78,6 +136,9 @@ def create_pipeline(pipeline_json):
         repository_ssh_url=data["repository_ssh_url"],
         repository_branch=data["repository_branch"],
         repository_script=data["repository_script"],
+        timeout=data["timeout"],
+        resource_class=data["resource_class"],
+        use_run_cache=data["use_run_cache"],
     )
     db.session.add(pipeline)
     db.session.commit()
@@ -90,7 +151,7 @@ def update_pipeline(pipeline_uuid, pipeline_json):
 
     Note: The db.session is not committed. Be sure to commit the session.
     """
-    data = CreatePipelineSchema().load(pipeline_json)
+    data = _load_pipeline(pipeline_json)
 
     pipeline = find_pipeline(pipeline_uuid)
     if pipeline is None:
@@ -102,21 +163,33 @@ def update_pipeline(pipeline_uuid, pipeline_json):
     pipeline.repository_ssh_url = data["repository_ssh_url"]
     pipeline.repository_branch = data["repository_branch"]
     pipeline.repository_script = data["repository_script"]
+    pipeline.timeout = data["timeout"]
+    pipeline.resource_class = data["resource_class"]
+    pipeline.use_run_cache = data["use_run_cache"]
     db.session.add(pipeline)
     db.session.commit()
 
     return pipeline
 
 
-def create_pipeline_run_state(run_state_enum):
-    run_state_type = find_run_state_type(run_state_enum)
+def preload_run_state_types():
+    """ Create (if needed) and cache the RunStateTypes before their first use. """
+    load_run_state_types()
+    db.session.commit()
+
+
+def create_pipeline_run_state(run_state_enum, pipeline_run=None):
+    """Create a PipelineRunState, adding it to the history of pipeline_run if
+    given (without loading the rest of it).
+    """
     pipeline_run_state = PipelineRunState(
-        name=run_state_type.name,
-        description=run_state_type.description,
-        code=int(run_state_type.code),
+        name=run_state_enum.name,
+        description=run_state_enum.name,
+        code=run_state_enum.value,
+        run_state_type_id=find_run_state_type_id(run_state_enum),
     )
-    run_state_type.pipeline_run_states.append(pipeline_run_state)
-
+    if pipeline_run is not None:
+        pipeline_run_state.pipeline_run = pipeline_run
     return pipeline_run_state
 
 
@@ -130,16 +203,18 @@ def create_pipeline_run(pipeline_uuid, inputs_json, queued=False):
         raise ValueError("no pipeline found")
 
     sequence = len(pipeline.pipeline_runs) + 1
-    pipeline_run = PipelineRun(sequence=sequence, callback_url=data["callback_url"])
+    pipeline_run = PipelineRun(
+        sequence=sequence,
+        callback_url=data["callback_url"],
+        priority=data["priority"],
+    )
 
     for i in data["inputs"]:
         pipeline_run.pipeline_run_inputs.append(
             PipelineRunInput(filename=i["name"], url=i["url"])
         )
 
-    pipeline_run.pipeline_run_states.append(
-        create_pipeline_run_state(RunStateEnum.QUEUED)
-    )
+    create_pipeline_run_state(RunStateEnum.QUEUED, pipeline_run)
     pipeline.pipeline_runs.append(pipeline_run)
 
     if not queued:
@@ -157,10 +232,19 @@ def start_pipeline_run(pipeline_run):
     if pipeline_run.run_state_enum() != RunStateEnum.QUEUED:
         raise ValueError("Only PipelineRun in state QUEUED can be started.")
 
+    create_pipeline_run_state(RunStateEnum.NOT_STARTED, pipeline_run)
+    _dispatch_pipeline_run(pipeline_run)
+
+    return pipeline_run
+
+
+def _dispatch_pipeline_run(pipeline_run, redelivered=False):
+    """Send a NOT_STARTED PipelineRun to the workers.
+
+    A RUNNING run is sent as redelivered, for a worker to start it over again.
+    """
     pipeline = pipeline_run.pipeline
-    pipeline_run.pipeline_run_states.append(
-        create_pipeline_run_state(RunStateEnum.NOT_STARTED)
-    )
+    pipeline_run.dispatched_at = datetime.utcnow()
     db.session.commit()
 
     execute_pipeline.delay(
@@ -174,9 +258,107 @@ def start_pipeline_run(pipeline_run):
         pipeline.repository_ssh_url,
         pipeline.repository_branch,
         pipeline.repository_script,
+        pipeline.timeout,
+        resource_class=pipeline.resource_class,
+        priority=pipeline_run.priority,
+        redelivered=redelivered,
+        use_run_cache=pipeline.use_run_cache,
     )
 
-    return pipeline_run
+
+def promote_starved_pipeline_runs():
+    """Raise the priority of runs that have waited too long to start.
+
+    Runs still NOT_STARTED RUN_STARVATION_TIMEOUT seconds after they were
+    dispatched are dispatched again, one priority higher, so that low priority
+    runs progress even while higher priority runs keep arriving. (Workers only
+    execute the first copy of a run they receive.)
+
+    Returns the promoted runs.
+    """
+    starved_before = datetime.utcnow() - timedelta(
+        seconds=current_app.config[RUN_STARVATION_TIMEOUT]
+    )
+    promoted = []
+    for pipeline_run in find_starved_pipeline_runs(starved_before):
+        pipeline_run.priority = RunPriorityEnum(pipeline_run.priority).promoted()
+        _dispatch_pipeline_run(pipeline_run)
+        promoted.append(pipeline_run)
+
+    return promoted
+
+
+def _heartbeat_timeout_start():
+    """ Runs without a heartbeat since this time are presumed dead. """
+    return datetime.utcnow() - timedelta(
+        seconds=current_app.config[RUN_HEARTBEAT_TIMEOUT]
+    )
+
+
+def reap_stale_pipeline_runs():
+    """Recover RUNNING runs whose workers have stopped sending heartbeats.
+
+    A stale run is dispatched again, for another worker to restart it, unless
+    it has already been restarted MAX_RUN_RESTARTS times: then it fails (which
+    lets its workflow run carry on). Dispatching records dispatched_at, so a
+    run that stays stale (no worker has picked it up yet) is only dispatched
+    again once every RUN_HEARTBEAT_TIMEOUT. Its heartbeat_at is left alone:
+    workers only restart runs whose heartbeat is stale.
+
+    Returns the reaped runs.
+    """
+    reaped = []
+    for pipeline_run in find_stale_pipeline_runs(_heartbeat_timeout_start()):
+        attempts = count_pipeline_run_states(pipeline_run, RunStateEnum.RUNNING)
+        if attempts > MAX_RUN_RESTARTS:
+            logger.warning("Failing stale pipeline run %s", pipeline_run.uuid)
+            update_pipeline_run_state(
+                pipeline_run.uuid, {"state": RunStateEnum.FAILED.name}
+            )
+        else:
+            logger.warning("Restarting stale pipeline run %s", pipeline_run.uuid)
+            _dispatch_pipeline_run(pipeline_run, redelivered=True)
+        reaped.append(pipeline_run)
+
+    return reaped
+
+
+def _write_pipeline_run_output(pipeline_run, stream, offset, text, length):
+    """Write text to a stream of a PipelineRun's output at offset.
+
+    Any output already stored after offset is replaced. length is the current
+    length of the stream.
+    """
+    if offset < length:
+        PipelineRunOutput.query.filter(
+            PipelineRunOutput.pipeline_run_id == pipeline_run.id,
+            PipelineRunOutput.stream == stream,
+            PipelineRunOutput.position >= offset,
+        ).delete(synchronize_session=False)
+
+        straddling_chunk = PipelineRunOutput.query.filter(
+            PipelineRunOutput.pipeline_run_id == pipeline_run.id,
+            PipelineRunOutput.stream == stream,
+            PipelineRunOutput.position < offset,
+            PipelineRunOutput.position + PipelineRunOutput.length > offset,
+        ).one_or_none()
+        if straddling_chunk is not None:
+            straddling_chunk.length = offset - straddling_chunk.position
+            straddling_chunk.content = straddling_chunk.content[
+                : straddling_chunk.length
+            ]
+
+    for start in range(0, len(text), CONSOLE_CHUNK_SIZE):
+        content = text[start : start + CONSOLE_CHUNK_SIZE]
+        db.session.add(
+            PipelineRunOutput(
+                pipeline_run_id=pipeline_run.id,
+                stream=stream,
+                position=offset + start,
+                length=len(content),
+                content=content,
+            )
+        )
 
 
 def update_pipeline_run_output(pipeline_uuid, std_out, std_err):
@@ -185,19 +367,52 @@ def update_pipeline_run_output(pipeline_uuid, std_out, std_err):
     if pipeline_run is None:
         raise ValueError("pipeline run not found")
 
-    pipeline_run.std_out = std_out
-    pipeline_run.std_err = std_err
+    lengths = find_pipeline_run_output_lengths(pipeline_run)
+    for (stream, text, length) in zip(OUTPUT_STREAMS, (std_out, std_err), lengths):
+        _write_pipeline_run_output(pipeline_run, stream, 0, text, length)
 
     db.session.commit()
 
 
+def append_pipeline_run_output(pipeline_run_uuid, output_json):
+    """Write console output to a pipeline run at the given offsets.
+
+    Output already stored past an offset is replaced, so that a retried request
+    has no additional effect. Only new output is stored: existing output is
+    never loaded or rewritten.
+
+    Returns the new (std_out, std_err) lengths.
+    """
+    data = AppendRunOutputSchema().load(output_json)
+
+    pipeline_run = find_pipeline_run(pipeline_run_uuid)
+    if pipeline_run is None:
+        raise ValueError("pipeline run not found")
+
+    lengths = find_pipeline_run_output_lengths(pipeline_run)
+    for (stream, length) in zip(OUTPUT_STREAMS, lengths):
+        offset = data[f"{stream}_offset"]
+        if offset > length:
+            raise ValueError(f"{stream}_offset {offset} is past the end ({length})")
+
+    new_lengths = []
+    for (stream, length) in zip(OUTPUT_STREAMS, lengths):
+        offset = data[f"{stream}_offset"]
+        _write_pipeline_run_output(pipeline_run, stream, offset, data[stream], length)
+        new_lengths.append(offset + len(data[stream]))
+
+    db.session.commit()
+
+    return tuple(new_lengths)
+
+
 def notify_callback(pipeline_run):
     if not pipeline_run.callback_url:
         return
 
     pipeline_uuid = pipeline_run.uuid
     url = pipeline_run.callback_url
-    state = pipeline_run.pipeline_run_states[-1]
+    state = pipeline_run.run_state_enum()
 
     data = json.dumps({"pipeline_run_uuid": pipeline_uuid, "state": state.name})
 
@@ -228,7 +443,11 @@ def update_pipeline_run_state(
             f"Invalid state transition: {pipeline_run.run_state_enum().name}->{data['state'].name}"
         )
 
-    pipeline_run.pipeline_run_states.append(create_pipeline_run_state(data["state"]))
+    create_pipeline_run_state(data["state"], pipeline_run)
+    if data["state"] == RunStateEnum.RUNNING:
+        pipeline_run.heartbeat_at = datetime.utcnow()
+    elif data["state"].in_final_state():
+        pipeline_run.heartbeat_at = None
 
     db.session.commit()
 
@@ -240,6 +459,236 @@ def update_pipeline_run_state(
         update_workflow_run(pipeline_run)
 
 
+def cancel_pipeline_run(pipeline_run_uuid):
+    """Cancel a pipeline run.
+
+    The worker of a RUNNING run notices the cancellation when it next checks
+    the run's state, and stops its container.
+    """
+    update_pipeline_run_state(pipeline_run_uuid, {"state": RunStateEnum.CANCELLED.name})
+
+
+def restart_pipeline_run(pipeline_run_uuid):
+    """Start a RUNNING run over again.
+
+    Workers restart the runs they receive again after the worker running them
+    died (reap_stale_pipeline_runs() dispatches them again): the output,
+    phases, resource usage and artifacts of the lost attempt are discarded.
+    Runs with a recent heartbeat can't be restarted, so the broker's immediate
+    redelivery of a dead worker's task doesn't restart its run.
+    """
+    pipeline_run = find_pipeline_run(pipeline_run_uuid)
+    if pipeline_run is None:
+        raise ValueError("pipeline run not found")
+
+    if pipeline_run.run_state_enum() != RunStateEnum.RUNNING:
+        raise ValueError("Only PipelineRun in state RUNNING can be restarted.")
+    heartbeat_at = pipeline_run.heartbeat_at
+    if heartbeat_at is not None and heartbeat_at >= _heartbeat_timeout_start():
+        raise ValueError("PipelineRun is still running on a worker.")
+
+    PipelineRunOutput.query.filter(
+        PipelineRunOutput.pipeline_run_id == pipeline_run.id
+    ).delete()
+    for phase in pipeline_run.pipeline_run_phases:
+        db.session.delete(phase)
+    for artifact in pipeline_run.pipeline_run_artifacts:
+        db.session.delete(artifact)
+    pipeline_run.docker_image_digest = None
+    pipeline_run.worker_ip = None
+    pipeline_run.heartbeat_at = datetime.utcnow()
+    for name in RunResourcesSchema().fields:
+        setattr(pipeline_run, name, None)
+    # record the restart in the run's history:
+    create_pipeline_run_state(RunStateEnum.RUNNING, pipeline_run)
+    db.session.commit()
+
+
+def update_pipeline_run_heartbeat(pipeline_run_uuid, heartbeat_json):
+    """ Record that the worker of a RUNNING run is alive. """
+    data = RunHeartbeatSchema().load(heartbeat_json)
+
+    pipeline_run = find_pipeline_run(pipeline_run_uuid)
+    if pipeline_run is None:
+        raise ValueError("pipeline run not found")
+
+    if pipeline_run.run_state_enum() != RunStateEnum.RUNNING:
+        raise ValueError("PipelineRun is not RUNNING.")
+
+    pipeline_run.worker_ip = data["worker_ip"]
+    pipeline_run.heartbeat_at = datetime.utcnow()
+    db.session.commit()
+
+
+def check_pipeline_run_cache(pipeline_run_uuid, cache_json):
+    """Complete a RUNNING run with the artifacts of an identical earlier run.
+
+    Workers send the cache key of a run (see run_cache_key()) before running its
+    container. When its pipeline uses the run cache and an earlier run with the
+    same key COMPLETED, the run shares that run's artifacts and completes.
+
+    Returns the earlier run, or None when the run should go ahead.
+    """
+    data = RunCacheSchema().load(cache_json)
+
+    pipeline_run = find_pipeline_run(pipeline_run_uuid)
+    if pipeline_run is None:
+        raise ValueError("pipeline run not found")
+
+    if pipeline_run.run_state_enum() != RunStateEnum.RUNNING:
+        raise ValueError("PipelineRun is not RUNNING.")
+
+    cached_run = None
+    if pipeline_run.pipeline.use_run_cache:
+        cached_run = find_cached_pipeline_run(data["cache_key"])
+    pipeline_run.cache_key = data["cache_key"]
+    db.session.commit()
+    if cached_run is None:
+        return None
+
+    for artifact in cached_run.pipeline_run_artifacts:
+        pipeline_run.pipeline_run_artifacts.append(
+            PipelineRunArtifact(
+                name=artifact.name,
+                source_artifact=artifact.source_artifact or artifact,
+            )
+        )
+    db.session.commit()
+    update_pipeline_run_state(pipeline_run.uuid, {"state": RunStateEnum.COMPLETED.name})
+
+    return cached_run
+
+
+def create_pipeline_run_artifact_upload(run_uuid, upload_json):
+    """Issue presigned URLs that a worker can upload an artifact to directly.
+
+    Artifacts larger than UPLOAD_PART_SIZE are uploaded as a multipart upload:
+    each URL receives part_size bytes of the file, in order.
+    """
+    data = CreateUploadSchema().load(upload_json)
+
+    pipeline_run = find_pipeline_run(run_uuid)
+    if pipeline_run is None:
+        raise ValueError("pipeline run not found")
+
+    s3 = get_s3()
+    bucket = current_app.config[S3_BUCKET]
+    artifact_uuid = uuid.uuid4().hex
+    key = _artifact_key(pipeline_run, artifact_uuid, data["name"])
+
+    if data["size"] <= UPLOAD_PART_SIZE:
+        url = s3.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": bucket, "Key": key},
+            ExpiresIn=UPLOAD_PRESIGNED_TIMEOUT,
+        )
+        return {
+            "uuid": artifact_uuid,
+            "upload_id": None,
+            "part_size": UPLOAD_PART_SIZE,
+            "urls": [url],
+        }
+
+    part_size = max(UPLOAD_PART_SIZE, math.ceil(data["size"] / UPLOAD_MAX_PARTS))
+    upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key)["UploadId"]
+    urls = [
+        s3.generate_presigned_url(
+            "upload_part",
+            Params={
+                "Bucket": bucket,
+                "Key": key,
+                "UploadId": upload_id,
+                "PartNumber": part_number,
+            },
+            ExpiresIn=UPLOAD_PRESIGNED_TIMEOUT,
+        )
+        for part_number in range(1, math.ceil(data["size"] / part_size) + 1)
+    ]
+    return {
+        "uuid": artifact_uuid,
+        "upload_id": upload_id,
+        "part_size": part_size,
+        "urls": urls,
+    }
+
+
+def complete_pipeline_run_artifact_upload(run_uuid, artifact_uuid, complete_json):
+    """Record an artifact uploaded with create_pipeline_run_artifact_upload().
+
+    Multipart uploads are completed first. Completing an upload again has no
+    additional effect.
+    """
+    data = CompleteUploadSchema().load(complete_json)
+    if re.fullmatch("[0-9a-f]{32}", artifact_uuid) is None:
+        raise ValueError("invalid artifact uuid")
+
+    pipeline_run = find_pipeline_run(run_uuid)
+    if pipeline_run is None:
+        raise ValueError("pipeline run not found")
+
+    for artifact in pipeline_run.pipeline_run_artifacts:
+        if artifact.uuid == artifact_uuid:
+            return artifact
+
+    s3 = get_s3()
+    bucket = current_app.config[S3_BUCKET]
+    key = _artifact_key(pipeline_run, artifact_uuid, data["name"])
+    try:
+        if data["upload_id"] is not None:
+            s3.complete_multipart_upload(
+                Bucket=bucket,
+                Key=key,
+                UploadId=data["upload_id"],
+                MultipartUpload={
+                    "Parts": [
+                        {"PartNumber": part["part_number"], "ETag": part["etag"]}
+                        for part in data["parts"]
+                    ]
+                },
+            )
+        s3.head_object(Bucket=bucket, Key=key)
+    except ClientError as client_err:
+        raise ValueError(f"artifact upload not completed: {client_err}")
+
+    artifact = PipelineRunArtifact(uuid=artifact_uuid, name=data["name"])
+    _add_pipeline_run_artifact(pipeline_run, artifact)
+
+    db.session.commit()
+
+    return artifact
+
+
+def update_pipeline_run_environment(pipeline_run_uuid, environment_json):
+    """ Record the environment (docker image digest) a pipeline run used. """
+    data = UpdateRunEnvironmentSchema().load(environment_json)
+
+    pipeline_run = find_pipeline_run(pipeline_run_uuid)
+    if pipeline_run is None:
+        raise ValueError("pipeline run not found")
+
+    pipeline_run.docker_image_digest = data["docker_image_digest"]
+    db.session.commit()
+
+
+def update_pipeline_run_metrics(pipeline_run_uuid, metrics_json):
+    """ Replace the phase timings (and resource usage) of a pipeline run. """
+    data = UpdateRunMetricsSchema().load(metrics_json)
+
+    pipeline_run = find_pipeline_run(pipeline_run_uuid)
+    if pipeline_run is None:
+        raise ValueError("pipeline run not found")
+
+    for phase in pipeline_run.pipeline_run_phases:
+        db.session.delete(phase)
+    pipeline_run.pipeline_run_phases = [
+        PipelineRunPhase(**phase) for phase in data["phases"]
+    ]
+    if data["resources"] is not None:
+        for (name, value) in data["resources"].items():
+            setattr(pipeline_run, name, value)
+    db.session.commit()
+
+
 def copy_pipeline_run_artifact(pipeline_run_artifact, to_pipeline_run):
     """ Copy an artifact to a new run as input. """
     to_pipeline_run.pipeline_run_inputs.append(
@@ -250,22 +699,46 @@ def copy_pipeline_run_artifact(pipeline_run_artifact, to_pipeline_run):
     db.session.commit()
 
 
+def _add_pipeline_run_artifact(pipeline_run, artifact):
+    """Add an artifact to a run, replacing any artifact of the same name.
+
+    (Workers upload an output again when it changes after an early upload.)
+    """
+    for existing in list(pipeline_run.pipeline_run_artifacts):
+        if existing.name == artifact.name:
+            pipeline_run.pipeline_run_artifacts.remove(existing)
+            db.session.delete(existing)
+    pipeline_run.pipeline_run_artifacts.append(artifact)
+
+
+def _artifact_key(pipeline_run, artifact_uuid, filename):
+    """ The location of an artifact in the S3 bucket. """
+    return f"{pipeline_run.pipeline.uuid}/{pipeline_run.uuid}/{artifact_uuid}-{quote(filename)}"
+
+
+def get_s3():
+    """ Create an S3 client. """
+    return boto3.client(
+        "s3",
+        endpoint_url=current_app.config[S3_ENDPOINT_URL],
+        aws_access_key_id=current_app.config.get(S3_ACCESS_KEY_ID),
+        aws_secret_access_key=current_app.config.get(S3_SECRET_ACCESS_KEY),
+        region_name=current_app.config[S3_REGION_NAME],
+    )
+
+
 def create_pipeline_run_artifact(run_uuid, filename, stream):
     """ Create a PipelineRunArtifact from a stream. """
     pipeline_run = find_pipeline_run(run_uuid)
     if pipeline_run is None:
         raise ValueError("pipeline run not found")
 
-    sname = quote(filename)
     artifact_uuid = uuid.uuid4().hex
 
-    upload_stream(
-        f"{pipeline_run.pipeline.uuid}/{run_uuid}/{artifact_uuid}-{sname}",
-        stream,
-    )
+    upload_stream(_artifact_key(pipeline_run, artifact_uuid, filename), stream)
 
     artifact = PipelineRunArtifact(uuid=artifact_uuid, name=filename)
-    pipeline_run.pipeline_run_artifacts.append(artifact)
+    _add_pipeline_run_artifact(pipeline_run, artifact)
 
     db.session.commit()
 
@@ -0,0 +1,48 @@
+import fcntl
+import os
+from contextlib import ExitStack, contextmanager
+from os.path import join
+
+
+class WorkerSlots:
+    """A fixed number of run slots, shared by the worker processes of a host.
+
+    Each slot is a lock file: a run holds the locks of as many slots as its
+    resource class needs while it executes.
+    """
+
+    def __init__(self, directory, count):
+        self.directory = directory
+        self.count = count
+
+    def _lock_slot(self, stack, slot):
+        lock = stack.enter_context(open(join(self.directory, f"slot-{slot}.lock"), "a"))
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+
+    @contextmanager
+    def reserve(self, needed):
+        """Hold needed free slots for the duration.
+
+        Yields False (holding nothing) when there aren't enough free slots.
+        Runs needing more slots than there are use all of them.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        needed = min(needed, self.count)
+
+        with ExitStack() as stack:
+            held = 0
+            for slot in range(self.count):
+                if held == needed:
+                    break
+                if self._lock_slot(stack, slot):
+                    held += 1
+
+            if held < needed:
+                stack.close()
+                yield False
+            else:
+                yield True
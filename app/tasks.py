@@ -1,17 +1,74 @@
+import codecs
+import hashlib
 import json
 import os
+import queue
+import socket
 import subprocess
+import tarfile
 import tempfile
+import threading
+import time
 import urllib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from os.path import join
 from urllib.parse import quote
 
+import urllib3
 from celery import Celery, Task, shared_task
 from celery.utils.log import get_task_logger
 from flask import current_app
 
-from app.constants import WORKER_API_TOKEN
-from app.model_utils import RunStateEnum
+from app.caches import (
+    DockerImageCache,
+    GitMirrorCache,
+    InputFileCache,
+    directory_size,
+    docker_image_digest,
+    file_sha256,
+)
+from app.console import ConsoleCapture
+from app.containers import ContainerStatsSampler, ContainerWatchdog, kill_container
+from app.constants import (
+    ARTIFACT_BUNDLE_NAME,
+    CELERY_LONG_JOBS,
+    CONSOLE_FLUSH_INTERVAL,
+    CONSOLE_FLUSH_SIZE,
+    CONSOLE_QUEUE_SIZE,
+    CONSOLE_TAIL_INTERVAL,
+    CONTAINER_STATS_INTERVAL,
+    HEARTBEAT_INTERVAL,
+    MAX_RUN_TIMEOUT,
+    OUTPUT_WATCH_INTERVAL,
+    RUN_STATE_POLL_INTERVAL,
+    SLOT_RETRY_DELAY,
+    SLOTS_DIRNAME,
+    VISIBILITY_TIMEOUT_MARGIN,
+    WORKER_CACHE_DIR,
+    WORKER_CONCURRENCY,
+    WORKER_CONSOLE_LIMIT,
+    WORKER_DIRECT_UPLOADS,
+    WORKER_DOWNLOAD_THREADS,
+    WORKER_EARLY_UPLOADS,
+    WORKER_API_BACKOFF,
+    WORKER_API_IDEMPOTENT_METHODS,
+    WORKER_API_RETRIES,
+    WORKER_API_RETRY_STATUSES,
+    WORKER_API_RUN_THREADS,
+    WORKER_API_TIMEOUT,
+    WORKER_API_TOKEN,
+    WORKER_ARTIFACT_BUNDLE_SIZE,
+    WORKER_GIT_CACHE_SIZE,
+    WORKER_IMAGE_CACHE_TTL,
+    WORKER_INPUT_CACHE_SIZE,
+    WORKER_RUN_TIMEOUT,
+    WORKER_SLOTS,
+    WORKER_UPLOAD_MIN_RATE,
+    WORKER_UPLOAD_THREADS,
+)
+from app.model_utils import ResourceClassEnum, RunPriorityEnum, RunStateEnum
+from app.slots import WorkerSlots
 from application_roles.decorators import ROLES_KEY
 
 # make the request lib mockable for testing:
@@ -19,6 +76,27 @@ urllib_request = urllib.request
 
 logger = get_task_logger(__name__)
 
+# Connections to the API, shared by every RunExecutor in a worker process:
+_http_pool = None
+_http_pool_lock = threading.Lock()
+
+
+def route_task(name, args, kwargs, options, task=None, **kw):
+    """Send pipeline runs to the queue of their resource class, with the
+    priority of the run.
+
+    (a celery router: see CELERY_ROUTES)
+    """
+    # pylint: disable=unused-argument
+    if name != "app.tasks.execute_pipeline":
+        return None
+
+    resource_class = ResourceClassEnum(
+        kwargs.get("resource_class", ResourceClassEnum.SMALL)
+    )
+    priority = RunPriorityEnum(kwargs.get("priority", RunPriorityEnum.NORMAL))
+    return {"queue": resource_class.queue(), "priority": int(priority)}
+
 
 def make_celery(app):
     """ Create a celery client. """
@@ -31,69 +109,688 @@ def make_celery(app):
                 return self.run(*args, **kwargs)
 
     celery.Task = ContextTask
+    celery.conf.CELERY_ROUTES = (route_task,)
+    # (higher numbers come first: true of RabbitMQ, but not of Redis)
+    celery.conf.CELERY_QUEUE_MAX_PRIORITY = max(RunPriorityEnum)
+    celery.conf.CELERY_DEFAULT_PRIORITY = RunPriorityEnum.NORMAL
+
+    if app.config[CELERY_LONG_JOBS]:
+        # Runs take hours: acknowledge their tasks once they have finished, so
+        # that the broker redelivers the runs of workers that die, and don't
+        # let busy workers hold on to tasks that other workers could run.
+        celery.conf.CELERY_ACKS_LATE = True
+        celery.conf.CELERY_REJECT_ON_WORKER_LOST = True
+        celery.conf.CELERYD_PREFETCH_MULTIPLIER = 1
+        # (for brokers without acknowledgements, such as redis and SQS)
+        celery.conf.BROKER_TRANSPORT_OPTIONS = {
+            "visibility_timeout": app.config[MAX_RUN_TIMEOUT]
+            + VISIBILITY_TIMEOUT_MARGIN
+        }
+
+    if app.config[WORKER_CONCURRENCY] is not None:
+        # Runs mostly wait on their containers: execute several of them in
+        # threads of one worker process, rather than one process per run.
+        celery.conf.CELERYD_POOL = "threads"
+        celery.conf.CELERYD_CONCURRENCY = app.config[WORKER_CONCURRENCY]
 
     return celery
 
 
+def run_timeout(timeout):
+    """Return the seconds a run's container may run for (None when unlimited).
+
+    Runs without a timeout of their own use WORKER_RUN_TIMEOUT. With long jobs
+    enabled runs must end before their task is redelivered, so they are limited
+    to MAX_RUN_TIMEOUT.
+    """
+    if timeout is None:
+        timeout = current_app.config[WORKER_RUN_TIMEOUT]
+    if current_app.config[CELERY_LONG_JOBS]:
+        max_timeout = current_app.config[MAX_RUN_TIMEOUT]
+        timeout = max_timeout if timeout is None else min(timeout, max_timeout)
+    return timeout
+
+
+def get_http_pool():
+    """Return the worker process's pool of keep-alive API connections.
+
+    The pool is created on first use, so that each forked worker process gets
+    its own connections. It keeps enough of them for all the threads of the
+    runs the process executes at once.
+    """
+    global _http_pool  # pylint: disable=global-statement
+    with _http_pool_lock:
+        if _http_pool is None:
+            run_threads = (
+                current_app.config[WORKER_UPLOAD_THREADS] + WORKER_API_RUN_THREADS
+            )
+            _http_pool = urllib3.PoolManager(
+                maxsize=run_threads * (current_app.config[WORKER_CONCURRENCY] or 1),
+                timeout=urllib3.Timeout(
+                    connect=WORKER_API_TIMEOUT, read=WORKER_API_TIMEOUT
+                ),
+                retries=False,
+            )
+        return _http_pool
+
+
+def upload_timeout(size):
+    """ Return the timeout of a request uploading size bytes. """
+    return urllib3.Timeout(
+        connect=WORKER_API_TIMEOUT,
+        read=WORKER_API_TIMEOUT + size / WORKER_UPLOAD_MIN_RATE,
+    )
+
+
+def request_with_retries(method, url, data=None, headers=None, timeout=None):
+    """Make an HTTP request with the shared pool, retrying transient failures.
+
+    Requests that aren't idempotent are only retried when they couldn't
+    connect, so that they are never received twice.
+
+    Returns the response, or raises urllib.error.HTTPError for error statuses.
+    """
+    idempotent = method in WORKER_API_IDEMPOTENT_METHODS
+    options = {} if timeout is None else {"timeout": timeout}
+    for attempt in range(WORKER_API_RETRIES + 1):
+        if attempt > 0:
+            time.sleep(WORKER_API_BACKOFF * 2 ** (attempt - 1))
+        if hasattr(data, "seek"):
+            # resend file contents from the start
+            data.seek(0)
+
+        try:
+            response = get_http_pool().request(
+                method, url, body=data, headers=headers, **options
+            )
+        except urllib3.exceptions.HTTPError as http_err:
+            unsent = isinstance(
+                http_err,
+                (
+                    urllib3.exceptions.ConnectTimeoutError,
+                    urllib3.exceptions.NewConnectionError,
+                ),
+            )
+            if attempt == WORKER_API_RETRIES or not (idempotent or unsent):
+                raise
+            logger.warning("%s %s failed, retrying: %s", method, url, http_err)
+            continue
+
+        if (
+            response.status in WORKER_API_RETRY_STATUSES
+            and idempotent
+            and attempt < WORKER_API_RETRIES
+        ):
+            logger.warning("%s %s returned %s, retrying", method, url, response.status)
+            continue
+        if response.status >= 400:
+            raise urllib.error.HTTPError(
+                url, response.status, response.reason, response.headers, None
+            )
+        return response
+
+
+def _read_stream(pipe, name, lines):
+    """ Put decoded lines of a subprocess pipe on a queue, then (name, None). """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for line in iter(lambda: pipe.readline(CONSOLE_FLUSH_SIZE), b""):
+        lines.put((name, decoder.decode(line)))
+    remainder = decoder.decode(b"", final=True)
+    if len(remainder) > 0:
+        lines.put((name, remainder))
+    lines.put((name, None))
+
+
+def download_inputs(input_files, inputdir, input_cache=None):
+    """ Download a run's input files concurrently, via input_cache if given. """
+
+    def download(input_file):
+        destination = join(inputdir, input_file["name"])
+        if input_cache is not None:
+            input_cache.fetch(input_file["url"], destination)
+        else:
+            urllib_request.urlretrieve(input_file["url"], destination)
+
+    with ThreadPoolExecutor(current_app.config[WORKER_DOWNLOAD_THREADS]) as pool:
+        # consume the results to raise any download's exception:
+        list(pool.map(download, input_files))
+
+    if input_cache is not None and len(input_files) > 0:
+        input_cache.evict()
+
+
+def find_outputs(outputdir):
+    """Return (name, path) of the files within outputdir and its subdirectories.
+
+    Files are named by their path relative to outputdir.
+    """
+    outputs = []
+    for (root, dirs, files) in os.walk(outputdir):
+        dirs.sort()
+        for name in sorted(files):
+            path = join(root, name)
+            if os.path.isfile(path):
+                relative_path = os.path.relpath(path, outputdir)
+                outputs.append((relative_path.replace(os.sep, "/"), path))
+    return outputs
+
+
+def git_commit(gitdir):
+    """ Return the SHA of the commit checked out in a repository. """
+    result = subprocess.run(
+        ["git", "rev-parse", "HEAD"], cwd=gitdir, capture_output=True, check=True
+    )
+    return result.stdout.decode("utf-8").strip()
+
+
+def run_cache_key(docker_image_digest, commit_sha, repository_script, inputdir):
+    """Return the cache key of a run: a hash of everything that determines its
+    outputs (its image, commit and script, and the contents of its inputs).
+    """
+    inputs = [(name, file_sha256(path)) for (name, path) in find_outputs(inputdir)]
+    run = {
+        "docker_image_digest": docker_image_digest,
+        "commit_sha": commit_sha,
+        "repository_script": repository_script,
+        "inputs": inputs,
+    }
+    return hashlib.sha256(json.dumps(run, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def file_version(path):
+    """ Return the (size, modification time) of a file. """
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def upload_outputs(executor, outputdir, workdir, uploaded=None):
+    """Upload the files in outputdir as artifacts, concurrently.
+
+    Files smaller than WORKER_ARTIFACT_BUNDLE_SIZE are uploaded together as a
+    single archive (written to workdir). Files already uploaded (uploaded maps
+    their names to the file_version() that was uploaded) are skipped, unless
+    they have changed since.
+    """
+    outputs = find_outputs(outputdir)
+    if uploaded:
+        outputs = [o for o in outputs if uploaded.get(o[0]) != file_version(o[1])]
+
+    bundle_size = current_app.config[WORKER_ARTIFACT_BUNDLE_SIZE]
+    small_outputs = []
+    if bundle_size > 0:
+        small_outputs = [o for o in outputs if os.path.getsize(o[1]) < bundle_size]
+    if len(small_outputs) > 1:
+        bundle_path = join(workdir, ARTIFACT_BUNDLE_NAME)
+        with tarfile.open(bundle_path, "w:gz") as bundle:
+            for (name, path) in small_outputs:
+                bundle.add(path, arcname=name)
+        outputs = [o for o in outputs if o not in small_outputs]
+        outputs.append((ARTIFACT_BUNDLE_NAME, bundle_path))
+
+    app = current_app._get_current_object()  # pylint: disable=protected-access
+
+    def upload(output):
+        with app.app_context():
+            executor.upload_artifact(*output)
+
+    with ThreadPoolExecutor(current_app.config[WORKER_UPLOAD_THREADS]) as pool:
+        # consume the results to raise any upload's exception:
+        list(pool.map(upload, outputs))
+
+
+def worker_ip():
+    """ The address of this worker (or its host name, if that can't be found). """
+    hostname = socket.gethostname()
+    try:
+        return socket.gethostbyname(hostname)
+    except OSError:
+        return hostname[:50]
+
+
+class RunCancelled(Exception):
+    """ Raised when a run is cancelled while it is executing. """
+
+
+class RunHeartbeat(threading.Thread):
+    """Tells the API that the worker of a run is alive, every interval seconds
+    until it is stopped.
+    """
+
+    def __init__(self, executor, interval):
+        super().__init__(daemon=True)
+        self.executor = executor
+        self.interval = interval
+        self.app = current_app._get_current_object()  # pylint: disable=protected-access
+        self.stopped = threading.Event()
+
+    def run(self):
+        address = worker_ip()
+        with self.app.app_context():
+            while True:
+                try:
+                    self.executor.send_heartbeat(address)
+                except Exception as exc:  # pylint: disable=broad-except
+                    logger.warning("Unable to send heartbeat: %s", exc)
+                if self.stopped.wait(self.interval):
+                    return
+
+    def stop(self):
+        self.stopped.set()
+
+
+class OutputWatcher(threading.Thread):
+    """Uploads the output files of a run while its container is still running.
+
+    Every interval seconds the output directory is scanned: files that haven't
+    changed since the previous scan are presumed complete, and uploaded.
+    Files small enough to be bundled are left to upload_outputs().
+    """
+
+    def __init__(self, executor, outputdir, interval):
+        super().__init__(daemon=True)
+        self.executor = executor
+        self.outputdir = outputdir
+        self.interval = interval
+        self.bundle_size = current_app.config[WORKER_ARTIFACT_BUNDLE_SIZE]
+        self.app = current_app._get_current_object()  # pylint: disable=protected-access
+        self.stopped = threading.Event()
+        # file_version() of each file in the previous scan, and when uploaded:
+        self.seen = {}
+        self.uploaded = {}
+
+    def scan(self):
+        """ Upload the files that haven't changed since the previous scan. """
+        for (name, path) in find_outputs(self.outputdir):
+            try:
+                version = file_version(path)
+            except FileNotFoundError:
+                continue
+            previous = self.seen.get(name)
+            self.seen[name] = version
+            if (
+                version != previous
+                or self.uploaded.get(name) == version
+                or version[0] < self.bundle_size
+            ):
+                continue
+
+            try:
+                self.executor.upload_artifact(name, path)
+            except Exception as exc:  # pylint: disable=broad-except
+                # (upload_outputs() tries again once the container has exited)
+                logger.warning("Unable to upload %s early: %s", name, exc)
+                continue
+            self.uploaded[name] = version
+
+    def run(self):
+        with self.app.app_context():
+            while not self.stopped.wait(self.interval):
+                self.scan()
+
+    def stop(self):
+        """Stop scanning (once an upload in progress has finished).
+
+        Returns the file_version() of each file that was uploaded.
+        """
+        self.stopped.set()
+        if self.is_alive():
+            self.join()
+        return self.uploaded
+
+
 class RunExecutor:
     """ An Pipeline API caller within the context of a specific pipeline run. """
 
     def __init__(self, uuid, run_uuid):
         self.uuid = uuid
         self.run_uuid = run_uuid
-        self.stdout = ""
-        self.stderr = ""
+        # Length of the output already sent to the API (up to the tail):
+        self.stdout_length = 0
+        self.stderr_length = 0
+        # Tail sent after the head of each stream (replaced as it changes), and
+        # when tails were last sent:
+        self.sent_tails = {"std_out": "", "std_err": ""}
+        self.tails_sent_at = time.monotonic()
+        # Output that couldn't be sent, to send again with the next output:
+        self.unsent_output = ("", "")
+        # Only the head and tail of long output is sent (see finish_output()):
+        console_limit = current_app.config[WORKER_CONSOLE_LIMIT]
+        self.console = ConsoleCapture(
+            console_limit // 2, console_limit - console_limit // 2
+        )
+        # Timings of each phase of the run (see phase()):
+        self.phases = []
+        # Resource usage of the run's container:
+        self.resources = None
 
-    def _make_request(self, path, data, additional_headers, method="PUT"):
+    def _make_request(self, path, data, additional_headers, method="PUT", timeout=None):
         server = current_app.config["WORKER_API_SERVER"]
         url = f"{server}/v1/pipelines/{self.uuid}/runs/{self.run_uuid}/{path}"
         headers = {ROLES_KEY: current_app.config[WORKER_API_TOKEN]}
         headers.update(additional_headers)
 
-        request = urllib_request.Request(url, data, headers, method=method)
-        urllib_request.urlopen(request)
+        return request_with_retries(method, url, data, headers, timeout)
 
-    def _put(self, path, data):
-        self._make_request(
-            path, json.dumps(data).encode("ascii"), {"content-type": "application/json"}
+    def _send_json(self, path, data, method="PUT"):
+        return self._make_request(
+            path,
+            json.dumps(data).encode("ascii"),
+            {"content-type": "application/json"},
+            method,
         )
 
     def update_run_output(self, stdout, stderr=""):
-        """ Append addition stdout/stderr to run's output. """
-        if len(stdout) == 0 and len(stderr) == 0:
+        """Append addition stdout/stderr to run's output.
+
+        Only the new output is sent, along with the offsets it belongs at.
+        Output past the head of a stream is only kept in a bounded tail, which
+        is sent every CONSOLE_TAIL_INTERVAL seconds (see _send_output()).
+        """
+        std_out = "\n" + stdout if len(stdout) > 0 else ""
+        std_err = "\n" + stderr if len(stderr) > 0 else ""
+        self._send_output(
+            self.console.write("std_out", std_out),
+            self.console.write("std_err", std_err),
+            time.monotonic() - self.tails_sent_at >= CONSOLE_TAIL_INTERVAL,
+        )
+
+    def _send_output(self, std_out, std_err, send_tails=False):
+        """Send new output within the head of each stream.
+
+        With send_tails, the kept tail of each stream (see ConsoleCapture) is
+        sent after its head too, replacing the tail sent before.
+        """
+        (unsent_out, unsent_err) = self.unsent_output
+        heads = {"std_out": unsent_out + std_out, "std_err": unsent_err + std_err}
+        tails = dict(self.sent_tails)
+        if send_tails:
+            self.tails_sent_at = time.monotonic()
+            tails = {name: self.console.tail(name) for name in heads}
+        if all(len(head) == 0 for head in heads.values()) and tails == self.sent_tails:
             # don't make an HTTP request that does nothing (many successful
             # commands actually don't produce any output at all)
             return
 
-        self.stdout += "\n" + stdout
-        self.stderr += "\n" + stderr
-        data = {"std_out": self.stdout, "std_err": self.stderr}
-        return self._put("console", data)
+        lengths = {"std_out": self.stdout_length, "std_err": self.stderr_length}
+        data = {}
+        for (name, head) in heads.items():
+            if tails[name] == self.sent_tails[name]:
+                # (the tail already sent, if any, is left as it is)
+                data[name] = head
+                data[f"{name}_offset"] = lengths[name] + len(self.sent_tails[name])
+            else:
+                # (the stored output past the offset is replaced)
+                data[name] = head + tails[name]
+                data[f"{name}_offset"] = lengths[name]
+        self.unsent_output = (heads["std_out"], heads["std_err"])
+        self._send_json("console", data, "PATCH")
+        self.unsent_output = ("", "")
+        self.stdout_length += len(heads["std_out"])
+        self.stderr_length += len(heads["std_err"])
+        self.sent_tails = tails
+
+    def finish_output(self):
+        """Send the tail of each stream's output, and upload the full output
+        of truncated streams as artifacts (console/std_out.log and
+        console/std_err.log).
+
+        Does nothing once the output has been finished.
+        """
+        if self.console.closed:
+            return
+        try:
+            self._send_output("", "", send_tails=True)
+            self.console.flush()
+            for name in ("std_out", "std_err"):
+                if self.console.is_truncated(name):
+                    self.upload_artifact(
+                        f"console/{name}.log", self.console.log_path(name)
+                    )
+        finally:
+            self.console.close()
 
     def update_run_status(self, run_state_enum):
-        return self._put("state", {"state": run_state_enum.name})
+        return self._send_json("state", {"state": run_state_enum.name})
 
-    def upload_artifact(self, filename, location):
+    def get_run_status(self):
+        response = self._make_request("state", None, {}, "GET")
+        return RunStateEnum[json.loads(response.data)["state"]]
+
+    def is_cancelled(self):
+        return self.get_run_status() == RunStateEnum.CANCELLED
+
+    def restart_run(self):
+        return self._make_request("restart", None, {}, "POST")
+
+    def send_heartbeat(self, address):
+        return self._send_json("heartbeat", {"worker_ip": address})
+
+    def check_run_cache(self, cache_key):
+        """Send the cache key of the run. Returns the uuid of an identical run
+        when the API completed this run with its artifacts, or None.
+        """
+        response = self._send_json("cache", {"cache_key": cache_key})
+        return json.loads(response.data)["cached_run_uuid"]
+
+    @contextmanager
+    def phase(self, name):
+        """Record the wall clock time taken by a phase of the run.
+
+        The number of bytes the phase transferred can be set on the yielded
+        dict's byte_count.
+        """
+        phase = {"name": name, "duration": 0.0, "byte_count": None}
+        start = time.monotonic()
+        try:
+            yield phase
+        finally:
+            phase["duration"] = round(time.monotonic() - start, 3)
+            self.phases.append(phase)
+
+    def update_run_metrics(self):
+        return self._send_json(
+            "metrics", {"phases": self.phases, "resources": self.resources}
+        )
+
+    def update_run_environment(self, docker_image_digest):
+        return self._send_json(
+            "environment", {"docker_image_digest": docker_image_digest}
+        )
+
+    def _upload_artifact_direct(self, filename, location):
+        """ Upload an artifact straight to object storage via presigned URLs. """
+        size = os.path.getsize(location)
+        response = self._send_json(
+            "artifacts/uploads", {"name": filename, "size": size}, "POST"
+        )
+        upload = json.loads(response.data)
+
+        parts = []
         with open(location, "rb") as f:
-            self._make_request(f"artifacts?name={quote(filename)}", f, {}, "POST")
+            for (part_number, url) in enumerate(upload["urls"], start=1):
+                part = f.read(upload["part_size"])
+                part_response = request_with_retries(
+                    "PUT", url, part, timeout=upload_timeout(len(part))
+                )
+                parts.append(
+                    {"part_number": part_number, "etag": part_response.headers["ETag"]}
+                )
 
-    def run(self, command, directory):
-        """ Execute a command, raise an exception on nonzero error codes. """
-        self.update_run_output(f"Run: {command}")
-        result = subprocess.run(command.split(" "), cwd=directory, capture_output=True)
+        completion = {"name": filename}
+        if upload["upload_id"] is not None:
+            completion.update({"upload_id": upload["upload_id"], "parts": parts})
+        self._send_json(
+            f"artifacts/uploads/{upload['uuid']}/complete", completion, "POST"
+        )
 
-        logger.debug(result)
+    def upload_artifact(self, filename, location):
+        if current_app.config[WORKER_DIRECT_UPLOADS]:
+            self._upload_artifact_direct(filename, location)
+            return
 
-        self.update_run_output(
-            result.stdout.decode("utf-8"), result.stderr.decode("utf-8")
+        with open(location, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._make_request(
+                f"artifacts?name={quote(filename)}",
+                f,
+                {"content-length": str(size)},
+                "POST",
+                upload_timeout(size),
+            )
+
+    def _flush_output(self, pending):
+        """ Send (and clear) batched stdout/stderr lines. """
+        stdout = "".join(pending["stdout"])
+        stderr = "".join(pending["stderr"])
+        pending["stdout"].clear()
+        pending["stderr"].clear()
+
+        # update_run_output() separates each update with a newline already.
+        self.update_run_output(stdout.rstrip("\n"), stderr.rstrip("\n"))
+
+    def _run_streaming(self, command, directory, stream):
+        """Execute a command, sending its output to the API as it is read.
+
+        Output is batched, and flushed once CONSOLE_FLUSH_SIZE characters have
+        been collected (and, when stream is True, every CONSOLE_FLUSH_INTERVAL
+        seconds) so that a chatty command's output is never held in memory.
+
+        Returns the command's return code.
+        """
+        process = subprocess.Popen(
+            command.split(" "),
+            cwd=directory,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
         )
+        lines = queue.Queue(CONSOLE_QUEUE_SIZE)
+        readers = [
+            threading.Thread(
+                target=_read_stream, args=(process.stdout, "stdout", lines), daemon=True
+            ),
+            threading.Thread(
+                target=_read_stream, args=(process.stderr, "stderr", lines), daemon=True
+            ),
+        ]
+        for reader in readers:
+            reader.start()
+
+        def flush():
+            try:
+                self._flush_output(pending)
+            except (urllib.error.URLError, urllib3.exceptions.HTTPError) as err:
+                # (sent again with the next output: see _send_output())
+                logger.warning("Unable to send output of %s: %s", command, err)
+
+        pending = {"stdout": [], "stderr": []}
+        pending_size = 0
+        open_streams = len(readers)
+        last_flush = time.monotonic()
+        try:
+            while open_streams > 0:
+                try:
+                    (name, line) = lines.get(timeout=CONSOLE_FLUSH_INTERVAL)
+                    if line is None:
+                        open_streams -= 1
+                    else:
+                        pending[name].append(line)
+                        pending_size += len(line)
+                except queue.Empty:
+                    pass
+
+                now = time.monotonic()
+                if pending_size >= CONSOLE_FLUSH_SIZE or (
+                    stream and now - last_flush >= CONSOLE_FLUSH_INTERVAL
+                ):
+                    flush()
+                    pending_size = 0
+                    last_flush = now
+        finally:
+            if open_streams > 0:
+                # Interrupted: don't leave the command running, or its readers
+                # blocked on the full queue.
+                process.kill()
+                while open_streams > 0:
+                    if lines.get()[1] is None:
+                        open_streams -= 1
+            for reader in readers:
+                reader.join()
+            returncode = process.wait()
+
+        flush()
+
+        return returncode
+
+    def run(self, command, directory, stream=False):
+        """Execute a command, raise an exception on nonzero error codes.
+
+        When stream is True the command's output is sent to the API
+        incrementally while it runs, rather than (in batches) as it is read.
+        """
+        self.update_run_output(f"Run: {command}")
+        returncode = self._run_streaming(command, directory, stream)
+        logger.debug("%s returned %s", command, returncode)
 
-        if result.returncode != 0:
-            raise ValueError(f"Command returned nonzero code: {result.returncode}")
+        if returncode != 0:
+            raise ValueError(f"Command returned nonzero code: {returncode}")
 
 
-@shared_task(ignore_result=True)
+@shared_task(bind=True, ignore_result=True)
 def execute_pipeline(
+    self,
+    pipeline_uuid,
+    pipeline_run_uuid,
+    input_files,
+    docker_image_url,
+    repository_ssh_url,
+    repository_branch,
+    repository_script,
+    timeout=None,
+    resource_class=ResourceClassEnum.SMALL,
+    priority=RunPriorityEnum.NORMAL,
+    redelivered=False,
+    use_run_cache=False,
+):
+    """Execute a pipeline run, once the worker has enough free slots for it.
+
+    Runs that don't fit are retried later, possibly by another worker.
+
+    (priority is only used to route the task: see route_task())
+    """
+    # pylint: disable=unused-argument
+    # The broker redelivers the task of a worker that died while running it:
+    delivery_info = self.request.delivery_info or {}
+    redelivered = redelivered or bool(delivery_info.get("redelivered"))
+    args = (
+        pipeline_uuid,
+        pipeline_run_uuid,
+        input_files,
+        docker_image_url,
+        repository_ssh_url,
+        repository_branch,
+        repository_script,
+        timeout,
+        redelivered,
+        use_run_cache,
+    )
+    slot_count = current_app.config[WORKER_SLOTS]
+    if slot_count is None:
+        run_pipeline(*args)
+        return
+
+    slots = WorkerSlots(join(tempfile.gettempdir(), SLOTS_DIRNAME), slot_count)
+    with slots.reserve(ResourceClassEnum(resource_class).value) as reserved:
+        if not reserved:
+            # (a retry is a new task: remember that this one was redelivered)
+            raise self.retry(
+                kwargs=dict(self.request.kwargs or {}, redelivered=redelivered),
+                countdown=SLOT_RETRY_DELAY,
+                max_retries=None,
+            )
+        run_pipeline(*args)
+
+
+def run_pipeline(
     pipeline_uuid,
     pipeline_run_uuid,
     input_files,
@@ -101,29 +798,103 @@ def execute_pipeline(
     repository_ssh_url,
     repository_branch,
     repository_script,
+    timeout,
+    redelivered=False,
+    use_run_cache=False,
 ):
+    """Execute a pipeline run, reporting its progress to the API.
+
+    A redelivered run that is already RUNNING (its previous worker died) is
+    started over again, once its heartbeat is stale: the broker redelivers the
+    task of a dead worker right away, so in practice the runs restarted are
+    those dispatched again by reap_stale_pipeline_runs(). With use_run_cache, a
+    run identical to an earlier one is completed with that run's artifacts
+    instead (see check_run_cache()).
+    """
+
     def failed(err):
         try:
             executor.update_run_output("", str(err))
+            executor.finish_output()
+            executor.update_run_metrics()
             executor.update_run_status(RunStateEnum.FAILED)
-        except urllib.error.URLError as url_e:
+        except (urllib.error.URLError, urllib3.exceptions.HTTPError) as url_e:
             logger.error(url_e)
 
+    executor = None
+    heartbeat = None
     try:
         executor = RunExecutor(pipeline_uuid, pipeline_run_uuid)
-        executor.update_run_status(RunStateEnum.RUNNING)
+        container_name = f"openfido-{pipeline_run_uuid}"
+        try:
+            executor.update_run_status(RunStateEnum.RUNNING)
+        except urllib.error.HTTPError as http_err:
+            if http_err.code != 400:
+                raise
+            if not (redelivered and executor.get_run_status() == RunStateEnum.RUNNING):
+                # The run was cancelled or has finished, or was started by
+                # another worker (starved runs are dispatched again: see
+                # promote_starved_pipeline_runs()).
+                logger.warning("Not starting run %s: %s", pipeline_run_uuid, http_err)
+                return
+
+            try:
+                executor.restart_run()
+            except urllib.error.HTTPError as restart_err:
+                if restart_err.code != 400:
+                    raise
+                # Its heartbeat is recent: the worker is still running it, or
+                # has only just died (then reap_stale_pipeline_runs() will
+                # dispatch it again).
+                logger.warning(
+                    "Not restarting run %s: %s", pipeline_run_uuid, restart_err
+                )
+                return
+            logger.warning("Restarted redelivered run %s", pipeline_run_uuid)
+            # (the container of the lost attempt may still be running here)
+            kill_container(container_name)
+
+        heartbeat = RunHeartbeat(executor, HEARTBEAT_INTERVAL)
+        heartbeat.start()
 
         with tempfile.TemporaryDirectory() as tmpdir:
             gitdir = join(tmpdir, "gitrepo")
             inputdir = join(tmpdir, "input")
             outputdir = join(tmpdir, "output")
 
-            executor.run(f"docker pull {docker_image_url}", tmpdir)
-            executor.run(
-                f"git clone --depth 1 --branch {repository_branch} {repository_ssh_url} gitrepo",
-                tmpdir,
-            )
-            executor.run(f"git checkout {repository_branch}", gitdir)
+            cache_dir = current_app.config[WORKER_CACHE_DIR]
+            with executor.phase("pull"):
+                if cache_dir is not None:
+                    image_cache = DockerImageCache(
+                        join(cache_dir, "images"),
+                        current_app.config[WORKER_IMAGE_CACHE_TTL],
+                    )
+                    image_cache.pull(executor, docker_image_url)
+                else:
+                    executor.run(f"docker pull {docker_image_url}", tmpdir)
+
+            # record exactly which image the run used (and run that image,
+            # even if the reference is pulled again in the meantime):
+            digest = docker_image_digest(docker_image_url)
+            if digest is not None:
+                executor.update_run_environment(digest)
+
+            with executor.phase("clone") as phase:
+                if cache_dir is not None:
+                    git_cache = GitMirrorCache(
+                        join(cache_dir, "git"),
+                        current_app.config[WORKER_GIT_CACHE_SIZE],
+                    )
+                    git_cache.clone(
+                        executor, repository_ssh_url, repository_branch, gitdir
+                    )
+                else:
+                    executor.run(
+                        f"git clone --depth 1 --branch {repository_branch} {repository_ssh_url} gitrepo",
+                        tmpdir,
+                    )
+                executor.run(f"git checkout {repository_branch}", gitdir)
+                phase["byte_count"] = directory_size(gitdir)
 
             if not os.path.exists(join(gitdir, repository_script)):
                 raise ValueError("Repository script does not exist in repository")
@@ -131,35 +902,97 @@ def execute_pipeline(
             executor.run("mkdir input", tmpdir)
             executor.run("mkdir output", tmpdir)
 
-            for input_file in input_files:
-                urllib_request.urlretrieve(
-                    input_file["url"], join(inputdir, input_file["name"])
+            with executor.phase("download") as phase:
+                input_cache = None
+                if cache_dir is not None:
+                    input_cache = InputFileCache(
+                        join(cache_dir, "inputs"),
+                        current_app.config[WORKER_INPUT_CACHE_SIZE],
+                    )
+                download_inputs(input_files, inputdir, input_cache)
+                phase["byte_count"] = directory_size(inputdir)
+
+            if use_run_cache and digest is not None:
+                cache_key = run_cache_key(
+                    digest, git_commit(gitdir), repository_script, inputdir
                 )
+                cached_run_uuid = executor.check_run_cache(cache_key)
+                if cached_run_uuid is not None:
+                    executor.update_run_output(
+                        f"Using the artifacts of identical run {cached_run_uuid}"
+                    )
+                    executor.finish_output()
+                    executor.update_run_metrics()
+                    return
 
             executor.run("chmod -R 777 .", tmpdir)
 
-            # TODO because these processes can take a long long time to run it'd
-            # be ideal to poll the output every interval to give viewers a sense
-            # of whether the job is doing.
-            executor.run(
-                (
-                    "docker run --rm "
-                    f"-v {gitdir}:/tmp/gitrepo "
-                    f"-v {inputdir}:/tmp/input "
-                    f"-v {outputdir}:/tmp/output "
-                    f"-e OPENFIDO_INPUT=/tmp/input "
-                    f"-e OPENFIDO_OUTPUT=/tmp/output "
-                    "-w /tmp/gitrepo "
-                    f"{docker_image_url} sh {repository_script}"
-                ),
-                gitdir,
+            # These processes can take a long long time to run: stream their
+            # output to give viewers a sense of what the job is doing.
+            sampler = ContainerStatsSampler(container_name, CONTAINER_STATS_INTERVAL)
+            timeout = run_timeout(timeout)
+            watchdog = ContainerWatchdog(
+                container_name, timeout, executor.is_cancelled, RUN_STATE_POLL_INTERVAL
             )
-
-            for f in os.listdir(outputdir):
-                if not os.path.isfile(join(outputdir, f)):
-                    next
-                executor.upload_artifact(f, join(outputdir, f))
-
+            watcher = None
+            if current_app.config[WORKER_EARLY_UPLOADS]:
+                watcher = OutputWatcher(executor, outputdir, OUTPUT_WATCH_INTERVAL)
+            uploaded = {}
+            with executor.phase("run") as phase:
+                sampler.start()
+                watchdog.start()
+                if watcher is not None:
+                    watcher.start()
+                try:
+                    executor.run(
+                        (
+                            "docker run --rm "
+                            f"--name {container_name} "
+                            f"-v {gitdir}:/tmp/gitrepo "
+                            f"-v {inputdir}:/tmp/input "
+                            f"-v {outputdir}:/tmp/output "
+                            f"-e OPENFIDO_INPUT=/tmp/input "
+                            f"-e OPENFIDO_OUTPUT=/tmp/output "
+                            "-w /tmp/gitrepo "
+                            f"{digest or docker_image_url} sh {repository_script}"
+                        ),
+                        gitdir,
+                        stream=True,
+                    )
+                except Exception:
+                    reason = watchdog.stop()
+                    if reason is None:
+                        # (killing `docker run` doesn't stop its container)
+                        kill_container(container_name)
+                    if reason == "cancelled":
+                        raise RunCancelled()
+                    if reason == "timeout":
+                        raise ValueError(f"Run timed out after {timeout} seconds")
+                    raise
+                finally:
+                    watchdog.stop()
+                    executor.resources = sampler.stop()
+                    if watcher is not None:
+                        uploaded = watcher.stop()
+                phase["byte_count"] = directory_size(outputdir)
+
+            with executor.phase("upload"):
+                upload_outputs(executor, outputdir, tmpdir, uploaded)
+
+        executor.finish_output()
+        executor.update_run_metrics()
         executor.update_run_status(RunStateEnum.COMPLETED)
+    except RunCancelled:
+        try:
+            executor.update_run_output("", "Run cancelled")
+            executor.finish_output()
+            executor.update_run_metrics()
+        except (urllib.error.URLError, urllib3.exceptions.HTTPError) as url_e:
+            logger.error(url_e)
     except Exception as exc:
         failed(exc)
+    finally:
+        if heartbeat is not None:
+            heartbeat.stop()
+        if executor is not None:
+            executor.console.close()
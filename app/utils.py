@@ -1,9 +1,10 @@
 import logging
 from functools import wraps
 
-from flask import request, current_app
+from flask import current_app, jsonify, request
 
 from application_roles.decorators import make_permission_decorator
+from .constants import NEXT_CURSOR_HEADER
 from .model_utils import SystemPermissionEnum
 
 logger = logging.getLogger("utils")
@@ -16,6 +17,18 @@ def to_iso8601(date):
     return date.isoformat()
 
 
+def paginated_response(schema, page):
+    """A JSON list response of a page of rows (see paginate()), with the
+    cursor of the next page in its NEXT_CURSOR_HEADER header.
+    """
+    (rows, next_cursor) = page
+    response = jsonify(schema.dump(rows, many=True))
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    return response
+
+
 def verify_content_type():
     """ Decorator enforcing application/json content type """
 
@@ -1,6 +1,8 @@
 from application_roles.model_utils import CommonColumnsMixin, get_db
+from sqlalchemy import event
 
 from ..model_utils import RunStateEnum
+from ..pipelines.queries import find_run_state_enum
 
 db = get_db()
 
@@ -9,6 +11,16 @@ class Workflow(CommonColumnsMixin, db.Model):
     """ A collection of connected pipelines and runs. """
 
     __tablename__ = "workflow"
+    __table_args__ = (
+        db.Index("ix_workflow_uuid", "uuid", unique=True),
+        # (pages of workflows, see paginate())
+        db.Index(
+            "ix_workflow_created_at_id_active",
+            "created_at",
+            "id",
+            postgresql_where=db.text("is_deleted = false"),
+        ),
+    )
 
     name = db.Column(db.String(50), nullable=False)
     description = db.Column(db.String(300), nullable=False)
@@ -24,9 +36,24 @@ class WorkflowPipeline(CommonColumnsMixin, db.Model):
     """ A pipeline that is part of a workflow. """
 
     __tablename__ = "workflowpipeline"
+    __table_args__ = (
+        db.Index("ix_workflowpipeline_uuid", "uuid", unique=True),
+        # (pages of the pipelines of a workflow)
+        db.Index(
+            "ix_workflowpipeline_workflow_id_created_at_id_active",
+            "workflow_id",
+            "created_at",
+            "id",
+            postgresql_where=db.text("is_deleted = false"),
+        ),
+    )
 
-    pipeline_id = db.Column(db.Integer, db.ForeignKey("pipeline.id"), nullable=False)
-    workflow_id = db.Column(db.Integer, db.ForeignKey("workflow.id"), nullable=False)
+    pipeline_id = db.Column(
+        db.Integer, db.ForeignKey("pipeline.id"), nullable=False, index=True
+    )
+    workflow_id = db.Column(
+        db.Integer, db.ForeignKey("workflow.id"), nullable=False, index=True
+    )
     is_deleted = db.Column(db.Boolean(), default=False, nullable=False)
 
     source_workflow_pipelines = db.relationship(
@@ -56,11 +83,11 @@ class WorkflowPipelineDependency(CommonColumnsMixin, db.Model):
     __tablename__ = "workflowpipelinedependency"
 
     from_workflow_pipeline_id = db.Column(
-        db.Integer, db.ForeignKey("workflowpipeline.id"), nullable=False
+        db.Integer, db.ForeignKey("workflowpipeline.id"), nullable=False, index=True
     )
 
     to_workflow_pipeline_id = db.Column(
-        db.Integer, db.ForeignKey("workflowpipeline.id"), nullable=False
+        db.Integer, db.ForeignKey("workflowpipeline.id"), nullable=False, index=True
     )
 
     def __repr__(self):
@@ -71,11 +98,18 @@ class WorkflowRun(CommonColumnsMixin, db.Model):
     """ An execution of a Workflow. """
 
     __tablename__ = "workflowrun"
+    __table_args__ = (db.Index("ix_workflowrun_uuid", "uuid", unique=True),)
 
-    workflow_id = db.Column(db.Integer, db.ForeignKey("workflow.id"), nullable=False)
+    workflow_id = db.Column(
+        db.Integer, db.ForeignKey("workflow.id"), nullable=False, index=True
+    )
+    # RunStateEnum of the last of workflow_run_states (see run_state_enum()):
+    current_state = db.Column(db.Integer, nullable=True, index=True)
 
+    # (new states are added by setting their workflow_run, which doesn't load
+    # the others)
     workflow_run_states = db.relationship(
-        "WorkflowRunState", backref="workflow_run", lazy="select"
+        "WorkflowRunState", back_populates="workflow_run", lazy="select"
     )
     workflow_pipeline_runs = db.relationship(
         "WorkflowPipelineRun", backref="workflow_run", lazy="select"
@@ -83,7 +117,7 @@ class WorkflowRun(CommonColumnsMixin, db.Model):
 
     def run_state_enum(self):
         """ Return the current stat of this run (the last run state) """
-        return self.workflow_run_states[-1].run_state_enum()
+        return RunStateEnum(self.current_state)
 
 
 class WorkflowRunState(CommonColumnsMixin, db.Model):
@@ -92,15 +126,30 @@ class WorkflowRunState(CommonColumnsMixin, db.Model):
     __tablename__ = "workflowrunstate"
 
     workflow_run_id = db.Column(
-        db.Integer, db.ForeignKey("workflowrun.id"), nullable=False
+        db.Integer, db.ForeignKey("workflowrun.id"), nullable=False, index=True
     )
     run_state_type_id = db.Column(
         db.Integer, db.ForeignKey("runstatetype.id"), nullable=False
     )
 
+    workflow_run = db.relationship("WorkflowRun", back_populates="workflow_run_states")
+
     def run_state_enum(self):
         """ Return the current stat of this run """
-        return RunStateEnum(self.run_state_type.code)
+        return find_run_state_enum(self.run_state_type_id)
+
+
+@event.listens_for(WorkflowRunState.workflow_run, "set")
+def _workflow_run_state_added(workflow_run_state, workflow_run, oldvalue, initiator):
+    """Maintain the current state of a workflow run as states are added to its
+    history, in the same transaction.
+
+    (also when they are appended to workflow_run_states, through the backref)
+    """
+    # pylint: disable=unused-argument
+    if workflow_run is None:
+        return
+    workflow_run.current_state = workflow_run_state.run_state_enum().value
 
 
 class WorkflowPipelineRun(CommonColumnsMixin, db.Model):
@@ -109,13 +158,13 @@ class WorkflowPipelineRun(CommonColumnsMixin, db.Model):
     __tablename__ = "workflowpipelinerun"
 
     workflow_run_id = db.Column(
-        db.Integer, db.ForeignKey("workflowrun.id"), nullable=False
+        db.Integer, db.ForeignKey("workflowrun.id"), nullable=False, index=True
     )
     pipeline_run_id = db.Column(
-        db.Integer, db.ForeignKey("pipelinerun.id"), nullable=False
+        db.Integer, db.ForeignKey("pipelinerun.id"), nullable=False, index=True
     )
     workflow_pipeline_id = db.Column(
-        db.Integer, db.ForeignKey("workflowpipeline.id"), nullable=False
+        db.Integer, db.ForeignKey("workflowpipeline.id"), nullable=False, index=True
     )
 
     def run_state_enum(self):
@@ -1,12 +1,15 @@
 from sqlalchemy import and_, or_
+from sqlalchemy.orm import joinedload, selectinload
 
 import networkx as nx
 
+from ..pipelines.queries import pipeline_run_export_options
 from .models import (
     db,
     Workflow,
     WorkflowPipeline,
     WorkflowPipelineDependency,
+    WorkflowPipelineRun,
     WorkflowRun,
 )
 from .schemas import SearchWorkflowsSchema
@@ -33,6 +36,22 @@ def find_workflows(uuids=None):
     return query
 
 
+def find_workflow_pipelines(workflow):
+    """ Find the WorkflowPipelines of a workflow (to export them). """
+    return WorkflowPipeline.query.filter(
+        WorkflowPipeline.workflow_id == workflow.id,
+        WorkflowPipeline.is_deleted == False,
+    ).options(
+        joinedload(WorkflowPipeline.pipeline),
+        selectinload(WorkflowPipeline.source_workflow_pipelines).joinedload(
+            WorkflowPipelineDependency.from_workflow_pipeline
+        ),
+        selectinload(WorkflowPipeline.dest_workflow_pipelines).joinedload(
+            WorkflowPipelineDependency.to_workflow_pipeline
+        ),
+    )
+
+
 def find_workflow_pipeline(workflow_pipeline_uuid):
     """ Find a WorkflowPipeline. """
     return (
@@ -151,15 +170,23 @@ def pipeline_has_workflow_pipeline(pipeline_id):
     ) is not None
 
 
-def find_workflow_run(workflow_run_uuid):
-    """ Find a WorkflowRun. """
-    return (
-        WorkflowRun.query.join(Workflow)
-        .filter(
-            and_(
-                WorkflowRun.uuid == workflow_run_uuid,
-                Workflow.is_deleted == False,
-            )
+def find_workflow_run(workflow_run_uuid, export=False):
+    """Find a WorkflowRun.
+
+    With export, what WorkflowRunSchema exports of it is loaded up front.
+    """
+    query = WorkflowRun.query.join(Workflow).filter(
+        and_(
+            WorkflowRun.uuid == workflow_run_uuid,
+            Workflow.is_deleted == False,
         )
-        .one_or_none()
     )
+    if export:
+        query = query.options(
+            selectinload(WorkflowRun.workflow_run_states),
+            selectinload(WorkflowRun.workflow_pipeline_runs)
+            .joinedload(WorkflowPipelineRun.pipeline_run)
+            .options(*pipeline_run_export_options()),
+        )
+
+    return query.one_or_none()
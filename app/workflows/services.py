@@ -1,7 +1,7 @@
 import logging
 
 from app.model_utils import RunStateEnum
-from app.pipelines.queries import find_pipeline, find_run_state_type
+from app.pipelines.queries import find_pipeline, find_run_state_type_id
 from app.pipelines.schemas import CreateRunSchema
 from app.pipelines.services import (
     copy_pipeline_run_artifact,
@@ -186,12 +186,15 @@ def update_workflow_pipeline(workflow_uuid, workflow_pipeline_uuid, pipeline_jso
     return workflow_pipeline
 
 
-def create_workflow_run_state(run_state_enum):
-    """ Create a new WorkflowRunState """
-    run_state_type = find_run_state_type(run_state_enum)
-    workflow_run_state = WorkflowRunState()
-    run_state_type.workflow_run_states.append(workflow_run_state)
-
+def create_workflow_run_state(run_state_enum, workflow_run=None):
+    """Create a new WorkflowRunState, adding it to the history of workflow_run
+    if given (without loading the rest of it).
+    """
+    workflow_run_state = WorkflowRunState(
+        run_state_type_id=find_run_state_type_id(run_state_enum)
+    )
+    if workflow_run is not None:
+        workflow_run_state.workflow_run = workflow_run
     return workflow_run_state
 
 
@@ -209,7 +212,7 @@ def update_workflow_run_state(workflow_run, run_state_enum):
             f"Invalid state transition: {workflow_run.run_state_enum().name}->{run_state_enum.name}"
         )
 
-    workflow_run.workflow_run_states.append(create_workflow_run_state(run_state_enum))
+    create_workflow_run_state(run_state_enum, workflow_run)
     db.session.commit()
     return workflow_run
 
@@ -223,17 +226,16 @@ def create_workflow_run(workflow_uuid, run_json):
         raise ValueError("no workflow found")
 
     workflow_run = WorkflowRun(workflow=workflow)
-    workflow_run.workflow_run_states.append(
-        WorkflowRunState(run_state_type=find_run_state_type(RunStateEnum.NOT_STARTED))
-    )
+    create_workflow_run_state(RunStateEnum.NOT_STARTED, workflow_run)
 
     added_run = False
     for workflow_pipeline in workflow.workflow_pipelines:
         if workflow_pipeline.is_deleted:
             continue
         queue_run = len(workflow_pipeline.source_workflow_pipelines) > 0
-        no_input_data = {"callback_url": data["callback_url"], "inputs": []}
-        run_data = no_input_data if queue_run else data
+        run_data = dict(data, priority=data["priority"].name)
+        if queue_run:
+            run_data["inputs"] = []
         pipeline_run = create_pipeline_run(
             workflow_pipeline.pipeline.uuid, run_data, queue_run
         )
@@ -3,8 +3,11 @@ import logging
 from flask import Blueprint, jsonify, request
 from marshmallow.exceptions import ValidationError
 
-from ..model_utils import SystemPermissionEnum
-from ..utils import permissions_required, verify_content_type
+from ..model_utils import SystemPermissionEnum, paginate
+from ..pipelines.schemas import PageQuerySchema
+from ..utils import paginated_response, permissions_required, verify_content_type
+from .models import WorkflowPipeline
+from .queries import find_workflow_pipelines
 from .schemas import WorkflowPipelineSchema
 from .services import (
     create_workflow_pipeline,
@@ -217,9 +220,24 @@ def list_workflow_pipelines(workflow_uuid):
         description: Requires key type PIPELINES_CLIENT
         schema:
           type: string
+      - in: query
+        name: limit
+        description: Maximum number of workflow pipelines to return (100 by default, at most 1000).
+        schema:
+          type: integer
+      - in: query
+        name: after
+        description: Cursor of the page to return (from the X-Next-Cursor header).
+        schema:
+          type: string
     responses:
       "200":
         description: "Fetched"
+        headers:
+          X-Next-Cursor:
+            description: Cursor of the next page, if there is one.
+            schema:
+              type: string
         content:
           application/json:
             schema:
@@ -251,12 +269,15 @@ def list_workflow_pipelines(workflow_uuid):
         logger.warning("no workflow found")
         return {}, 404
 
-    return jsonify(
-        [
-            WorkflowPipelineSchema().dump(wp)
-            for wp in workflow.workflow_pipelines
-            if not wp.is_deleted
-        ]
+    try:
+        page = PageQuerySchema().load(request.args)
+    except ValidationError as validation_err:
+        logger.warning(validation_err)
+        return {"message": "Validation error", "errors": validation_err.messages}, 400
+
+    return paginated_response(
+        WorkflowPipelineSchema(),
+        paginate(find_workflow_pipelines(workflow), WorkflowPipeline, **page),
     )
 
 
@@ -3,8 +3,10 @@ import logging
 from flask import Blueprint, jsonify, request
 from marshmallow.exceptions import ValidationError
 
-from ..model_utils import SystemPermissionEnum
-from ..utils import permissions_required, verify_content_type
+from ..model_utils import SystemPermissionEnum, paginate
+from ..pipelines.schemas import PageQuerySchema
+from ..utils import paginated_response, permissions_required, verify_content_type
+from .models import Workflow
 from .queries import find_workflow, find_workflows
 from .schemas import WorkflowSchema
 from .services import create_workflow, update_workflow, delete_workflow
@@ -105,9 +107,24 @@ def list():
         description: Requires key type PIPELINES_CLIENT
         schema:
           type: string
+      - in: query
+        name: limit
+        description: Maximum number of workflows to return (100 by default, at most 1000).
+        schema:
+          type: integer
+      - in: query
+        name: after
+        description: Cursor of the page to return (from the X-Next-Cursor header).
+        schema:
+          type: string
     responses:
       "200":
         description: "Found"
+        headers:
+          X-Next-Cursor:
+            description: Cursor of the next page, if there is one.
+            schema:
+              type: string
         content:
           application/json:
             schema:
@@ -141,9 +158,15 @@ def list():
                 value: { "message": "An error occurred" }
                 summary: An error occurred
     """
-    workflows = find_workflows()
+    try:
+        page = PageQuerySchema().load(request.args)
+    except ValidationError as validation_err:
+        logger.warning(validation_err)
+        return {"message": "Validation error", "errors": validation_err.messages}, 400
 
-    return jsonify([WorkflowSchema().dump(w) for w in workflows])
+    return paginated_response(
+        WorkflowSchema(), paginate(find_workflows(), Workflow, **page)
+    )
 
 
 @workflow_bp.route("/<workflow_uuid>", methods=["GET"])
@@ -41,6 +41,10 @@ def create_run(workflow_uuid):
             properties:
               callback_url:
                 type: string
+              priority:
+                type: string
+                enum: [LOW, NORMAL, HIGH]
+                description: Priority of the run (default NORMAL).
               inputs:
                 type: array
                 items:
@@ -192,7 +196,7 @@ def get_run(workflow_uuid, workflow_run_uuid):
         logger.warning("no workflow found")
         return {}, 404
 
-    workflow_run = find_workflow_run(workflow_run_uuid)
+    workflow_run = find_workflow_run(workflow_run_uuid, export=True)
     if workflow_run is None:
         logger.warning("no workflow run found")
         return {}, 404
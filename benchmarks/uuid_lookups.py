@@ -0,0 +1,193 @@
+"""Benchmark the lookups of runs by uuid (and of a pipeline's runs), before
+and after adding the indexes of migration eea29d654d6a.
+
+Creates scratch tables shaped like pipeline and pipelinerun, fills them with
+--rows runs, and reports the latency of the queries of find_pipeline_run() and
+find_pipeline_resources() without, then with, the indexes. The tables are
+dropped afterwards.
+
+    python benchmarks/uuid_lookups.py --rows 2000000
+    python benchmarks/uuid_lookups.py --database-url postgresql://... --rows 5000000
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from os.path import join
+
+import sqlalchemy as sa
+
+metadata = sa.MetaData()
+
+pipeline = sa.Table(
+    "benchmark_pipeline",
+    metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("uuid", sa.String(32), nullable=False),
+    sa.Column("is_deleted", sa.Boolean, nullable=False),
+)
+
+pipeline_run = sa.Table(
+    "benchmark_pipelinerun",
+    metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("uuid", sa.String(32), nullable=False),
+    sa.Column("sequence", sa.Integer, nullable=False),
+    sa.Column("is_deleted", sa.Boolean, nullable=False),
+    sa.Column(
+        "pipeline_id",
+        sa.Integer,
+        sa.ForeignKey("benchmark_pipeline.id"),
+        nullable=False,
+    ),
+)
+
+
+BATCH_SIZE = 10000
+
+
+def create_indexes(connection):
+    """ Create the indexes added to pipeline and pipelinerun. """
+    indexes = (
+        sa.Index("ix_benchmark_pipeline_uuid", pipeline.c.uuid, unique=True),
+        sa.Index("ix_benchmark_pipelinerun_uuid", pipeline_run.c.uuid, unique=True),
+        sa.Index("ix_benchmark_pipelinerun_pipeline_id", pipeline_run.c.pipeline_id),
+    )
+    for index in indexes:
+        index.create(connection)
+
+
+def populate(connection, rows, runs_per_pipeline):
+    """ Insert rows runs (and their pipelines), returning the run uuids. """
+    pipeline_count = max(rows // runs_per_pipeline, 1)
+    for start in range(0, pipeline_count, BATCH_SIZE):
+        connection.execute(
+            pipeline.insert(),
+            [
+                {"id": i + 1, "uuid": uuid.uuid4().hex, "is_deleted": i % 50 == 0}
+                for i in range(start, min(start + BATCH_SIZE, pipeline_count))
+            ],
+        )
+
+    run_uuids = []
+    for start in range(0, rows, BATCH_SIZE):
+        batch = [
+            {
+                "id": i + 1,
+                "uuid": uuid.uuid4().hex,
+                "sequence": i // pipeline_count + 1,
+                "is_deleted": i % 20 == 0,
+                "pipeline_id": i % pipeline_count + 1,
+            }
+            for i in range(start, min(start + BATCH_SIZE, rows))
+        ]
+        connection.execute(pipeline_run.insert(), batch)
+        run_uuids.extend(run["uuid"] for run in batch)
+
+    return (run_uuids, pipeline_count)
+
+
+def find_run_query(run_uuid):
+    """ The query of find_pipeline_run(). """
+    return (
+        sa.select([pipeline_run])
+        .select_from(pipeline_run.join(pipeline))
+        .where(
+            sa.and_(
+                pipeline_run.c.uuid == run_uuid,
+                pipeline_run.c.is_deleted == False,
+                pipeline.c.is_deleted == False,
+            )
+        )
+    )
+
+
+def pipeline_runs_query(pipeline_id):
+    """ The filter of find_pipeline_resources(). """
+    return sa.select([sa.func.count(pipeline_run.c.id)]).where(
+        sa.and_(
+            pipeline_run.c.pipeline_id == pipeline_id,
+            pipeline_run.c.is_deleted == False,
+        )
+    )
+
+
+def measure(connection, queries):
+    """ Return the (median, 95th percentile) latency of queries, in ms. """
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        connection.execute(query).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return (statistics.median(timings), timings[int(len(timings) * 0.95)])
+
+
+def report(label, timings):
+    (median, p95) = timings
+    print(f"  {label:<28} median {median:9.3f} ms   p95 {p95:9.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--database-url",
+        help="database to benchmark (default: a temporary sqlite database)",
+    )
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--runs-per-pipeline", type=int, default=100)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        url = args.database_url or f"sqlite:///{join(tmpdir, 'benchmark.db')}"
+        engine = sa.create_engine(url)
+        metadata.drop_all(engine)
+        metadata.create_all(engine)
+        try:
+            with engine.begin() as connection:
+                start = time.perf_counter()
+                (run_uuids, pipeline_count) = populate(
+                    connection, args.rows, args.runs_per_pipeline
+                )
+                print(
+                    f"Inserted {args.rows} runs of {pipeline_count} pipelines "
+                    f"in {time.perf_counter() - start:.1f}s ({engine.name})"
+                )
+
+            sample = random.sample(run_uuids, min(args.lookups, len(run_uuids)))
+            pipeline_ids = [random.randint(1, pipeline_count) for _ in sample]
+            with engine.connect() as connection:
+                print("Without indexes:")
+                report(
+                    "find_pipeline_run",
+                    measure(connection, map(find_run_query, sample)),
+                )
+                report(
+                    "runs of a pipeline",
+                    measure(connection, map(pipeline_runs_query, pipeline_ids)),
+                )
+
+                start = time.perf_counter()
+                create_indexes(connection)
+                if engine.name == "postgresql":
+                    connection.execute("ANALYZE")
+                print(f"Created indexes in {time.perf_counter() - start:.1f}s")
+
+                print("With indexes:")
+                report(
+                    "find_pipeline_run",
+                    measure(connection, map(find_run_query, sample)),
+                )
+                report(
+                    "runs of a pipeline",
+                    measure(connection, map(pipeline_runs_query, pipeline_ids)),
+                )
+        finally:
+            metadata.drop_all(engine)
+
+
+if __name__ == "__main__":
+    main()
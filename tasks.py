@@ -64,6 +64,36 @@ def create_application_key(c, name, permission):
         print(f"API_TOKEN={application.api_key}")
 
 
+@task
+def promote_starved_runs(c):
+    """ Raise the priority of pipeline runs that have waited too long to start.
+
+    Run this periodically (for instance, every few minutes from cron).
+    """
+    from app import create_app
+    from app.pipelines.services import promote_starved_pipeline_runs
+
+    (app, _, _, _) = create_app()
+    with app.app_context():
+        for pipeline_run in promote_starved_pipeline_runs():
+            print(f"Promoted {pipeline_run.uuid}")
+
+
+@task
+def reap_stale_runs(c):
+    """ Restart (or fail) pipeline runs whose workers stopped sending heartbeats.
+
+    Run this periodically (for instance, every few minutes from cron).
+    """
+    from app import create_app
+    from app.pipelines.services import reap_stale_pipeline_runs
+
+    (app, _, _, _) = create_app()
+    with app.app_context():
+        for pipeline_run in reap_stale_pipeline_runs():
+            print(f"Reaped {pipeline_run.uuid} ({pipeline_run.run_state_enum().name})")
+
+
 @task
 def run_worker(
     c,
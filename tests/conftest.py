@@ -1,4 +1,8 @@
+from contextlib import contextmanager
+
 import pytest
+from sqlalchemy import event
+
 from app import create_app
 from app.constants import (
     CELERY_ALWAYS_EAGER,
@@ -8,6 +12,7 @@ from app.constants import (
     SQLALCHEMY_DATABASE_URI,
     WORKER_API_SERVER,
     WORKER_API_TOKEN,
+    WORKER_DIRECT_UPLOADS,
 )
 from app.model_utils import SystemPermissionEnum
 from app.pipelines.models import Pipeline, db
@@ -31,6 +36,7 @@ def app():
             S3_ENDPOINT_URL: "http://example.com",
             WORKER_API_SERVER: "http://example.com",
             WORKER_API_TOKEN: "atoken",
+            WORKER_DIRECT_UPLOADS: "false",
         }
     )
 
@@ -43,6 +49,30 @@ def app():
         db.drop_all()
 
 
+@pytest.fixture
+def count_queries(app):
+    """A context manager collecting the SQL statements executed within it:
+
+    with count_queries() as statements:
+        ...
+    """
+
+    @contextmanager
+    def count():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+    return count
+
+
 @pytest.fixture
 def client(app):
     return app.test_client()
@@ -1,6 +1,10 @@
 from unittest.mock import MagicMock, patch
 
+import pytest
+from sqlalchemy.exc import IntegrityError
+
 from app.pipelines.models import db, Pipeline, PipelineRun, PipelineRunArtifact
+from app.pipelines.services import create_pipeline_run_state
 from app.model_utils import RunStateEnum
 
 
@@ -18,6 +22,13 @@ def test_create_pipeline(app):
     assert not pipeline.is_deleted
 
 
+def test_pipeline_uuid_unique(app, pipeline):
+    db.session.add(Pipeline(name="another pipeline", uuid=pipeline.uuid))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+
 def test_create_pipeline_run(app, pipeline):
     pipeline_run = PipelineRun(sequence=1)
     pipeline.pipeline_runs.append(pipeline_run)
@@ -27,6 +38,39 @@ def test_create_pipeline_run(app, pipeline):
     assert set(PipelineRun.query.all()) == set([pipeline_run])
 
 
+def test_pipeline_run_current_state(app, pipeline):
+    pipeline_run = PipelineRun(sequence=1)
+    pipeline.pipeline_runs.append(pipeline_run)
+    pipeline_run.pipeline_run_states.append(
+        create_pipeline_run_state(RunStateEnum.NOT_STARTED)
+    )
+    db.session.add(pipeline)
+    db.session.commit()
+
+    assert pipeline_run.run_state_enum() == RunStateEnum.NOT_STARTED
+    assert pipeline_run.started_at is None
+    assert pipeline_run.completed_at is None
+
+    pipeline_run.pipeline_run_states.append(
+        create_pipeline_run_state(RunStateEnum.RUNNING)
+    )
+    db.session.commit()
+
+    assert pipeline_run.run_state_enum() == RunStateEnum.RUNNING
+    assert pipeline_run.started_at is not None
+    assert pipeline_run.completed_at is None
+
+    pipeline_run.pipeline_run_states.append(
+        create_pipeline_run_state(RunStateEnum.COMPLETED)
+    )
+    db.session.commit()
+
+    assert PipelineRun.query.filter(
+        PipelineRun.current_state == RunStateEnum.COMPLETED.value
+    ).all() == [pipeline_run]
+    assert pipeline_run.completed_at >= pipeline_run.started_at
+
+
 @patch("app.pipelines.models.create_url")
 def test_public_url(create_url_mock, app, pipeline):
     create_url_mock.return_value = "http://example.com/presigned"
@@ -39,3 +83,25 @@ def test_public_url(create_url_mock, app, pipeline):
     db.session.commit()
 
     assert artifact.public_url() == "http://example.com/presigned"
+
+
+@patch("app.pipelines.models.create_url")
+def test_public_url_source_artifact(create_url_mock, app, pipeline):
+    create_url_mock.return_value = "http://example.com/presigned"
+
+    pipeline_run = PipelineRun(sequence=1)
+    pipeline.pipeline_runs.append(pipeline_run)
+    artifact = PipelineRunArtifact(name="example.txt")
+    pipeline_run.pipeline_run_artifacts.append(artifact)
+    cached_run = PipelineRun(sequence=2)
+    pipeline.pipeline_runs.append(cached_run)
+    linked_artifact = PipelineRunArtifact(name="example.txt", source_artifact=artifact)
+    cached_run.pipeline_run_artifacts.append(linked_artifact)
+    db.session.add(pipeline)
+    db.session.commit()
+
+    assert linked_artifact.public_url() == "http://example.com/presigned"
+    # the file of the source artifact is shared:
+    assert create_url_mock.call_args[0][0].endswith(
+        f"/{pipeline_run.uuid}/{artifact.uuid}-example.txt"
+    )
@@ -1,7 +1,11 @@
+from app.model_utils import ResourceClassEnum
 from app.pipelines.models import Pipeline, db
 from app.pipelines.queries import find_pipeline
+from app.pipelines.services import create_pipeline_run
 from application_roles.decorators import ROLES_KEY
 
+from .test_services import VALID_CALLBACK_INPUT
+
 
 def test_create_pipeline_wrong_content_type(client):
     result = client.post(
@@ -149,6 +153,34 @@ def test_list_pipelines(client, client_application):
     assert result.json[1]["name"] == p2.name
 
 
+def test_list_pipelines_pages(client, client_application):
+    pipelines = [Pipeline(name=f"pipeline {i}") for i in range(3)]
+    db.session.add_all(pipelines)
+    db.session.commit()
+
+    result = client.get(
+        "/v1/pipelines?limit=2",
+        headers={ROLES_KEY: client_application.api_key},
+    )
+    assert result.status_code == 200
+    assert [p["uuid"] for p in result.json] == [p.uuid for p in pipelines[:2]]
+
+    result = client.get(
+        f"/v1/pipelines?limit=2&after={result.headers['X-Next-Cursor']}",
+        headers={ROLES_KEY: client_application.api_key},
+    )
+    assert result.status_code == 200
+    assert [p["uuid"] for p in result.json] == [pipelines[2].uuid]
+    assert "X-Next-Cursor" not in result.headers
+
+    for query in ("limit=0", "limit=1001", "after=bad"):
+        result = client.get(
+            f"/v1/pipelines?{query}",
+            headers={ROLES_KEY: client_application.api_key},
+        )
+        assert result.status_code == 400
+
+
 def test_get_pipeline_no_match(client, client_application):
     db.session.commit()
     result = client.get(
@@ -169,6 +201,38 @@ def test_get_pipeline(client, pipeline, client_application):
     assert result.status_code == 200
 
 
+def test_get_pipeline_resources(
+    client, pipeline, client_application, mock_execute_pipeline
+):
+    db.session.commit()
+    result = client.get(
+        "/v1/pipelines/1111ddddeeee2222/resources",
+        content_type="application/json",
+        headers={ROLES_KEY: client_application.api_key},
+    )
+    assert result.status_code == 404
+
+    pipeline_run = create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    pipeline_run.peak_memory_bytes = 1024
+    pipeline_run.cpu_seconds = 2.5
+    db.session.commit()
+    result = client.get(
+        f"/v1/pipelines/{pipeline.uuid}/resources",
+        content_type="application/json",
+        headers={ROLES_KEY: client_application.api_key},
+    )
+    assert result.status_code == 200
+    assert result.json == {
+        "run_count": 1,
+        "max_peak_memory_bytes": 1024,
+        "avg_peak_memory_bytes": 1024,
+        "total_cpu_seconds": 2.5,
+        "avg_cpu_seconds": 2.5,
+        "total_block_read_bytes": None,
+        "total_block_write_bytes": None,
+    }
+
+
 def test_remove_pipeline_no_match(client, client_application):
     db.session.commit()
     result = client.delete(
@@ -253,6 +317,9 @@ def test_update_pipeline(client, client_application, pipeline):
         "docker_image_url": "updated url",
         "repository_ssh_url": "updated ssh",
         "repository_branch": "updated branch",
+        "timeout": 600,
+        "resource_class": "MEDIUM",
+        "use_run_cache": True,
     }
     result = client.put(
         f"/v1/pipelines/{pipeline.uuid}",
@@ -261,6 +328,9 @@ def test_update_pipeline(client, client_application, pipeline):
         headers={ROLES_KEY: client_application.api_key},
     )
     assert result.status_code == 200
+    assert result.json["timeout"] == 600
+    assert result.json["resource_class"] == "MEDIUM"
+    assert result.json["use_run_cache"]
 
     pipeline = Pipeline.query.filter(Pipeline.name == params["name"]).one_or_none()
     assert pipeline.name == "updated pipeline"
@@ -268,6 +338,9 @@ def test_update_pipeline(client, client_application, pipeline):
     assert pipeline.docker_image_url == "updated url"
     assert pipeline.repository_ssh_url == "updated ssh"
     assert pipeline.repository_branch == "updated branch"
+    assert pipeline.timeout == 600
+    assert pipeline.resource_class == ResourceClassEnum.MEDIUM
+    assert pipeline.use_run_cache
 
 
 def test_search_pipelines_validation(client, client_application, pipeline):
@@ -1,12 +1,25 @@
+from unittest.mock import patch
+
 from app.pipelines.models import Pipeline, RunStateType, db
 from app.model_utils import RunStateEnum
 from app.pipelines.queries import (
+    count_pipeline_run_states,
     find_pipeline,
     find_pipelines,
-    find_run_state_type,
+    find_run_state_enum,
+    find_run_state_type_id,
     find_pipeline_run,
+    find_pipeline_run_console,
+    find_pipeline_run_output,
+    find_pipeline_run_output_length,
+    find_pipeline_run_output_lengths,
+    find_pipeline_resources,
+)
+from app.pipelines.services import (
+    create_pipeline_run,
+    update_pipeline_run_output,
+    update_pipeline_run_state,
 )
-from app.pipelines.services import create_pipeline_run
 from .test_services import VALID_CALLBACK_INPUT
 
 
@@ -56,17 +69,22 @@ def test_find_pipelines(app, pipeline):
     )
 
 
-def test_find_run_state_type(app):
-    # when there is no type, it is created and then inserted.
-    run_state_type = find_run_state_type(RunStateEnum.NOT_STARTED)
-    assert run_state_type.code == RunStateEnum.NOT_STARTED.value
-    assert run_state_type.name == RunStateEnum.NOT_STARTED.name
+def test_find_run_state_type_id(app):
+    # all the types are created on first use:
+    running_id = find_run_state_type_id(RunStateEnum.RUNNING)
+    assert RunStateType.query.count() == len(RunStateEnum)
+    assert RunStateType.query.get(running_id).code == RunStateEnum.RUNNING.value
+    db.session.commit()
 
-    assert set(RunStateType.query) == set([run_state_type])
+    failed_id = find_run_state_type_id(RunStateEnum.FAILED)
+    assert RunStateType.query.get(failed_id).code == RunStateEnum.FAILED.value
 
-    # subsequent finds don't create new records:
-    run_state_type = find_run_state_type(RunStateEnum.NOT_STARTED)
-    assert set(RunStateType.query) == set([run_state_type])
+    # once they all exist, their ids are cached:
+    with patch("app.pipelines.queries.load_run_state_types") as load_mock:
+        assert find_run_state_type_id(RunStateEnum.RUNNING) == running_id
+        assert find_run_state_enum(failed_id) == RunStateEnum.FAILED
+    load_mock.assert_not_called()
+    assert RunStateType.query.count() == len(RunStateEnum)
 
 
 def test_find_pipeline_run(app, pipeline, mock_execute_pipeline):
@@ -83,6 +101,39 @@ def test_find_pipeline_run(app, pipeline, mock_execute_pipeline):
     assert find_pipeline_run(pipeline_run.uuid) is None
 
 
+def test_count_pipeline_run_states(app, pipeline, mock_execute_pipeline):
+    pipeline_run = create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    assert count_pipeline_run_states(pipeline_run, RunStateEnum.RUNNING) == 0
+
+    update_pipeline_run_state(pipeline_run.uuid, {"state": "RUNNING"})
+    assert count_pipeline_run_states(pipeline_run, RunStateEnum.RUNNING) == 1
+    assert count_pipeline_run_states(pipeline_run, RunStateEnum.NOT_STARTED) == 1
+
+
+def test_find_pipeline_resources(app, pipeline, mock_execute_pipeline):
+    assert find_pipeline_resources(pipeline)["run_count"] == 0
+
+    runs = [create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT) for _ in range(4)]
+    for (run, memory) in zip(runs, [100, 300, 1000]):
+        run.peak_memory_bytes = memory
+        run.cpu_seconds = 1.5
+        run.block_read_bytes = 10
+        run.block_write_bytes = 20
+    # deleted runs are ignored.
+    runs[2].is_deleted = True
+    db.session.commit()
+
+    assert find_pipeline_resources(pipeline) == {
+        "run_count": 2,
+        "max_peak_memory_bytes": 300,
+        "avg_peak_memory_bytes": 200,
+        "total_cpu_seconds": 3,
+        "avg_cpu_seconds": 1.5,
+        "total_block_read_bytes": 20,
+        "total_block_write_bytes": 40,
+    }
+
+
 def test_find_pipeline_run_is_deleted(app, pipeline, mock_execute_pipeline):
     pipeline_run = create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
 
@@ -91,3 +142,49 @@ def test_find_pipeline_run_is_deleted(app, pipeline, mock_execute_pipeline):
     db.session.commit()
 
     assert find_pipeline_run(pipeline_run.uuid) is None
+
+
+def test_find_pipeline_run_output_lengths(app, pipeline, mock_execute_pipeline):
+    pipeline_run = create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    assert find_pipeline_run_output_length(pipeline_run, "std_out") == 0
+    assert find_pipeline_run_output_lengths(pipeline_run) == (0, 0)
+
+    update_pipeline_run_output(pipeline_run.uuid, "stdout", "")
+    assert find_pipeline_run_output_length(pipeline_run, "std_out") == 6
+    assert find_pipeline_run_output_lengths(pipeline_run) == (6, 0)
+
+
+@patch("app.pipelines.services.CONSOLE_CHUNK_SIZE", 3)
+def test_find_pipeline_run_output(app, pipeline, mock_execute_pipeline):
+    pipeline_run = create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    assert find_pipeline_run_output(pipeline_run, "std_out") == ""
+
+    update_pipeline_run_output(pipeline_run.uuid, "0123456789", "")
+    assert find_pipeline_run_output(pipeline_run, "std_out") == "0123456789"
+    assert find_pipeline_run_output(pipeline_run, "std_out", 4) == "456789"
+    assert find_pipeline_run_output(pipeline_run, "std_out", 4, 4) == "4567"
+    assert find_pipeline_run_output(pipeline_run, "std_out", 9, 4) == "9"
+    assert find_pipeline_run_output(pipeline_run, "std_out", 12) == ""
+    assert find_pipeline_run_output(pipeline_run, "std_err") == ""
+
+
+def test_find_pipeline_run_console(app, pipeline, mock_execute_pipeline):
+    pipeline_run = create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    update_pipeline_run_output(pipeline_run.uuid, "stdout", "stderr")
+
+    assert find_pipeline_run_console(pipeline_run, 2, 3) == {
+        "std_out": "dou",
+        "std_out_offset": 2,
+        "std_out_length": 6,
+        "std_err": "der",
+        "std_err_offset": 2,
+        "std_err_length": 6,
+    }
+    assert find_pipeline_run_console(pipeline_run, tail=10) == {
+        "std_out": "stdout",
+        "std_out_offset": 0,
+        "std_out_length": 6,
+        "std_err": "stderr",
+        "std_err_offset": 0,
+        "std_err_length": 6,
+    }
@@ -1,9 +1,17 @@
 from unittest.mock import Mock, patch
 
+from botocore.exceptions import ClientError
+
 from app.pipelines.models import db, PipelineRunArtifact
 from app.model_utils import RunStateEnum
 from app.utils import to_iso8601
-from app.pipelines.services import create_pipeline_run, find_pipeline_run
+from app.pipelines.queries import find_pipeline_run_output
+from app.pipelines.services import (
+    create_pipeline_run,
+    find_pipeline_run,
+    update_pipeline_run_output,
+    update_pipeline_run_state,
+)
 from app.pipelines import run_routes as runs_module
 from application_roles.decorators import ROLES_KEY
 
@@ -105,6 +113,10 @@ def test_create_run(client, pipeline, client_application, mock_execute_pipeline)
     assert result.json == {
         "uuid": pipeline_run.uuid,
         "sequence": pipeline_run.sequence,
+        "priority": "NORMAL",
+        "docker_image_digest": None,
+        "started_at": None,
+        "completed_at": None,
         "created_at": to_iso8601(pipeline_run.created_at),
         "inputs": [
             {
@@ -127,6 +139,13 @@ def test_create_run(client, pipeline, client_application, mock_execute_pipeline)
             },
         ],
         "artifacts": [],
+        "phases": [],
+        "resources": {
+            "peak_memory_bytes": None,
+            "cpu_seconds": None,
+            "block_read_bytes": None,
+            "block_write_bytes": None,
+        },
     }
 
 
@@ -176,6 +195,10 @@ def test_get_pipeline_run(client, pipeline, client_application, mock_execute_pip
     assert result.json == {
         "uuid": pipeline_run.uuid,
         "sequence": pipeline_run.sequence,
+        "priority": "NORMAL",
+        "docker_image_digest": None,
+        "started_at": None,
+        "completed_at": None,
         "created_at": to_iso8601(pipeline_run.created_at),
         "inputs": [],
         "states": [
@@ -199,6 +222,13 @@ def test_get_pipeline_run(client, pipeline, client_application, mock_execute_pip
                 "url": "http://fake.example.com/url",
             }
         ],
+        "phases": [],
+        "resources": {
+            "peak_memory_bytes": None,
+            "cpu_seconds": None,
+            "block_read_bytes": None,
+            "block_write_bytes": None,
+        },
     }
 
     # fails if the pipeline is deleted.
@@ -269,6 +299,10 @@ def test_list_pipeline_runs(
         {
             "uuid": pipeline_run.uuid,
             "sequence": pipeline_run.sequence,
+            "priority": "NORMAL",
+            "docker_image_digest": None,
+            "started_at": None,
+            "completed_at": None,
             "created_at": to_iso8601(pipeline_run.created_at),
             "inputs": [],
             "states": [
@@ -286,10 +320,123 @@ def test_list_pipeline_runs(
                 },
             ],
             "artifacts": [],
+            "phases": [],
+            "resources": {
+                "peak_memory_bytes": None,
+                "cpu_seconds": None,
+                "block_read_bytes": None,
+                "block_write_bytes": None,
+            },
         }
     ]
 
 
+def test_list_pipeline_runs_pages(
+    client, pipeline, client_application, mock_execute_pipeline
+):
+    pipeline_runs = [
+        create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT) for _ in range(3)
+    ]
+    pipeline_runs[1].is_deleted = True
+    db.session.commit()
+
+    result = client.get(
+        f"/v1/pipelines/{pipeline.uuid}/runs?limit=1",
+        headers={ROLES_KEY: client_application.api_key},
+    )
+    assert result.status_code == 200
+    assert [pr["uuid"] for pr in result.json] == [pipeline_runs[0].uuid]
+
+    # deleted runs are skipped:
+    result = client.get(
+        f"/v1/pipelines/{pipeline.uuid}/runs?limit=1"
+        f"&after={result.headers['X-Next-Cursor']}",
+        headers={ROLES_KEY: client_application.api_key},
+    )
+    assert result.status_code == 200
+    assert [pr["uuid"] for pr in result.json] == [pipeline_runs[2].uuid]
+    assert "X-Next-Cursor" not in result.headers
+
+    result = client.get(
+        f"/v1/pipelines/{pipeline.uuid}/runs?after=bad",
+        headers={ROLES_KEY: client_application.api_key},
+    )
+    assert result.status_code == 400
+
+
+@patch("app.pipelines.models.create_url")
+def test_list_pipeline_runs_queries(
+    create_url_mock,
+    client,
+    pipeline,
+    client_application,
+    mock_execute_pipeline,
+    count_queries,
+):
+    create_url_mock.return_value = "http://example.com/presigned"
+    # (read before commits expire them, so that reloading them isn't counted)
+    url = f"/v1/pipelines/{pipeline.uuid}/runs"
+    headers = {ROLES_KEY: client_application.api_key}
+
+    def add_run():
+        pipeline_run = create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+        pipeline_run.pipeline_run_artifacts.append(PipelineRunArtifact(name="a.txt"))
+        db.session.commit()
+
+    def list_runs():
+        with count_queries() as statements:
+            result = client.get(url, headers=headers)
+        assert result.status_code == 200
+        return statements
+
+    add_run()
+    # (the first request also loads the run state types)
+    list_runs()
+    statements = list_runs()
+
+    for _ in range(4):
+        add_run()
+
+    # the relationships of a page of runs are loaded for all of them at once:
+    assert len(list_runs()) == len(statements)
+
+
+@patch("app.pipelines.services.urllib_request.urlopen")
+def test_update_pipeline_run_state_queries(
+    urlopen_mock,
+    client,
+    pipeline,
+    worker_application,
+    mock_execute_pipeline,
+    count_queries,
+):
+    db.session.commit()
+    pipeline_run = create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    pipeline_run.pipeline_run_artifacts.append(PipelineRunArtifact(name="a.txt"))
+    db.session.commit()
+    url = f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/state"
+    headers = {ROLES_KEY: worker_application.api_key}
+
+    with count_queries() as statements:
+        result = client.put(
+            url,
+            content_type="application/json",
+            json={"state": RunStateEnum.RUNNING.name},
+            headers=headers,
+        )
+    assert result.status_code == 200
+
+    # a state update doesn't load what it doesn't use (not even the run's
+    # earlier states):
+    for table in (
+        "pipelineruninput",
+        "pipelinerunartifact",
+        "pipelinerunphase",
+        "pipelinerunstate",
+    ):
+        assert not any(f"FROM {table}" in statement for statement in statements)
+
+
 def test_get_pipeline_run_output(
     client, pipeline, client_application, mock_execute_pipeline
 ):
@@ -309,8 +456,7 @@ def test_get_pipeline_run_output(
 
     # successfully fetch a pipeline_run
     pipeline_run = create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
-    pipeline_run.std_out = "stdout"
-    db.session.commit()
+    update_pipeline_run_output(pipeline_run.uuid, "stdout", "")
     result = client.get(
         f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/console",
         headers={ROLES_KEY: client_application.api_key},
@@ -318,9 +464,37 @@ def test_get_pipeline_run_output(
     assert result.status_code == 200
     assert result.json == {
         "std_out": "stdout",
+        "std_out_offset": 0,
+        "std_out_length": 6,
         "std_err": "",
+        "std_err_offset": 0,
+        "std_err_length": 0,
     }
 
+    # fetch a page of the output
+    result = client.get(
+        f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/console?offset=1&limit=2",
+        headers={ROLES_KEY: client_application.api_key},
+    )
+    assert result.status_code == 200
+    assert result.json["std_out"] == "td"
+    assert result.json["std_out_offset"] == 1
+
+    # fetch the end of the output
+    result = client.get(
+        f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/console?tail=3",
+        headers={ROLES_KEY: client_application.api_key},
+    )
+    assert result.status_code == 200
+    assert result.json["std_out"] == "out"
+    assert result.json["std_out_offset"] == 3
+
+    result = client.get(
+        f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/console?limit=0",
+        headers={ROLES_KEY: client_application.api_key},
+    )
+    assert result.status_code == 400
+
 
 def test_update_pipeline_run_output(
     client, pipeline, worker_application, mock_execute_pipeline
@@ -362,8 +536,70 @@ def test_update_pipeline_run_output(
         headers={ROLES_KEY: worker_application.api_key},
     )
     assert result.status_code == 200
-    assert pipeline_run.std_out == "stdout"
-    assert pipeline_run.std_err == "stderr"
+    assert find_pipeline_run_output(pipeline_run, "std_out") == "stdout"
+    assert find_pipeline_run_output(pipeline_run, "std_err") == "stderr"
+
+
+def test_append_pipeline_run_output(
+    client, pipeline, worker_application, mock_execute_pipeline
+):
+    db.session.commit()
+    pipeline_run = create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+
+    result = client.patch(
+        "/v1/pipelines/no-id/runs/no-id/console",
+        content_type="application/json",
+        json={"std_out": "stdout", "std_out_offset": 0, "std_err_offset": 0},
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 404
+
+    # no such pipeline_run_id
+    result = client.patch(
+        f"/v1/pipelines/{pipeline.uuid}/runs/no-id/console",
+        content_type="application/json",
+        json={"std_out": "stdout", "std_out_offset": 0, "std_err_offset": 0},
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 404
+
+    # invalid offsets
+    result = client.patch(
+        f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/console",
+        content_type="application/json",
+        json={"std_out": "stdout", "std_out_offset": "a", "std_err_offset": 0},
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 400
+
+    result = client.patch(
+        f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/console",
+        content_type="application/json",
+        json={"std_out": "stdout", "std_out_offset": 10, "std_err_offset": 0},
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 400
+
+    # successfully append output
+    result = client.patch(
+        f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/console",
+        content_type="application/json",
+        json={"std_out": "stdout", "std_out_offset": 0, "std_err_offset": 0},
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 200
+    assert result.json == {"std_out_length": 6, "std_err_length": 0}
+
+    result = client.patch(
+        f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/console",
+        content_type="application/json",
+        json={"std_err": "stderr", "std_out_offset": 6, "std_err_offset": 0},
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 200
+    assert result.json == {"std_out_length": 6, "std_err_length": 6}
+    assert find_pipeline_run_output(pipeline_run, "std_out") == "stdout"
+    assert find_pipeline_run_output(pipeline_run, "std_err") == "stderr"
 
 
 def test_update_pipeline_run_state(
@@ -419,6 +655,304 @@ def test_update_pipeline_run_state(
     assert pipeline_run.run_state_enum() == RunStateEnum.RUNNING
 
 
+def test_get_pipeline_run_state(
+    client, pipeline, client_application, worker_application, mock_execute_pipeline
+):
+    db.session.commit()
+    pipeline_run = create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+
+    result = client.get(
+        "/v1/pipelines/no-id/runs/no-id/state",
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 404
+
+    result = client.get(
+        f"/v1/pipelines/{pipeline.uuid}/runs/no-id/state",
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 404
+
+    for application in (worker_application, client_application):
+        result = client.get(
+            f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/state",
+            headers={ROLES_KEY: application.api_key},
+        )
+        assert result.status_code == 200
+        assert result.json == {"state": "NOT_STARTED"}
+
+
+def test_cancel_pipeline_run(
+    client, pipeline, client_application, mock_execute_pipeline
+):
+    db.session.commit()
+    pipeline_run = create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+
+    result = client.post(
+        "/v1/pipelines/no-id/runs/no-id/cancel",
+        headers={ROLES_KEY: client_application.api_key},
+    )
+    assert result.status_code == 404
+
+    result = client.post(
+        f"/v1/pipelines/{pipeline.uuid}/runs/no-id/cancel",
+        headers={ROLES_KEY: client_application.api_key},
+    )
+    assert result.status_code == 404
+
+    result = client.post(
+        f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/cancel",
+        headers={ROLES_KEY: client_application.api_key},
+    )
+    assert result.status_code == 200
+    assert pipeline_run.run_state_enum() == RunStateEnum.CANCELLED
+
+    # already cancelled
+    result = client.post(
+        f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/cancel",
+        headers={ROLES_KEY: client_application.api_key},
+    )
+    assert result.status_code == 400
+
+
+def test_restart_pipeline_run(
+    client, pipeline, worker_application, mock_execute_pipeline
+):
+    db.session.commit()
+    pipeline_run = create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+
+    result = client.post(
+        f"/v1/pipelines/{pipeline.uuid}/runs/no-id/restart",
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 404
+
+    # not RUNNING
+    result = client.post(
+        f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/restart",
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 400
+
+    update_pipeline_run_state(pipeline_run.uuid, {"state": "RUNNING"})
+    pipeline_run.heartbeat_at = None
+    db.session.commit()
+    result = client.post(
+        f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/restart",
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 200
+    assert pipeline_run.run_state_enum() == RunStateEnum.RUNNING
+
+    # it has just been restarted
+    result = client.post(
+        f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/restart",
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 400
+
+
+def test_check_run_cache(client, pipeline, worker_application, mock_execute_pipeline):
+    pipeline.use_run_cache = True
+    db.session.commit()
+    pipeline_run = create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    next_run = create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    url = f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/cache"
+    cache_key = "a" * 64
+
+    result = client.put(
+        f"/v1/pipelines/{pipeline.uuid}/runs/no-id/cache",
+        content_type="application/json",
+        headers={ROLES_KEY: worker_application.api_key},
+        json={"cache_key": cache_key},
+    )
+    assert result.status_code == 404
+
+    # not RUNNING
+    result = client.put(
+        url,
+        content_type="application/json",
+        headers={ROLES_KEY: worker_application.api_key},
+        json={"cache_key": cache_key},
+    )
+    assert result.status_code == 400
+
+    update_pipeline_run_state(pipeline_run.uuid, {"state": "RUNNING"})
+    result = client.put(
+        url,
+        content_type="application/json",
+        headers={ROLES_KEY: worker_application.api_key},
+        json={"cache_key": "abc"},
+    )
+    assert result.status_code == 400
+
+    result = client.put(
+        url,
+        content_type="application/json",
+        headers={ROLES_KEY: worker_application.api_key},
+        json={"cache_key": cache_key},
+    )
+    assert result.status_code == 200
+    assert result.json == {"cached_run_uuid": None}
+    update_pipeline_run_state(pipeline_run.uuid, {"state": "COMPLETED"})
+
+    # an identical run
+    update_pipeline_run_state(next_run.uuid, {"state": "RUNNING"})
+    result = client.put(
+        f"/v1/pipelines/{pipeline.uuid}/runs/{next_run.uuid}/cache",
+        content_type="application/json",
+        headers={ROLES_KEY: worker_application.api_key},
+        json={"cache_key": cache_key},
+    )
+    assert result.status_code == 200
+    assert result.json == {"cached_run_uuid": pipeline_run.uuid}
+    assert next_run.run_state_enum() == RunStateEnum.COMPLETED
+
+
+def test_upload_run_heartbeat(
+    client, pipeline, worker_application, mock_execute_pipeline
+):
+    db.session.commit()
+    pipeline_run = create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    url = f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/heartbeat"
+
+    result = client.put(
+        f"/v1/pipelines/{pipeline.uuid}/runs/no-id/heartbeat",
+        content_type="application/json",
+        headers={ROLES_KEY: worker_application.api_key},
+        json={"worker_ip": "10.0.0.1"},
+    )
+    assert result.status_code == 404
+
+    # not RUNNING
+    result = client.put(
+        url,
+        content_type="application/json",
+        headers={ROLES_KEY: worker_application.api_key},
+        json={"worker_ip": "10.0.0.1"},
+    )
+    assert result.status_code == 400
+
+    update_pipeline_run_state(pipeline_run.uuid, {"state": "RUNNING"})
+    result = client.put(
+        url,
+        content_type="application/json",
+        headers={ROLES_KEY: worker_application.api_key},
+        json={"worker_ip": ""},
+    )
+    assert result.status_code == 400
+
+    result = client.put(
+        url,
+        content_type="application/json",
+        headers={ROLES_KEY: worker_application.api_key},
+        json={"worker_ip": "10.0.0.1"},
+    )
+    assert result.status_code == 200
+    assert pipeline_run.worker_ip == "10.0.0.1"
+
+
+def test_update_pipeline_run_environment(
+    client, pipeline, worker_application, mock_execute_pipeline
+):
+    db.session.commit()
+    pipeline_run = create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    digest = "python@sha256:4c4e8f3d2a"
+
+    result = client.put(
+        "/v1/pipelines/no-id/runs/no-id/environment",
+        content_type="application/json",
+        json={"docker_image_digest": digest},
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 404
+
+    # no such pipeline_run_id
+    result = client.put(
+        f"/v1/pipelines/{pipeline.uuid}/runs/no-id/environment",
+        content_type="application/json",
+        json={"docker_image_digest": digest},
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 404
+
+    # Bad digest
+    result = client.put(
+        f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/environment",
+        content_type="application/json",
+        json={"docker_image_digest": ""},
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 400
+
+    result = client.put(
+        f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/environment",
+        content_type="application/json",
+        json={"docker_image_digest": digest},
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 200
+    assert pipeline_run.docker_image_digest == digest
+
+
+def test_upload_run_metrics(
+    client, pipeline, client_application, worker_application, mock_execute_pipeline
+):
+    db.session.commit()
+    pipeline_run = create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    metrics = {
+        "phases": [{"name": "clone", "duration": 1.5, "byte_count": 2048}],
+        "resources": {
+            "peak_memory_bytes": 1024,
+            "cpu_seconds": 2.5,
+            "block_read_bytes": 10,
+            "block_write_bytes": 20,
+        },
+    }
+
+    result = client.put(
+        "/v1/pipelines/no-id/runs/no-id/metrics",
+        content_type="application/json",
+        json=metrics,
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 404
+
+    # no such pipeline_run_id
+    result = client.put(
+        f"/v1/pipelines/{pipeline.uuid}/runs/no-id/metrics",
+        content_type="application/json",
+        json=metrics,
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 404
+
+    # Bad phase
+    result = client.put(
+        f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/metrics",
+        content_type="application/json",
+        json={"phases": [{"name": "clone"}]},
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 400
+
+    result = client.put(
+        f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/metrics",
+        content_type="application/json",
+        json=metrics,
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 200
+
+    result = client.get(
+        f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}",
+        content_type="application/json",
+        headers={ROLES_KEY: client_application.api_key},
+    )
+    assert result.json["phases"] == metrics["phases"]
+    assert result.json["resources"] == metrics["resources"]
+
+
 def test_upload_run_artifact_service_valueerror(
     client, monkeypatch, pipeline, worker_application, mock_execute_pipeline
 ):
@@ -483,3 +1017,116 @@ def test_upload_run_artifact(
         headers={ROLES_KEY: worker_application.api_key},
     )
     assert result.status_code == 200
+
+
+@patch("app.pipelines.services.get_s3")
+def test_create_run_artifact_upload(
+    get_s3_mock, client, pipeline, worker_application, mock_execute_pipeline
+):
+    get_s3_mock.return_value.generate_presigned_url.return_value = "https://s3/put"
+    db.session.commit()
+    pipeline_run = create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+
+    result = client.post(
+        "/v1/pipelines/no-id/runs/no-id/artifacts/uploads",
+        content_type="application/json",
+        json={"name": "a.csv", "size": 10},
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 404
+
+    # no such pipeline_run_id
+    result = client.post(
+        f"/v1/pipelines/{pipeline.uuid}/runs/no-id/artifacts/uploads",
+        content_type="application/json",
+        json={"name": "a.csv", "size": 10},
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 404
+
+    result = client.post(
+        f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/artifacts/uploads",
+        content_type="application/json",
+        json={"name": "a.csv", "size": -1},
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 400
+
+    result = client.post(
+        f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/artifacts/uploads",
+        content_type="application/json",
+        json={"name": "a.csv", "size": 10},
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 200
+    assert result.json["upload_id"] is None
+    assert result.json["urls"] == ["https://s3/put"]
+    assert len(result.json["uuid"]) == 32
+
+
+@patch("app.pipelines.models.create_url")
+@patch("app.pipelines.services.get_s3")
+def test_complete_run_artifact_upload(
+    get_s3_mock,
+    create_url_mock,
+    client,
+    pipeline,
+    worker_application,
+    mock_execute_pipeline,
+):
+    create_url_mock.return_value = "http://example.com/presigned"
+    db.session.commit()
+    pipeline_run = create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    artifact_uuid = "5ea9102b2abd498f9830389debb21fb8"
+
+    result = client.post(
+        f"/v1/pipelines/no-id/runs/no-id/artifacts/uploads/{artifact_uuid}/complete",
+        content_type="application/json",
+        json={"name": "a.csv"},
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 404
+
+    # no such pipeline_run_id
+    result = client.post(
+        f"/v1/pipelines/{pipeline.uuid}/runs/no-id/artifacts/uploads/{artifact_uuid}/complete",
+        content_type="application/json",
+        json={"name": "a.csv"},
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 404
+
+    url = f"/v1/pipelines/{pipeline.uuid}/runs/{pipeline_run.uuid}/artifacts/uploads/{artifact_uuid}/complete"
+    result = client.post(
+        url,
+        content_type="application/json",
+        json={"name": "a.csv", "parts": [{"part_number": 0}]},
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 400
+
+    get_s3_mock.return_value.head_object.side_effect = ClientError(
+        {"Error": {}}, "HeadObject"
+    )
+    result = client.post(
+        url,
+        content_type="application/json",
+        json={"name": "a.csv"},
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 400
+
+    get_s3_mock.return_value.head_object.side_effect = None
+    result = client.post(
+        url,
+        content_type="application/json",
+        json={"name": "a.csv"},
+        headers={ROLES_KEY: worker_application.api_key},
+    )
+    assert result.status_code == 200
+    assert result.json == {
+        "uuid": artifact_uuid,
+        "name": "a.csv",
+        "url": "http://example.com/presigned",
+    }
+    assert len(pipeline_run.pipeline_run_artifacts) == 1
@@ -1,16 +1,31 @@
 import io
 import json
+from datetime import timedelta
 from unittest.mock import MagicMock, patch
 from urllib.error import URLError
 
 import pytest
+from botocore.exceptions import ClientError
 from marshmallow.exceptions import ValidationError
 
-from app.constants import S3_BUCKET, CALLBACK_TIMEOUT
-from app.model_utils import RunStateEnum
+from app.constants import (
+    S3_BUCKET,
+    CALLBACK_TIMEOUT,
+    MAX_RUN_RESTARTS,
+    MAX_RUN_TIMEOUT,
+    RUN_HEARTBEAT_TIMEOUT,
+    RUN_STARVATION_TIMEOUT,
+    UPLOAD_PART_SIZE,
+)
+from app.model_utils import ResourceClassEnum, RunPriorityEnum, RunStateEnum
 from app.pipelines import services
-from app.pipelines.models import db, PipelineRunArtifact
-from app.pipelines.queries import find_pipeline
+from app.pipelines.models import (
+    db,
+    PipelineRunArtifact,
+    PipelineRunOutput,
+    PipelineRunPhase,
+)
+from app.pipelines.queries import find_pipeline, find_pipeline_run_output
 
 A_NAME = "a pipeline"
 A_DESCRIPTION = "a description"
@@ -73,6 +88,32 @@ def test_create_pipeline_no_description(app):
     assert pipeline.docker_image_url == A_DOCKER_IMAGE
     assert pipeline.repository_ssh_url == A_SSH_URL
     assert pipeline.repository_branch == A_BRANCH
+    assert pipeline.timeout is None
+
+
+def test_create_pipeline_timeout(app):
+    with pytest.raises(ValidationError):
+        services.create_pipeline(dict(PIPELINE_JSON, timeout=0))
+
+    pipeline = services.create_pipeline(dict(PIPELINE_JSON, timeout=3600))
+    assert pipeline.timeout == 3600
+
+    # runs longer than MAX_RUN_TIMEOUT would be redelivered
+    app.config[MAX_RUN_TIMEOUT] = 1800
+    with pytest.raises(ValidationError):
+        services.create_pipeline(dict(PIPELINE_JSON, timeout=3600))
+    with pytest.raises(ValidationError):
+        services.update_pipeline(pipeline.uuid, dict(PIPELINE_JSON, timeout=3600))
+
+
+def test_create_pipeline_resource_class(app):
+    assert services.create_pipeline(PIPELINE_JSON).resource_class == 1
+
+    with pytest.raises(ValidationError):
+        services.create_pipeline(dict(PIPELINE_JSON, resource_class="HUGE"))
+
+    pipeline = services.create_pipeline(dict(PIPELINE_JSON, resource_class="LARGE"))
+    assert pipeline.resource_class == ResourceClassEnum.LARGE
 
 
 def test_update_pipeline_no_uuid(app):
@@ -165,6 +206,62 @@ def test_create_pipeline_run(app, pipeline, mock_execute_pipeline):
     assert pipeline_run.pipeline_run_states[1].code == RunStateEnum.NOT_STARTED
 
 
+@patch("app.pipelines.services.execute_pipeline.delay")
+def test_start_pipeline_run_resource_class(delay_mock, app, pipeline):
+    pipeline.resource_class = ResourceClassEnum.MEDIUM
+    db.session.commit()
+
+    services.create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    assert delay_mock.call_args[1] == {
+        "resource_class": ResourceClassEnum.MEDIUM,
+        "priority": RunPriorityEnum.NORMAL,
+        "redelivered": False,
+        "use_run_cache": False,
+    }
+
+
+@patch("app.pipelines.services.execute_pipeline.delay")
+def test_create_pipeline_run_priority(delay_mock, app, pipeline):
+    with pytest.raises(ValidationError):
+        services.create_pipeline_run(
+            pipeline.uuid, dict(VALID_CALLBACK_INPUT, priority="URGENT")
+        )
+
+    pipeline_run = services.create_pipeline_run(
+        pipeline.uuid, dict(VALID_CALLBACK_INPUT, priority="HIGH")
+    )
+    assert pipeline_run.priority == RunPriorityEnum.HIGH
+    assert pipeline_run.dispatched_at is not None
+    assert delay_mock.call_args[1]["priority"] == RunPriorityEnum.HIGH
+
+
+@patch("app.pipelines.services.execute_pipeline.delay")
+def test_promote_starved_pipeline_runs(delay_mock, app, pipeline):
+    app.config[RUN_STARVATION_TIMEOUT] = 60
+    low_run = services.create_pipeline_run(
+        pipeline.uuid, dict(VALID_CALLBACK_INPUT, priority="LOW")
+    )
+    high_run = services.create_pipeline_run(
+        pipeline.uuid, dict(VALID_CALLBACK_INPUT, priority="HIGH")
+    )
+    running_run = services.create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    running_run.pipeline_run_states.append(
+        services.create_pipeline_run_state(RunStateEnum.RUNNING)
+    )
+    for pipeline_run in (low_run, high_run, running_run):
+        pipeline_run.dispatched_at -= timedelta(minutes=2)
+    db.session.commit()
+    delay_mock.reset_mock()
+
+    assert services.promote_starved_pipeline_runs() == [low_run]
+    assert low_run.priority == RunPriorityEnum.NORMAL
+    assert delay_mock.call_count == 1
+    assert delay_mock.call_args[1]["priority"] == RunPriorityEnum.NORMAL
+
+    # it was dispatched again just now:
+    assert services.promote_starved_pipeline_runs() == []
+
+
 def test_create_queued_pipeline_run(app, pipeline):
     input1 = {
         "name": "name1.pdf",
@@ -197,8 +294,334 @@ def test_update_pipeline_run_output(app, pipeline, mock_execute_pipeline):
     pipeline_run = services.create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
 
     services.update_pipeline_run_output(pipeline_run.uuid, "stdout", "stderr")
-    assert pipeline_run.std_out == "stdout"
-    assert pipeline_run.std_err == "stderr"
+    assert find_pipeline_run_output(pipeline_run, "std_out") == "stdout"
+    assert find_pipeline_run_output(pipeline_run, "std_err") == "stderr"
+
+    # the output is replaced
+    services.update_pipeline_run_output(pipeline_run.uuid, "new", "")
+    assert find_pipeline_run_output(pipeline_run, "std_out") == "new"
+    assert find_pipeline_run_output(pipeline_run, "std_err") == ""
+
+
+def test_append_pipeline_run_output_no_uuid(app, pipeline):
+    with pytest.raises(ValueError):
+        services.append_pipeline_run_output(
+            None, {"std_out_offset": 0, "std_err_offset": 0}
+        )
+
+
+def test_append_pipeline_run_output_bad_offset(app, pipeline, mock_execute_pipeline):
+    pipeline_run = services.create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+
+    with pytest.raises(ValidationError):
+        services.append_pipeline_run_output(
+            pipeline_run.uuid, {"std_out_offset": -1, "std_err_offset": 0}
+        )
+
+    # offsets can't skip past the end of the output
+    with pytest.raises(ValueError):
+        services.append_pipeline_run_output(
+            pipeline_run.uuid,
+            {"std_out": "stdout", "std_out_offset": 1, "std_err_offset": 0},
+        )
+
+
+def test_append_pipeline_run_output(app, pipeline, mock_execute_pipeline):
+    pipeline_run = services.create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+
+    lengths = services.append_pipeline_run_output(
+        pipeline_run.uuid,
+        {
+            "std_out": "stdout",
+            "std_out_offset": 0,
+            "std_err": "stderr",
+            "std_err_offset": 0,
+        },
+    )
+    assert lengths == (6, 6)
+    assert find_pipeline_run_output(pipeline_run, "std_out") == "stdout"
+    assert find_pipeline_run_output(pipeline_run, "std_err") == "stderr"
+
+    lengths = services.append_pipeline_run_output(
+        pipeline_run.uuid,
+        {"std_out": " more", "std_out_offset": 6, "std_err_offset": 6},
+    )
+    assert lengths == (11, 6)
+    assert find_pipeline_run_output(pipeline_run, "std_out") == "stdout more"
+    assert find_pipeline_run_output(pipeline_run, "std_err") == "stderr"
+
+    # a retried request replaces the output after its offset
+    lengths = services.append_pipeline_run_output(
+        pipeline_run.uuid,
+        {"std_out": " more", "std_out_offset": 6, "std_err_offset": 6},
+    )
+    assert lengths == (11, 6)
+    assert find_pipeline_run_output(pipeline_run, "std_out") == "stdout more"
+
+    # ...even when it starts part way through stored output
+    lengths = services.append_pipeline_run_output(
+        pipeline_run.uuid,
+        {"std_out": "!", "std_out_offset": 8, "std_err_offset": 6},
+    )
+    assert lengths == (9, 6)
+    assert find_pipeline_run_output(pipeline_run, "std_out") == "stdout m!"
+
+
+@patch("app.pipelines.services.CONSOLE_CHUNK_SIZE", 4)
+def test_append_pipeline_run_output_chunks(app, pipeline, mock_execute_pipeline):
+    pipeline_run = services.create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+
+    services.append_pipeline_run_output(
+        pipeline_run.uuid,
+        {"std_out": "0123456789", "std_out_offset": 0, "std_err_offset": 0},
+    )
+    chunks = PipelineRunOutput.query.filter(
+        PipelineRunOutput.pipeline_run_id == pipeline_run.id
+    ).all()
+    assert [(c.position, c.content) for c in chunks] == [
+        (0, "0123"),
+        (4, "4567"),
+        (8, "89"),
+    ]
+    assert find_pipeline_run_output(pipeline_run, "std_out") == "0123456789"
+
+
+def test_update_pipeline_run_environment(app, pipeline, mock_execute_pipeline):
+    with pytest.raises(ValueError):
+        services.update_pipeline_run_environment(
+            "no-id", {"docker_image_digest": "python@sha256:4c4e8f3d2a"}
+        )
+
+    pipeline_run = services.create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    with pytest.raises(ValidationError):
+        services.update_pipeline_run_environment(pipeline_run.uuid, {})
+
+    services.update_pipeline_run_environment(
+        pipeline_run.uuid, {"docker_image_digest": "python@sha256:4c4e8f3d2a"}
+    )
+    assert pipeline_run.docker_image_digest == "python@sha256:4c4e8f3d2a"
+
+
+def test_update_pipeline_run_metrics(app, pipeline, mock_execute_pipeline):
+    phases = [
+        {"name": "clone", "duration": 1.5, "byte_count": 2048},
+        {"name": "run", "duration": 30},
+    ]
+    with pytest.raises(ValueError):
+        services.update_pipeline_run_metrics("no-id", {"phases": phases})
+
+    pipeline_run = services.create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    with pytest.raises(ValidationError):
+        services.update_pipeline_run_metrics(
+            pipeline_run.uuid, {"phases": [{"name": "run", "duration": -1}]}
+        )
+
+    services.update_pipeline_run_metrics(
+        pipeline_run.uuid,
+        {
+            "phases": phases,
+            "resources": {
+                "peak_memory_bytes": 1024,
+                "cpu_seconds": 2.5,
+                "block_read_bytes": 10,
+                "block_write_bytes": None,
+            },
+        },
+    )
+    assert pipeline_run.peak_memory_bytes == 1024
+    assert pipeline_run.cpu_seconds == 2.5
+    assert pipeline_run.block_read_bytes == 10
+    assert pipeline_run.block_write_bytes is None
+    assert [
+        (p.name, p.duration, p.byte_count) for p in pipeline_run.pipeline_run_phases
+    ] == [("clone", 1.5, 2048), ("run", 30, None)]
+
+    # metrics replace those previously reported
+    services.update_pipeline_run_metrics(pipeline_run.uuid, {"phases": phases[1:]})
+    assert [p.name for p in pipeline_run.pipeline_run_phases] == ["run"]
+    assert PipelineRunPhase.query.count() == 1
+
+
+def test_cancel_pipeline_run(app, pipeline, mock_execute_pipeline):
+    with pytest.raises(ValueError):
+        services.cancel_pipeline_run("no-id")
+
+    pipeline_run = services.create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    services.update_pipeline_run_state(pipeline_run.uuid, {"state": "RUNNING"})
+    services.cancel_pipeline_run(pipeline_run.uuid)
+    assert pipeline_run.run_state_enum() == RunStateEnum.CANCELLED
+
+    # finished runs can't be cancelled
+    with pytest.raises(ValueError):
+        services.cancel_pipeline_run(pipeline_run.uuid)
+
+
+def test_restart_pipeline_run(app, pipeline, mock_execute_pipeline):
+    with pytest.raises(ValueError):
+        services.restart_pipeline_run("no-id")
+
+    pipeline_run = services.create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    # only RUNNING runs can be restarted
+    with pytest.raises(ValueError):
+        services.restart_pipeline_run(pipeline_run.uuid)
+
+    services.update_pipeline_run_state(pipeline_run.uuid, {"state": "RUNNING"})
+    services.update_pipeline_run_output(pipeline_run.uuid, "lost", "")
+    services.update_pipeline_run_metrics(
+        pipeline_run.uuid,
+        {
+            "phases": [{"name": "run", "duration": 30}],
+            "resources": {"peak_memory_bytes": 1024},
+        },
+    )
+    db.session.add(PipelineRunArtifact(name="lost.csv", pipeline_run=pipeline_run))
+    db.session.commit()
+
+    # its worker is still alive
+    with pytest.raises(ValueError):
+        services.restart_pipeline_run(pipeline_run.uuid)
+
+    pipeline_run.heartbeat_at -= timedelta(seconds=app.config[RUN_HEARTBEAT_TIMEOUT])
+    db.session.commit()
+    services.restart_pipeline_run(pipeline_run.uuid)
+    assert pipeline_run.run_state_enum() == RunStateEnum.RUNNING
+    assert len(pipeline_run.pipeline_run_states) == 4
+    assert pipeline_run.pipeline_run_phases == []
+    assert pipeline_run.pipeline_run_artifacts == []
+    assert pipeline_run.peak_memory_bytes is None
+    assert find_pipeline_run_output(pipeline_run, "std_out") == ""
+
+    services.update_pipeline_run_state(pipeline_run.uuid, {"state": "COMPLETED"})
+    with pytest.raises(ValueError):
+        services.restart_pipeline_run(pipeline_run.uuid)
+
+
+def test_check_pipeline_run_cache(app, pipeline, mock_execute_pipeline):
+    cache_key = "a" * 64
+    with pytest.raises(ValueError):
+        services.check_pipeline_run_cache("no-id", {"cache_key": cache_key})
+
+    cached_run = services.create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    with pytest.raises(ValueError):
+        # not RUNNING
+        services.check_pipeline_run_cache(cached_run.uuid, {"cache_key": cache_key})
+    services.update_pipeline_run_state(cached_run.uuid, {"state": "RUNNING"})
+    with pytest.raises(ValidationError):
+        services.check_pipeline_run_cache(cached_run.uuid, {"cache_key": "abc"})
+
+    # nothing to reuse yet
+    assert (
+        services.check_pipeline_run_cache(cached_run.uuid, {"cache_key": cache_key})
+        is None
+    )
+    assert cached_run.cache_key == cache_key
+    artifact = PipelineRunArtifact(name="output.csv")
+    cached_run.pipeline_run_artifacts.append(artifact)
+    services.update_pipeline_run_state(cached_run.uuid, {"state": "COMPLETED"})
+
+    # the pipeline doesn't use the run cache
+    pipeline_run = services.create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    services.update_pipeline_run_state(pipeline_run.uuid, {"state": "RUNNING"})
+    assert (
+        services.check_pipeline_run_cache(pipeline_run.uuid, {"cache_key": cache_key})
+        is None
+    )
+    assert pipeline_run.run_state_enum() == RunStateEnum.RUNNING
+
+    pipeline.use_run_cache = True
+    db.session.commit()
+    assert (
+        services.check_pipeline_run_cache(pipeline_run.uuid, {"cache_key": cache_key})
+        == cached_run
+    )
+    assert pipeline_run.run_state_enum() == RunStateEnum.COMPLETED
+    assert [a.name for a in pipeline_run.pipeline_run_artifacts] == ["output.csv"]
+    assert pipeline_run.pipeline_run_artifacts[0].source_artifact == artifact
+
+    # runs completed from the cache link to the original artifact too
+    next_run = services.create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    services.update_pipeline_run_state(next_run.uuid, {"state": "RUNNING"})
+    assert (
+        services.check_pipeline_run_cache(next_run.uuid, {"cache_key": cache_key})
+        == pipeline_run
+    )
+    assert next_run.pipeline_run_artifacts[0].source_artifact == artifact
+
+
+def test_update_pipeline_run_heartbeat(app, pipeline, mock_execute_pipeline):
+    with pytest.raises(ValueError):
+        services.update_pipeline_run_heartbeat("no-id", {"worker_ip": "10.0.0.1"})
+
+    pipeline_run = services.create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    # not RUNNING yet
+    with pytest.raises(ValueError):
+        services.update_pipeline_run_heartbeat(
+            pipeline_run.uuid, {"worker_ip": "10.0.0.1"}
+        )
+
+    services.update_pipeline_run_state(pipeline_run.uuid, {"state": "RUNNING"})
+    started_at = pipeline_run.heartbeat_at
+    assert started_at is not None
+    with pytest.raises(ValidationError):
+        services.update_pipeline_run_heartbeat(pipeline_run.uuid, {"worker_ip": ""})
+
+    services.update_pipeline_run_heartbeat(pipeline_run.uuid, {"worker_ip": "10.0.0.1"})
+    assert pipeline_run.worker_ip == "10.0.0.1"
+    assert pipeline_run.heartbeat_at >= started_at
+
+    services.update_pipeline_run_state(pipeline_run.uuid, {"state": "COMPLETED"})
+    assert pipeline_run.heartbeat_at is None
+
+
+@patch("app.pipelines.services.execute_pipeline.delay")
+def test_reap_stale_pipeline_runs(delay_mock, app, pipeline):
+    app.config[RUN_HEARTBEAT_TIMEOUT] = 60
+    stale_run = services.create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    alive_run = services.create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    not_started_run = services.create_pipeline_run(pipeline.uuid, VALID_CALLBACK_INPUT)
+    for pipeline_run in (stale_run, alive_run):
+        services.update_pipeline_run_state(pipeline_run.uuid, {"state": "RUNNING"})
+    for pipeline_run in (stale_run, alive_run, not_started_run):
+        pipeline_run.dispatched_at -= timedelta(minutes=2)
+    stale_run.heartbeat_at -= timedelta(minutes=2)
+    db.session.commit()
+    delay_mock.reset_mock()
+
+    assert services.reap_stale_pipeline_runs() == [stale_run]
+    assert stale_run.run_state_enum() == RunStateEnum.RUNNING
+    assert delay_mock.call_count == 1
+    assert delay_mock.call_args[0][1] == stale_run.uuid
+    assert delay_mock.call_args[1]["redelivered"]
+
+    # it was dispatched again just now:
+    assert stale_run.dispatched_at >= services._heartbeat_timeout_start()
+    assert services.reap_stale_pipeline_runs() == []
+    assert delay_mock.call_count == 1
+
+    # and is dispatched once more when no worker restarted it in time
+    stale_run.dispatched_at -= timedelta(minutes=2)
+    db.session.commit()
+    assert services.reap_stale_pipeline_runs() == [stale_run]
+    assert services.reap_stale_pipeline_runs() == []
+    assert delay_mock.call_count == 2
+
+    # (runs dispatched before dispatched_at was recorded)
+    stale_run.dispatched_at = None
+    db.session.commit()
+    assert services.reap_stale_pipeline_runs() == [stale_run]
+    assert services.reap_stale_pipeline_runs() == []
+    assert delay_mock.call_count == 3
+
+    # runs that keep going stale fail
+    for _ in range(MAX_RUN_RESTARTS):
+        stale_run.pipeline_run_states.append(
+            services.create_pipeline_run_state(RunStateEnum.RUNNING)
+        )
+    stale_run.dispatched_at -= timedelta(minutes=2)
+    db.session.commit()
+    assert services.reap_stale_pipeline_runs() == [stale_run]
+    assert stale_run.run_state_enum() == RunStateEnum.FAILED
+    assert delay_mock.call_count == 3
 
 
 def test_update_pipeline_run_state_bad_state(app, pipeline, mock_execute_pipeline):
@@ -343,3 +766,134 @@ def test_copy_pipeline_run_artifact(
 def test_create_pipeline_run_artifact_no_pipeline(app):
     with pytest.raises(ValueError):
         services.create_pipeline_run_artifact("nosuchid", "file.name", None)
+
+
+@patch("app.pipelines.services.get_s3")
+def test_create_pipeline_run_artifact_upload(get_s3_mock, app, pipeline):
+    s3 = get_s3_mock.return_value
+    s3.generate_presigned_url.return_value = "https://s3/presigned"
+
+    with pytest.raises(ValueError):
+        services.create_pipeline_run_artifact_upload(
+            "nosuchid", {"name": "a.csv", "size": 10}
+        )
+
+    pipeline_run = services.create_pipeline_run(
+        pipeline.uuid, VALID_CALLBACK_INPUT, True
+    )
+    with pytest.raises(ValidationError):
+        services.create_pipeline_run_artifact_upload(pipeline_run.uuid, {"name": ""})
+
+    upload = services.create_pipeline_run_artifact_upload(
+        pipeline_run.uuid, {"name": "a b.csv", "size": 10}
+    )
+    assert upload == {
+        "uuid": upload["uuid"],
+        "upload_id": None,
+        "part_size": UPLOAD_PART_SIZE,
+        "urls": ["https://s3/presigned"],
+    }
+    (method,) = s3.generate_presigned_url.call_args[0]
+    assert method == "put_object"
+    assert s3.generate_presigned_url.call_args[1]["Params"]["Key"] == (
+        f"{pipeline.uuid}/{pipeline_run.uuid}/{upload['uuid']}-a%20b.csv"
+    )
+    assert not s3.create_multipart_upload.called
+
+
+@patch("app.pipelines.services.get_s3")
+def test_create_pipeline_run_artifact_upload_multipart(get_s3_mock, app, pipeline):
+    s3 = get_s3_mock.return_value
+    s3.generate_presigned_url.return_value = "https://s3/presigned"
+    s3.create_multipart_upload.return_value = {"UploadId": "u1"}
+    pipeline_run = services.create_pipeline_run(
+        pipeline.uuid, VALID_CALLBACK_INPUT, True
+    )
+
+    upload = services.create_pipeline_run_artifact_upload(
+        pipeline_run.uuid, {"name": "a.csv", "size": UPLOAD_PART_SIZE * 2 + 1}
+    )
+    assert upload["upload_id"] == "u1"
+    assert upload["part_size"] == UPLOAD_PART_SIZE
+    assert len(upload["urls"]) == 3
+    part_params = s3.generate_presigned_url.call_args_list[2][1]["Params"]
+    assert part_params["UploadId"] == "u1"
+    assert part_params["PartNumber"] == 3
+
+    # very large files use larger parts
+    upload = services.create_pipeline_run_artifact_upload(
+        pipeline_run.uuid, {"name": "a.csv", "size": UPLOAD_PART_SIZE * 20000}
+    )
+    assert upload["part_size"] == UPLOAD_PART_SIZE * 2
+    assert len(upload["urls"]) == 10000
+
+
+@patch("app.pipelines.services.get_s3")
+def test_complete_pipeline_run_artifact_upload(get_s3_mock, app, pipeline):
+    s3 = get_s3_mock.return_value
+    artifact_uuid = "5ea9102b2abd498f9830389debb21fb8"
+
+    with pytest.raises(ValueError):
+        services.complete_pipeline_run_artifact_upload(
+            "nosuchid", artifact_uuid, {"name": "a.csv"}
+        )
+
+    pipeline_run = services.create_pipeline_run(
+        pipeline.uuid, VALID_CALLBACK_INPUT, True
+    )
+    with pytest.raises(ValueError):
+        services.complete_pipeline_run_artifact_upload(
+            pipeline_run.uuid, "../a", {"name": "a.csv"}
+        )
+
+    # the upload never happened
+    s3.head_object.side_effect = ClientError({"Error": {}}, "HeadObject")
+    with pytest.raises(ValueError):
+        services.complete_pipeline_run_artifact_upload(
+            pipeline_run.uuid, artifact_uuid, {"name": "a.csv"}
+        )
+    assert len(pipeline_run.pipeline_run_artifacts) == 0
+
+    s3.head_object.side_effect = None
+    artifact = services.complete_pipeline_run_artifact_upload(
+        pipeline_run.uuid,
+        artifact_uuid,
+        {
+            "name": "a.csv",
+            "upload_id": "u1",
+            "parts": [{"part_number": 1, "etag": '"a"'}],
+        },
+    )
+    assert artifact.uuid == artifact_uuid
+    assert artifact.name == "a.csv"
+    assert pipeline_run.pipeline_run_artifacts == [artifact]
+    assert s3.complete_multipart_upload.call_args[1]["MultipartUpload"] == {
+        "Parts": [{"PartNumber": 1, "ETag": '"a"'}]
+    }
+
+    # completing again (a retried request) has no additional effect
+    s3.reset_mock()
+    assert (
+        services.complete_pipeline_run_artifact_upload(
+            pipeline_run.uuid, artifact_uuid, {"name": "a.csv"}
+        )
+        == artifact
+    )
+    assert len(pipeline_run.pipeline_run_artifacts) == 1
+    assert not s3.head_object.called
+
+    # uploading a file again replaces its artifact
+    other_uuid = "6fb0213c3bce409f0941490efcc32fc9"
+    other = services.complete_pipeline_run_artifact_upload(
+        pipeline_run.uuid, other_uuid, {"name": "a.csv"}
+    )
+    assert other.uuid == other_uuid
+    assert pipeline_run.pipeline_run_artifacts == [other]
+    assert PipelineRunArtifact.query.filter_by(uuid=artifact_uuid).count() == 0
+
+
+@patch("app.pipelines.services.boto3.client")
+def test_get_s3(client_mock, app):
+    services.get_s3()
+    assert client_mock.call_args[0] == ("s3",)
+    assert client_mock.call_args[1]["endpoint_url"] == "http://example.com"
@@ -0,0 +1,270 @@
+import fcntl
+import io
+import json
+import os
+import threading
+import time
+from unittest.mock import Mock, patch
+from urllib.error import HTTPError
+
+import pytest
+
+from app.caches import (
+    DockerImageCache,
+    GitMirrorCache,
+    InputFileCache,
+    directory_size,
+    docker_image_digest,
+    file_lock,
+    file_sha256,
+)
+
+
+def test_file_lock(tmp_path):
+    lock_path = str(tmp_path / "a.lock")
+    with file_lock(lock_path):
+        with open(lock_path, "a") as other:
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    with file_lock(lock_path, shared=True):
+        with open(lock_path, "a") as other:
+            fcntl.flock(other, fcntl.LOCK_SH | fcntl.LOCK_NB)
+
+
+def test_directory_size(tmp_path):
+    (tmp_path / "a").write_bytes(b"123")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "b").write_bytes(b"45")
+    os.symlink(tmp_path / "a", tmp_path / "link")
+
+    assert directory_size(str(tmp_path)) == 5
+
+
+def test_file_sha256(tmp_path):
+    (tmp_path / "a").write_bytes(b"abc")
+
+    assert (
+        file_sha256(str(tmp_path / "a"))
+        == "ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad"
+    )
+
+
+class InspectResult:
+    def __init__(self, returncode, stdout=b""):
+        self.returncode = returncode
+        self.stdout = stdout
+
+
+@patch("app.caches.subprocess.run")
+def test_docker_image_digest(run_mock):
+    run_mock.return_value = InspectResult(1)
+    assert docker_image_digest("python:3") is None
+
+    run_mock.return_value = InspectResult(0, b"[]")
+    assert docker_image_digest("python:3") is None
+
+    run_mock.return_value = InspectResult(
+        0, b'["other/python@sha256:123","python@sha256:456"]'
+    )
+    assert docker_image_digest("python:3") == "python@sha256:456"
+    assert run_mock.call_args[0][0][-1] == "python:3"
+    assert docker_image_digest("localhost:5000/python") == "other/python@sha256:123"
+
+
+@patch("app.caches.subprocess.run")
+def test_image_cache_pull(run_mock, tmp_path):
+    cache = DockerImageCache(str(tmp_path), 60)
+    executor = Mock()
+
+    # images that aren't local are pulled
+    run_mock.return_value = InspectResult(1)
+    cache.pull(executor, "python:3")
+    executor.run.assert_called_once_with("docker pull python:3", str(tmp_path))
+
+    # ...and then used until the TTL passes
+    run_mock.return_value = InspectResult(0, b'["python@sha256:456"]')
+    executor.reset_mock()
+    cache.pull(executor, "python:3")
+    assert not executor.run.called
+
+    with patch("app.caches.time.time", return_value=time.time() + 61):
+        cache.pull(executor, "python:3")
+    executor.run.assert_called_once_with("docker pull python:3", str(tmp_path))
+
+
+@patch("app.caches.subprocess.run")
+def test_image_cache_pull_digest(run_mock, tmp_path):
+    cache = DockerImageCache(str(tmp_path), 0)
+    executor = Mock()
+
+    # images referenced by digest never change
+    run_mock.return_value = InspectResult(0, b'["python@sha256:456"]')
+    cache.pull(executor, "python@sha256:456")
+    assert not executor.run.called
+
+
+def test_mirror_path(tmp_path):
+    cache = GitMirrorCache(str(tmp_path), 100)
+    path = cache.mirror_path("https://github.com/example")
+    assert path.startswith(str(tmp_path))
+    assert path.endswith(".git")
+    assert path == cache.mirror_path("https://github.com/example")
+    assert path != cache.mirror_path("https://github.com/other")
+
+
+def test_clone(tmp_path):
+    cache = GitMirrorCache(str(tmp_path / "git"), 100)
+    mirror = cache.mirror_path("https://github.com/example")
+    executor = Mock()
+
+    cache.clone(executor, "https://github.com/example", "master", "/tmp/gitrepo")
+    assert executor.run.call_args_list[0][0] == (
+        f"git clone --mirror https://github.com/example {mirror}",
+        str(tmp_path / "git"),
+    )
+    assert executor.run.call_args_list[1][0][0] == (
+        f"git clone --depth 1 --branch master file://{mirror} /tmp/gitrepo"
+    )
+
+    # only new commits are fetched into an existing mirror
+    os.makedirs(mirror)
+    executor.reset_mock()
+    cache.clone(executor, "https://github.com/example", "master", "/tmp/gitrepo")
+    assert executor.run.call_args_list[0][0] == ("git remote update --prune", mirror)
+
+
+def test_clone_failure(tmp_path):
+    cache = GitMirrorCache(str(tmp_path), 100)
+    mirror = cache.mirror_path("https://github.com/example")
+    executor = Mock()
+
+    def partial_clone(command, directory):
+        os.makedirs(mirror)
+        raise ValueError("Command returned nonzero code: 128")
+
+    executor.run.side_effect = partial_clone
+    with pytest.raises(ValueError):
+        cache.clone(executor, "https://github.com/example", "master", "/tmp/gitrepo")
+    assert not os.path.exists(mirror)
+
+
+def test_evict(tmp_path):
+    cache = GitMirrorCache(str(tmp_path), 10)
+    mirrors = []
+    for (i, url) in enumerate(["a", "b", "c"]):
+        mirror = cache.mirror_path(url)
+        os.makedirs(mirror)
+        with open(os.path.join(mirror, "pack"), "wb") as f:
+            f.write(b"12345")
+        with open(cache._lock_path(mirror), "a"):
+            pass
+        os.utime(cache._lock_path(mirror), (i, i))
+        mirrors.append(mirror)
+
+    # the least recently used mirror that isn't in use is removed first
+    with file_lock(cache._lock_path(mirrors[0]), shared=True):
+        cache.evict(keep=mirrors[2])
+
+    assert os.path.exists(mirrors[0])
+    assert not os.path.exists(mirrors[1])
+    assert os.path.exists(mirrors[2])
+
+
+class FakeResponse(io.BytesIO):
+    def __init__(self, content, headers=None):
+        super().__init__(content)
+        self.headers = headers or {}
+
+
+@patch("app.caches.urllib_request.urlopen")
+def test_input_cache_fetch(urlopen_mock, tmp_path):
+    cache = InputFileCache(str(tmp_path / "cache"), 100)
+    urlopen_mock.return_value = FakeResponse(
+        b"weather", {"ETag": '"abc"', "Last-Modified": "Mon, 05 Oct 2020 1:00:00 GMT"}
+    )
+
+    cache.fetch("https://example.com/weather.csv?sig=1", str(tmp_path / "a.csv"))
+    assert (tmp_path / "a.csv").read_bytes() == b"weather"
+    assert urlopen_mock.call_args[0][0].headers == {}
+
+    # unchanged files are revalidated, and copied from the cache
+    urlopen_mock.side_effect = HTTPError("url", 304, "Not Modified", {}, None)
+    cache.fetch("https://example.com/weather.csv?sig=2", str(tmp_path / "b.csv"))
+    request = urlopen_mock.call_args[0][0]
+    assert request.full_url == "https://example.com/weather.csv?sig=2"
+    assert request.headers["If-none-match"] == '"abc"'
+    assert request.headers["If-modified-since"] == "Mon, 05 Oct 2020 1:00:00 GMT"
+    assert (tmp_path / "b.csv").read_bytes() == b"weather"
+    assert os.stat(tmp_path / "a.csv").st_ino != os.stat(tmp_path / "b.csv").st_ino
+
+    # other errors are raised
+    urlopen_mock.side_effect = HTTPError("url", 404, "Not Found", {}, None)
+    with pytest.raises(HTTPError):
+        cache.fetch("https://example.com/weather.csv", str(tmp_path / "c.csv"))
+
+
+@patch("app.caches.urllib_request.urlopen")
+def test_input_cache_fetch_modified(urlopen_mock, tmp_path):
+    cache = InputFileCache(str(tmp_path / "cache"), 100)
+    urlopen_mock.return_value = FakeResponse(b"weather", {"ETag": '"abc"'})
+    cache.fetch("https://example.com/weather.csv", str(tmp_path / "a.csv"))
+
+    # a run changing its input doesn't change the cached copy
+    with open(tmp_path / "a.csv", "ab") as f:
+        f.write(b" changed")
+    urlopen_mock.side_effect = HTTPError("url", 304, "Not Modified", {}, None)
+    cache.fetch("https://example.com/weather.csv", str(tmp_path / "b.csv"))
+    assert (tmp_path / "b.csv").read_bytes() == b"weather"
+
+    # a modified cached copy is not used
+    entry_path = cache._entry_path("https://example.com/weather.csv")
+    with open(entry_path) as f:
+        blob_path = cache._blob_path(json.load(f)["sha256"])
+    with open(blob_path, "ab") as f:
+        f.write(b" changed")
+    urlopen_mock.side_effect = None
+    urlopen_mock.return_value = FakeResponse(b"weather", {"ETag": '"abc"'})
+    cache.fetch("https://example.com/weather.csv", str(tmp_path / "c.csv"))
+    assert urlopen_mock.call_args[0][0].headers == {}
+    assert (tmp_path / "c.csv").read_bytes() == b"weather"
+
+
+@patch("app.caches.urllib_request.urlopen")
+def test_input_cache_evict(urlopen_mock, tmp_path):
+    cache = InputFileCache(str(tmp_path / "cache"), 10)
+    for (i, name) in enumerate(["a", "b", "c"]):
+        urlopen_mock.return_value = FakeResponse(name.encode("utf-8") * 5)
+        cache.fetch(f"https://example.com/{name}", str(tmp_path / name))
+        os.utime(cache._entry_path(f"https://example.com/{name}"), (i, i))
+
+    # the least recently used file that isn't being downloaded is removed
+    entry_path = cache._entry_path("https://example.com/a")
+    with file_lock(cache._lock_path(entry_path)):
+        cache.evict()
+
+    blobs = os.listdir(tmp_path / "cache" / "blobs")
+    assert len(blobs) == 2
+    assert os.path.exists(cache._entry_path("https://example.com/a"))
+    assert not os.path.exists(cache._entry_path("https://example.com/b"))
+    with open(cache._entry_path("https://example.com/c")) as f:
+        assert json.load(f)["sha256"] in blobs
+
+
+def test_input_cache_evict_waits(tmp_path):
+    cache = InputFileCache(str(tmp_path / "cache"), 0)
+    os.makedirs(tmp_path / "cache" / "blobs")
+    # a blob whose entry another run hasn't written yet:
+    blob_path = cache._blob_path("abc")
+    with open(blob_path, "wb") as f:
+        f.write(b"weather")
+
+    thread = threading.Thread(target=cache.evict)
+    with file_lock(cache._blobs_lock_path(), shared=True):
+        thread.start()
+        thread.join(0.1)
+        assert thread.is_alive()
+        assert os.path.exists(blob_path)
+
+    thread.join()
+    assert not os.path.exists(blob_path)
@@ -0,0 +1,52 @@
+import os
+
+from app.console import ConsoleCapture
+
+
+def test_write_head():
+    console = ConsoleCapture(10, 10)
+
+    assert console.write("std_out", "") == ""
+    assert console.write("std_out", "12345") == "12345"
+    assert console.write("std_out", "67890") == "67890"
+    assert console.write("std_err", "abc") == "abc"
+    assert not console.is_truncated("std_out")
+    assert console.tail("std_out") == ""
+
+    console.close()
+
+
+def test_write_tail():
+    console = ConsoleCapture(4, 6)
+
+    assert console.write("std_out", "0123456") == "0123"
+    assert console.write("std_out", "789") == ""
+    assert not console.is_truncated("std_out")
+    assert console.write("std_out", "abcdefgh") == ""
+    assert console.is_truncated("std_out")
+
+    assert console.tail("std_out") == (
+        "\n... 8 characters omitted (see the console/std_out.log artifact) ...\n"
+        "cdefgh"
+    )
+    # (until more is written)
+    assert console.tail("std_out").endswith("cdefgh")
+
+    console.close()
+
+
+def test_log_path():
+    console = ConsoleCapture(2, 2)
+    console.write("std_out", "a line\n")
+    console.write("std_out", "another line\n")
+    console.flush()
+
+    log_path = console.log_path("std_out")
+    with open(log_path) as log:
+        assert log.read() == "a line\nanother line\n"
+
+    directory = console.directory
+    console.close()
+    assert console.closed
+    assert console.directory is None
+    assert not os.path.exists(directory)
@@ -0,0 +1,136 @@
+from unittest.mock import Mock, patch
+from urllib.error import URLError
+
+import pytest
+
+from app.containers import (
+    ContainerStatsSampler,
+    ContainerWatchdog,
+    container_stats,
+    kill_container,
+    parse_size,
+)
+
+
+class StatsResult:
+    def __init__(self, returncode, stdout=b""):
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = b""
+
+
+STATS = (
+    b'{"BlockIO":"1.5MB / 0B","CPUPerc":"50.00%","Container":"openfido-run",'
+    b'"MemUsage":"12MiB / 1.944GiB","Name":"openfido-run"}\n'
+)
+
+
+def test_parse_size():
+    assert parse_size("0B") == 0
+    assert parse_size("512kB") == 512000
+    assert parse_size(" 1.5MiB ") == 1572864
+    assert parse_size("2GB") == 2000000000
+
+    with pytest.raises(ValueError):
+        parse_size("lots")
+    with pytest.raises(ValueError):
+        parse_size("1.5XB")
+
+
+@patch("app.containers.subprocess.run")
+def test_container_stats(run_mock):
+    run_mock.return_value = StatsResult(1)
+    assert container_stats("openfido-run") is None
+
+    run_mock.return_value = StatsResult(0, STATS)
+    assert container_stats("openfido-run") == {
+        "cpu_percent": 50,
+        "memory_bytes": 12582912,
+        "block_read_bytes": 1500000,
+        "block_write_bytes": 0,
+    }
+    assert run_mock.call_args[0][0][-1] == "openfido-run"
+
+
+@patch("app.containers.container_stats")
+def test_sampler(stats_mock):
+    sampler = ContainerStatsSampler("openfido-run", 5)
+
+    # the container hasn't started yet
+    stats_mock.return_value = None
+    sampler.sample(5)
+    assert sampler.usage["peak_memory_bytes"] is None
+
+    stats_mock.return_value = {
+        "cpu_percent": 50,
+        "memory_bytes": 2048,
+        "block_read_bytes": 10,
+        "block_write_bytes": 20,
+    }
+    sampler.sample(5)
+    stats_mock.return_value = {
+        "cpu_percent": 200,
+        "memory_bytes": 1024,
+        "block_read_bytes": 30,
+        "block_write_bytes": 40,
+    }
+    sampler.sample(5)
+
+    assert sampler.usage == {
+        "peak_memory_bytes": 2048,
+        "cpu_seconds": 12.5,
+        "block_read_bytes": 30,
+        "block_write_bytes": 40,
+    }
+
+
+@patch("app.containers.container_stats")
+def test_sampler_thread(stats_mock):
+    stats_mock.return_value = None
+    sampler = ContainerStatsSampler("openfido-run", 0.01)
+    sampler.start()
+    assert sampler.stop()["cpu_seconds"] is None
+    assert not sampler.is_alive()
+
+
+@patch("app.containers.subprocess.run")
+def test_kill_container(run_mock):
+    run_mock.return_value = StatsResult(0)
+    kill_container("openfido-run")
+    assert run_mock.call_args[0][0] == ["docker", "kill", "openfido-run"]
+
+    # containers that already exited can't be killed
+    run_mock.return_value = StatsResult(1)
+    kill_container("openfido-run")
+
+
+def test_watchdog_check(app):
+    cancelled = Mock(return_value=False)
+    watchdog = ContainerWatchdog("openfido-run", 60, cancelled, 10)
+    assert watchdog.check(10) is None
+    assert watchdog.check(60) == "timeout"
+
+    cancelled.return_value = True
+    assert watchdog.check(10) == "cancelled"
+
+    # runs continue when the API can't be reached
+    cancelled.side_effect = URLError("an error")
+    assert watchdog.check(10) is None
+
+    watchdog = ContainerWatchdog("openfido-run", None, Mock(return_value=False), 10)
+    assert watchdog.check(1000000) is None
+
+
+@patch("app.containers.kill_container")
+def test_watchdog_thread(kill_mock, app):
+    watchdog = ContainerWatchdog("openfido-run", 0.01, Mock(return_value=False), 10)
+    watchdog.start()
+    watchdog.join(5)
+    assert watchdog.stop() == "timeout"
+    kill_mock.assert_called_once_with("openfido-run")
+
+    kill_mock.reset_mock()
+    watchdog = ContainerWatchdog("openfido-run", None, Mock(return_value=False), 10)
+    watchdog.start()
+    assert watchdog.stop() is None
+    assert not kill_mock.called
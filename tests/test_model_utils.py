@@ -1,6 +1,27 @@
+from datetime import datetime
+from types import SimpleNamespace
+
 import pytest
 
-from app.model_utils import RunStateEnum
+from app.model_utils import (
+    ResourceClassEnum,
+    RunPriorityEnum,
+    RunStateEnum,
+    decode_cursor,
+    encode_cursor,
+)
+
+
+def test_resource_class_queue():
+    assert ResourceClassEnum.SMALL.queue() == "celery"
+    assert ResourceClassEnum.MEDIUM.queue() == "pipelines-medium"
+    assert ResourceClassEnum.LARGE.queue() == "pipelines-large"
+
+
+def test_run_priority_promoted():
+    assert RunPriorityEnum.LOW.promoted() == RunPriorityEnum.NORMAL
+    assert RunPriorityEnum.NORMAL.promoted() == RunPriorityEnum.HIGH
+    assert RunPriorityEnum.HIGH.promoted() == RunPriorityEnum.HIGH
 
 
 def test_run_state_is_valid_transition(app):
@@ -54,3 +75,13 @@ def test_run_state_in_final_state(app):
     assert RunStateEnum.FAILED.in_final_state()
     assert RunStateEnum.COMPLETED.in_final_state()
     assert RunStateEnum.CANCELLED.in_final_state()
+
+
+def test_cursor():
+    created_at = datetime(2020, 8, 5, 8, 15, 30, 123456)
+    cursor = encode_cursor(SimpleNamespace(created_at=created_at, id=42))
+    assert decode_cursor(cursor) == (created_at, 42)
+
+    for cursor in ("", "not a cursor", "bm90IGEgY3Vyc29y"):
+        with pytest.raises(ValueError):
+            decode_cursor(cursor)
@@ -0,0 +1,22 @@
+from app.slots import WorkerSlots
+
+
+def test_reserve(tmp_path):
+    slots = WorkerSlots(str(tmp_path / "slots"), 4)
+
+    with slots.reserve(3) as reserved:
+        assert reserved
+        with WorkerSlots(str(tmp_path / "slots"), 4).reserve(2) as other:
+            assert not other
+        with WorkerSlots(str(tmp_path / "slots"), 4).reserve(1) as other:
+            assert other
+
+    # slots are released afterwards
+    with slots.reserve(4) as reserved:
+        assert reserved
+
+    # runs bigger than the host use every slot
+    with slots.reserve(8) as reserved:
+        assert reserved
+        with slots.reserve(1) as other:
+            assert not other
@@ -1,13 +1,63 @@
+import io
+import json
+import os
+import subprocess
+import tarfile
+import threading
 from unittest.mock import Mock, call, patch
-from urllib.error import URLError
+from urllib.error import HTTPError, URLError
 
 import pytest
+from celery.exceptions import Retry
+from urllib3.exceptions import NewConnectionError, ProtocolError
 
+from app.constants import (
+    CELERY_LONG_JOBS,
+    CONTAINER_STATS_INTERVAL,
+    MAX_RUN_TIMEOUT,
+    SLOT_RETRY_DELAY,
+    SLOTS_DIRNAME,
+    WORKER_API_BACKOFF,
+    WORKER_API_RETRIES,
+    WORKER_ARTIFACT_BUNDLE_SIZE,
+    WORKER_CACHE_DIR,
+    WORKER_CONCURRENCY,
+    WORKER_CONSOLE_LIMIT,
+    WORKER_DIRECT_UPLOADS,
+    WORKER_EARLY_UPLOADS,
+    WORKER_RUN_TIMEOUT,
+    WORKER_SLOTS,
+    WORKER_UPLOAD_MIN_RATE,
+    WORKER_UPLOAD_THREADS,
+)
 from app.model_utils import RunStateEnum
-from app.tasks import RunExecutor, execute_pipeline, make_celery
+from app.slots import WorkerSlots
+from app.tasks import (
+    OutputWatcher,
+    RunExecutor,
+    RunHeartbeat,
+    download_inputs,
+    execute_pipeline,
+    file_version,
+    find_outputs,
+    get_http_pool,
+    make_celery,
+    route_task,
+    run_cache_key,
+    run_timeout,
+    upload_outputs,
+    upload_timeout,
+)
 from application_roles.decorators import ROLES_KEY
 
 
+@pytest.fixture(autouse=True)
+def run_heartbeat_mock():
+    # execute_pipeline() tests shouldn't send heartbeats
+    with patch("app.tasks.RunHeartbeat") as heartbeat_mock:
+        yield heartbeat_mock
+
+
 def test_make_celery(app):
     celery = make_celery(app)
 
@@ -16,94 +66,593 @@ def test_make_celery(app):
         return a + b
 
     assert add_numbers.delay(10, 12).wait() == 22
+    assert celery.conf.CELERY_ROUTES == (route_task,)
+    assert celery.conf.CELERY_QUEUE_MAX_PRIORITY == 9
+    assert celery.conf.CELERY_DEFAULT_PRIORITY == 5
+
+
+def test_make_celery_long_jobs(app):
+    app.config[MAX_RUN_TIMEOUT] = 7200
+    celery = make_celery(app)
+    assert celery.conf.CELERY_ACKS_LATE
+    assert celery.conf.CELERY_REJECT_ON_WORKER_LOST
+    assert celery.conf.CELERYD_PREFETCH_MULTIPLIER == 1
+    assert celery.conf.BROKER_TRANSPORT_OPTIONS["visibility_timeout"] > 7200
+
+    app.config[CELERY_LONG_JOBS] = False
+    celery = make_celery(app)
+    assert not celery.conf.CELERY_ACKS_LATE
+    assert celery.conf.CELERYD_PREFETCH_MULTIPLIER == 4
+
+
+def test_make_celery_concurrency(app):
+    assert make_celery(app).conf.CELERYD_POOL != "threads"
+
+    app.config[WORKER_CONCURRENCY] = 8
+    celery = make_celery(app)
+    assert celery.conf.CELERYD_POOL == "threads"
+    assert celery.conf.CELERYD_CONCURRENCY == 8
+
+
+def test_run_timeout(app):
+    app.config[MAX_RUN_TIMEOUT] = 7200
+    assert run_timeout(None) == 7200
+    assert run_timeout(60) == 60
+    assert run_timeout(10000) == 7200
+
+    app.config[WORKER_RUN_TIMEOUT] = 3600
+    assert run_timeout(None) == 3600
 
+    app.config[CELERY_LONG_JOBS] = False
+    app.config[WORKER_RUN_TIMEOUT] = None
+    assert run_timeout(None) is None
+    assert run_timeout(10000) == 10000
 
-@patch("app.tasks.urllib_request.urlopen")
-def test_update_run_status_error(urlopen_mock, app):
-    urlopen_mock.side_effect = URLError("an http error")
+
+def test_route_task():
+    assert route_task("app.tasks.other", [], {}, {}) is None
+    assert route_task("app.tasks.execute_pipeline", [], {}, {}) == {
+        "queue": "celery",
+        "priority": 5,
+    }
+    assert route_task(
+        "app.tasks.execute_pipeline", [], {"resource_class": 4, "priority": 9}, {}
+    ) == {"queue": "pipelines-large", "priority": 9}
+
+
+@patch("app.tasks.run_pipeline")
+def test_execute_pipeline_slots(run_pipeline_mock, app, tmp_path):
+    app.config[WORKER_SLOTS] = 4
+    args = ["uuid", "run_uuid", [], "python:3", "https://github.com/example"]
+
+    with patch("app.tasks.tempfile.gettempdir", return_value=str(tmp_path)):
+        with patch.object(execute_pipeline, "retry", side_effect=Retry()) as retry:
+            slots = WorkerSlots(str(tmp_path / SLOTS_DIRNAME), 4)
+            with slots.reserve(3):
+                # only one slot is free
+                execute_pipeline(*args, "master", "openfido.sh", None, 1)
+                assert run_pipeline_mock.call_count == 1
+                with pytest.raises(Retry):
+                    execute_pipeline(*args, "master", "openfido.sh", None, 2)
+                assert run_pipeline_mock.call_count == 1
+                retry.assert_called_once_with(
+                    kwargs={"redelivered": False},
+                    countdown=SLOT_RETRY_DELAY,
+                    max_retries=None,
+                )
+
+            execute_pipeline(*args, "master", "openfido.sh", None, 2)
+            assert run_pipeline_mock.call_count == 2
+
+
+def test_get_http_pool(app):
+    pool = get_http_pool()
+    assert pool is get_http_pool()
+
+
+@patch("app.tasks._http_pool", None)
+def test_get_http_pool_size(app):
+    # a connection for each thread of every run of the process:
+    app.config[WORKER_UPLOAD_THREADS] = 4
+    app.config[WORKER_CONCURRENCY] = 8
+    assert get_http_pool().connection_pool_kw["maxsize"] == 8 * (4 + 4)
+
+
+@patch("app.tasks.get_http_pool")
+def test_update_run_status_error(pool_mock, app):
+    pool_mock.return_value.request.return_value = Mock(status=400, reason="Bad")
 
     with pytest.raises(URLError):
         executor = RunExecutor("uuid", "run_uuid")
         executor.update_run_status(RunStateEnum.RUNNING)
+    assert pool_mock.return_value.request.call_count == 1
+
 
+@patch("app.tasks.time.sleep")
+@patch("app.tasks.get_http_pool")
+def test_update_run_status_retries(pool_mock, sleep_mock, app):
+    pool_mock.return_value.request.side_effect = [
+        ProtocolError("connection reset"),
+        Mock(status=503, reason="Unavailable"),
+        Mock(status=200),
+    ]
 
-@patch("app.tasks.urllib_request.urlopen")
-def test_update_run_status(urlopen_mock, app):
     executor = RunExecutor("uuid", "run_uuid")
     executor.update_run_status(RunStateEnum.RUNNING)
-    assert urlopen_mock.call_count == 1
-    request = urlopen_mock.call_args_list[0][0][0]
-    assert (
-        request.full_url == "http://example.com/v1/pipelines/uuid/runs/run_uuid/state"
-    )
-    uppered_key = ROLES_KEY[0] + ROLES_KEY[1:].lower()
-    assert uppered_key in request.headers.keys()
-    assert RunStateEnum.RUNNING.name in request.data.decode("utf-8")
+    assert pool_mock.return_value.request.call_count == 3
+    assert sleep_mock.call_args_list == [
+        call(WORKER_API_BACKOFF),
+        call(WORKER_API_BACKOFF * 2),
+    ]
+
+
+@patch("app.tasks.time.sleep")
+@patch("app.tasks.get_http_pool")
+def test_update_run_status_retries_exhausted(pool_mock, sleep_mock, app):
+    pool_mock.return_value.request.side_effect = ProtocolError("connection reset")
+
+    with pytest.raises(ProtocolError):
+        executor = RunExecutor("uuid", "run_uuid")
+        executor.update_run_status(RunStateEnum.RUNNING)
+    assert pool_mock.return_value.request.call_count == WORKER_API_RETRIES + 1
+
+    pool_mock.return_value.request.side_effect = None
+    pool_mock.return_value.request.return_value = Mock(status=503, reason="Busy")
+    with pytest.raises(URLError):
+        executor.update_run_status(RunStateEnum.RUNNING)
+
+
+@patch("app.tasks.time.sleep")
+@patch("app.tasks.get_http_pool")
+def test_restart_run_retries(pool_mock, sleep_mock, app):
+    pool_mock.return_value.request.side_effect = [
+        NewConnectionError(None, "connection refused"),
+        Mock(status=200),
+    ]
+
+    executor = RunExecutor("uuid", "run_uuid")
+    executor.restart_run()
+    assert pool_mock.return_value.request.call_count == 2
 
+    # the request may have been received: don't send it again
+    pool_mock.return_value.request.reset_mock()
+    pool_mock.return_value.request.side_effect = ProtocolError("connection reset")
+    with pytest.raises(ProtocolError):
+        executor.restart_run()
+    assert pool_mock.return_value.request.call_count == 1
+
+    pool_mock.return_value.request.reset_mock()
+    pool_mock.return_value.request.side_effect = None
+    pool_mock.return_value.request.return_value = Mock(status=503, reason="Busy")
+    with pytest.raises(URLError):
+        executor.restart_run()
+    assert pool_mock.return_value.request.call_count == 1
+
+
+def test_upload_timeout():
+    timeout = upload_timeout(WORKER_UPLOAD_MIN_RATE * 60)
+    assert timeout.read_timeout == upload_timeout(0).read_timeout + 60
+
+
+@patch("app.tasks.get_http_pool")
+def test_update_run_status(pool_mock, app):
+    pool_mock.return_value.request.return_value = Mock(status=200)
+
+    executor = RunExecutor("uuid", "run_uuid")
+    executor.update_run_status(RunStateEnum.RUNNING)
+    assert pool_mock.return_value.request.call_count == 1
+    (method, url) = pool_mock.return_value.request.call_args[0]
+    kwargs = pool_mock.return_value.request.call_args[1]
+    assert method == "PUT"
+    assert url == "http://example.com/v1/pipelines/uuid/runs/run_uuid/state"
+    assert ROLES_KEY in kwargs["headers"]
+    assert RunStateEnum.RUNNING.name in kwargs["body"].decode("utf-8")
+
+
+@patch("app.tasks.get_http_pool")
+def test_upload_artifact(pool_mock, app):
+    pool_mock.return_value.request.return_value = Mock(status=200)
 
-@patch("app.tasks.urllib_request.urlopen")
-def test_upload_artifact(urlopen_mock, app):
     executor = RunExecutor("uuid", "run_uuid")
     executor.upload_artifact("example.txt", "tests/sample_db.py")
-    assert urlopen_mock.call_count == 1
-    request = urlopen_mock.call_args_list[0][0][0]
-    assert request.full_url.endswith("run_uuid/artifacts?name=example.txt")
-    uppered_key = ROLES_KEY[0] + ROLES_KEY[1:].lower()
-    assert uppered_key in request.headers.keys()
+    assert pool_mock.return_value.request.call_count == 1
+    (method, url) = pool_mock.return_value.request.call_args[0]
+    kwargs = pool_mock.return_value.request.call_args[1]
+    assert method == "POST"
+    assert url.endswith("run_uuid/artifacts?name=example.txt")
+    assert ROLES_KEY in kwargs["headers"]
+    assert kwargs["headers"]["content-length"] == str(
+        os.path.getsize("tests/sample_db.py")
+    )
+    assert kwargs["timeout"].read_timeout == (
+        upload_timeout(os.path.getsize("tests/sample_db.py")).read_timeout
+    )
+
+
+@patch("app.tasks.get_http_pool")
+def test_upload_artifact_direct(pool_mock, app, tmp_path):
+    app.config[WORKER_DIRECT_UPLOADS] = True
+    (tmp_path / "output.txt").write_bytes(b"output")
+    request_mock = pool_mock.return_value.request
+    request_mock.side_effect = [
+        Mock(
+            status=200,
+            data=b'{"uuid": "123", "upload_id": null, "part_size": 10, "urls": ["https://s3/put"]}',
+        ),
+        Mock(status=200, headers={"ETag": '"abc"'}),
+        Mock(status=200, data=b"{}"),
+    ]
+
+    executor = RunExecutor("uuid", "run_uuid")
+    executor.upload_artifact("output.txt", str(tmp_path / "output.txt"))
+
+    (method, url) = request_mock.call_args_list[0][0]
+    assert (method, url) == (
+        "POST",
+        "http://example.com/v1/pipelines/uuid/runs/run_uuid/artifacts/uploads",
+    )
+    assert json.loads(request_mock.call_args_list[0][1]["body"]) == {
+        "name": "output.txt",
+        "size": 6,
+    }
+
+    assert request_mock.call_args_list[1][0] == ("PUT", "https://s3/put")
+    assert request_mock.call_args_list[1][1]["body"] == b"output"
+    assert request_mock.call_args_list[1][1]["timeout"].read_timeout == (
+        upload_timeout(len(b"output")).read_timeout
+    )
+    assert ROLES_KEY not in (request_mock.call_args_list[1][1]["headers"] or {})
+
+    (method, url) = request_mock.call_args_list[2][0]
+    assert method == "POST"
+    assert url.endswith("run_uuid/artifacts/uploads/123/complete")
+    assert json.loads(request_mock.call_args_list[2][1]["body"]) == {
+        "name": "output.txt"
+    }
+
+
+@patch("app.tasks.get_http_pool")
+def test_upload_artifact_direct_multipart(pool_mock, app, tmp_path):
+    app.config[WORKER_DIRECT_UPLOADS] = True
+    (tmp_path / "output.txt").write_bytes(b"output")
+    request_mock = pool_mock.return_value.request
+    request_mock.side_effect = [
+        Mock(
+            status=200,
+            data=b'{"uuid": "123", "upload_id": "u1", "part_size": 4, "urls": ["https://s3/1", "https://s3/2"]}',
+        ),
+        Mock(status=200, headers={"ETag": '"a"'}),
+        Mock(status=200, headers={"ETag": '"b"'}),
+        Mock(status=200, data=b"{}"),
+    ]
+
+    executor = RunExecutor("uuid", "run_uuid")
+    executor.upload_artifact("output.txt", str(tmp_path / "output.txt"))
+
+    assert request_mock.call_args_list[1][1]["body"] == b"outp"
+    assert request_mock.call_args_list[2][1]["body"] == b"ut"
+    assert json.loads(request_mock.call_args_list[3][1]["body"]) == {
+        "name": "output.txt",
+        "upload_id": "u1",
+        "parts": [{"part_number": 1, "etag": '"a"'}, {"part_number": 2, "etag": '"b"'}],
+    }
+
+
+@patch("app.tasks.RunExecutor._send_json")
+def test_update_run_environment(send_json_mock, app):
+    executor = RunExecutor("uuid", "run_uuid")
+    executor.update_run_environment("python@sha256:456")
+    send_json_mock.assert_called_once_with(
+        "environment", {"docker_image_digest": "python@sha256:456"}
+    )
+
+
+@patch("app.tasks.RunExecutor._make_request")
+def test_get_run_status(request_mock, app):
+    executor = RunExecutor("uuid", "run_uuid")
+    request_mock.return_value = Mock(data=b'{"state": "RUNNING"}')
+    assert executor.get_run_status() == RunStateEnum.RUNNING
+    assert not executor.is_cancelled()
+    request_mock.assert_called_with("state", None, {}, "GET")
+
+    request_mock.return_value = Mock(data=b'{"state": "CANCELLED"}')
+    assert executor.is_cancelled()
+
+
+@patch("app.tasks.RunExecutor._send_json")
+def test_update_run_metrics(send_json_mock, app):
+    executor = RunExecutor("uuid", "run_uuid")
+    with patch("app.tasks.time.monotonic", side_effect=[10, 12.5]):
+        with executor.phase("download") as phase:
+            phase["byte_count"] = 100
+    with pytest.raises(ValueError):
+        with patch("app.tasks.time.monotonic", side_effect=[20, 21]):
+            with executor.phase("run"):
+                raise ValueError("Command returned nonzero code: 1")
+
+    executor.update_run_metrics()
+    send_json_mock.assert_called_once_with(
+        "metrics",
+        {
+            "phases": [
+                {"name": "download", "duration": 2.5, "byte_count": 100},
+                {"name": "run", "duration": 1, "byte_count": None},
+            ],
+            "resources": None,
+        },
+    )
+
+
+@patch("app.tasks.urllib_request.urlretrieve")
+def test_download_inputs(retrieve_mock, app):
+    input_files = [
+        {"name": f"{i}.csv", "url": f"https://example.com/{i}.csv"} for i in range(10)
+    ]
+    download_inputs(input_files, "/tmp/input")
+    assert retrieve_mock.call_count == 10
+    assert call("https://example.com/3.csv", "/tmp/input/3.csv") in (
+        retrieve_mock.call_args_list
+    )
+
+    retrieve_mock.side_effect = URLError("an error")
+    with pytest.raises(URLError):
+        download_inputs(input_files, "/tmp/input")
+
+
+def test_download_inputs_cache(app):
+    input_cache = Mock()
+    download_inputs(
+        [{"name": "a.csv", "url": "https://example.com/a.csv"}],
+        "/tmp/input",
+        input_cache,
+    )
+    input_cache.fetch.assert_called_once_with(
+        "https://example.com/a.csv", "/tmp/input/a.csv"
+    )
+    assert input_cache.evict.called
+
+    input_cache.reset_mock()
+    download_inputs([], "/tmp/input", input_cache)
+    assert not input_cache.evict.called
+
+
+def test_find_outputs(tmp_path):
+    (tmp_path / "b.csv").write_bytes(b"b")
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "c.csv").write_bytes(b"c")
+    (tmp_path / "empty").mkdir()
+
+    assert find_outputs(str(tmp_path)) == [
+        ("b.csv", str(tmp_path / "b.csv")),
+        ("a/c.csv", str(tmp_path / "a" / "c.csv")),
+    ]
+
+
+def test_upload_outputs(app, tmp_path):
+    outputdir = tmp_path / "output"
+    outputdir.mkdir()
+    (outputdir / "sub").mkdir()
+    for i in range(10):
+        (outputdir / "sub" / f"{i}.csv").write_bytes(b"data")
+    executor = Mock()
+
+    upload_outputs(executor, str(outputdir), str(tmp_path))
+    assert executor.upload_artifact.call_count == 10
+    assert call("sub/3.csv", str(outputdir / "sub" / "3.csv")) in (
+        executor.upload_artifact.call_args_list
+    )
+
+    executor.upload_artifact.side_effect = URLError("an error")
+    with pytest.raises(URLError):
+        upload_outputs(executor, str(outputdir), str(tmp_path))
+
+
+def test_upload_outputs_bundle(app, tmp_path):
+    app.config[WORKER_ARTIFACT_BUNDLE_SIZE] = 5
+    outputdir = tmp_path / "output"
+    outputdir.mkdir()
+    (outputdir / "large.csv").write_bytes(b"large data")
+    (outputdir / "a.csv").write_bytes(b"a")
+    (outputdir / "sub").mkdir()
+    (outputdir / "sub" / "b.csv").write_bytes(b"b")
+    executor = Mock()
+
+    upload_outputs(executor, str(outputdir), str(tmp_path))
+    assert sorted(executor.upload_artifact.call_args_list) == [
+        call("large.csv", str(outputdir / "large.csv")),
+        call("outputs.tar.gz", str(tmp_path / "outputs.tar.gz")),
+    ]
+    with tarfile.open(tmp_path / "outputs.tar.gz") as bundle:
+        assert sorted(bundle.getnames()) == ["a.csv", "sub/b.csv"]
+
 
+def test_upload_outputs_uploaded(app, tmp_path):
+    outputdir = tmp_path / "output"
+    outputdir.mkdir()
+    (outputdir / "a.csv").write_bytes(b"a")
+    (outputdir / "b.csv").write_bytes(b"b")
+    (outputdir / "c.csv").write_bytes(b"c")
+    uploaded = {
+        "a.csv": file_version(str(outputdir / "a.csv")),
+        "b.csv": file_version(str(outputdir / "b.csv")),
+    }
+    (outputdir / "b.csv").write_bytes(b"changed")
+    executor = Mock()
 
-class ReturnValue:
-    def __init__(self, value, stdout="", stderr=""):
-        self.returncode = value
-        self.stdout = stdout.encode("ascii")
-        self.stderr = stderr.encode("ascii")
+    upload_outputs(executor, str(outputdir), str(tmp_path), uploaded)
+    assert sorted(executor.upload_artifact.call_args_list) == [
+        call("b.csv", str(outputdir / "b.csv")),
+        call("c.csv", str(outputdir / "c.csv")),
+    ]
 
 
-@patch("app.tasks.subprocess.run")
-def test_run_failure(run_mock, app):
+def test_output_watcher(app, tmp_path):
+    app.config[WORKER_ARTIFACT_BUNDLE_SIZE] = 2
+    (tmp_path / "a.csv").write_bytes(b"data")
+    (tmp_path / "small.csv").write_bytes(b"s")
+    executor = Mock()
+    watcher = OutputWatcher(executor, str(tmp_path), 10)
+
+    # files are uploaded once they haven't changed between scans
+    watcher.scan()
+    assert not executor.upload_artifact.called
+    (tmp_path / "b.csv").write_bytes(b"data")
+    watcher.scan()
+    executor.upload_artifact.assert_called_once_with("a.csv", str(tmp_path / "a.csv"))
+
+    # and only once (unless they change)
+    executor.upload_artifact.side_effect = URLError("an error")
+    watcher.scan()
+    assert executor.upload_artifact.call_args == call("b.csv", str(tmp_path / "b.csv"))
+    executor.upload_artifact.side_effect = None
+    watcher.scan()
+    assert executor.upload_artifact.call_count == 3
+    watcher.scan()
+    assert executor.upload_artifact.call_count == 3
+
+    assert watcher.stop() == {
+        "a.csv": file_version(str(tmp_path / "a.csv")),
+        "b.csv": file_version(str(tmp_path / "b.csv")),
+    }
+
+
+@patch("app.tasks.subprocess.Popen")
+def test_run_failure(popen_mock, app):
     executor = RunExecutor("uuid", "run_uuid")
     executor.update_run_output = Mock()
 
-    run_mock.return_value = ReturnValue(1)
+    popen_mock.return_value = FakeProcess(1, b"", b"an error\n")
 
     with pytest.raises(ValueError):
         executor.run("a command", "/a/dir")
 
-    run_mock.assert_called_once_with(
-        ["a", "command"], cwd="/a/dir", capture_output=True
-    )
-    executor.update_run_output.assert_called()
+    assert popen_mock.call_args[0][0] == ["a", "command"]
+    executor.update_run_output.assert_called_with("", "an error")
 
 
-@patch("app.tasks.subprocess.run")
-def test_run(run_mock, app):
+@patch("app.tasks.subprocess.Popen")
+def test_run(popen_mock, app):
     executor = RunExecutor("uuid", "run_uuid")
     executor.update_run_output = Mock()
 
-    run_mock.return_value = ReturnValue(0)
+    popen_mock.return_value = FakeProcess(0, b"line 1\nline 2\n")
 
     executor.run("a command", "/a/dir")
-    run_mock.assert_called_once_with(
-        ["a", "command"], cwd="/a/dir", capture_output=True
-    )
-    executor.update_run_output.assert_called()
+    assert popen_mock.call_args[0][0] == ["a", "command"]
+    assert popen_mock.call_args[1]["cwd"] == "/a/dir"
+    executor.update_run_output.assert_called_with("line 1\nline 2", "")
+
+
+class FakeProcess:
+    def __init__(self, returncode, stdout=b"", stderr=b""):
+        self.returncode = returncode
+        self.stdout = io.BytesIO(stdout)
+        self.stderr = io.BytesIO(stderr)
+
+    def wait(self):
+        return self.returncode
+
+
+@patch("app.tasks.subprocess.Popen")
+def test_run_stream(popen_mock, app):
+    executor = RunExecutor("uuid", "run_uuid")
+    executor.update_run_output = Mock()
 
+    popen_mock.return_value = FakeProcess(0, b"line 1\nline 2\n", b"an error\n")
 
-@patch("app.tasks.RunExecutor._put")
+    executor.run("a command", "/a/dir", stream=True)
+    assert popen_mock.call_args[0][0] == ["a", "command"]
+    assert popen_mock.call_args[1]["cwd"] == "/a/dir"
+    assert executor.update_run_output.call_args_list[0] == call("Run: a command")
+    executor.update_run_output.assert_called_with("line 1\nline 2", "an error")
+
+
+def test_run_stream_interrupted(app, tmp_path):
+    executor = RunExecutor("uuid", "run_uuid")
+    executor.update_run_output = Mock(side_effect=[None, RuntimeError("an error")])
+    processes = []
+    real_popen = subprocess.Popen
+
+    def popen(*args, **kwargs):
+        processes.append(real_popen(*args, **kwargs))
+        return processes[-1]
+
+    # the command is killed (rather than left blocked on its output) when its
+    # output can't be sent:
+    with patch("app.tasks.subprocess.Popen", side_effect=popen):
+        with pytest.raises(RuntimeError):
+            executor.run("yes", str(tmp_path), stream=True)
+    assert processes[0].poll() is not None
+
+
+def test_run_stream_send_error(app, tmp_path):
+    executor = RunExecutor("uuid", "run_uuid")
+    executor._send_json = Mock(side_effect=[None, URLError("an error"), None])
+
+    # output that couldn't be sent is sent again with the next output:
+    executor.run("echo a", str(tmp_path), stream=True)
+    executor.finish_output()
+    assert executor._send_json.call_count == 3
+    data = executor._send_json.call_args[0][1]
+    assert data["std_out"] == "\na"
+    assert data["std_out_offset"] == len("\nRun: echo a")
+
+
+@patch("app.tasks.subprocess.Popen")
+def test_run_stream_failure(popen_mock, app):
+    executor = RunExecutor("uuid", "run_uuid")
+    executor.update_run_output = Mock()
+
+    popen_mock.return_value = FakeProcess(1)
+
+    with pytest.raises(ValueError):
+        executor.run("a command", "/a/dir", stream=True)
+
+
+@patch("app.tasks.CONSOLE_FLUSH_SIZE", 4)
+@patch("app.tasks.subprocess.Popen")
+def test_run_stream_batches(popen_mock, app):
+    executor = RunExecutor("uuid", "run_uuid")
+    executor.update_run_output = Mock()
+
+    popen_mock.return_value = FakeProcess(0, b"abc\ndef\n")
+
+    executor.run("a command", "/a/dir", stream=True)
+    assert call("abc", "") in executor.update_run_output.call_args_list
+    assert call("def", "") in executor.update_run_output.call_args_list
+
+
+@patch("app.tasks.RunExecutor._send_json")
 def test_update_run_output(request_mock, app):
     executor = RunExecutor("uuid", "run_uuid")
 
     executor.update_run_output("stdout", "stderr")
     request_mock.assert_called_once_with(
-        "console", {"std_out": "\nstdout", "std_err": "\nstderr"}
+        "console",
+        {
+            "std_out": "\nstdout",
+            "std_out_offset": 0,
+            "std_err": "\nstderr",
+            "std_err_offset": 0,
+        },
+        "PATCH",
     )
 
-    # extra calls add data
+    # extra calls only send the new data
     request_mock.reset_mock()
-    executor.update_run_output("more", "and more")
+    executor.update_run_output("more")
     request_mock.assert_called_once_with(
-        "console", {"std_out": "\nstdout\nmore", "std_err": "\nstderr\nand more"}
+        "console",
+        {
+            "std_out": "\nmore",
+            "std_out_offset": 7,
+            "std_err": "",
+            "std_err_offset": 7,
+        },
+        "PATCH",
     )
+    assert executor.stdout_length == 12
+    assert executor.stderr_length == 7
 
     # calls that makes no call
     request_mock.reset_mock()
@@ -111,18 +660,87 @@ def test_update_run_output(request_mock, app):
     assert not request_mock.called
 
 
+@patch("app.tasks.RunExecutor.upload_artifact")
+@patch("app.tasks.RunExecutor._send_json")
+def test_update_run_output_truncated(send_json_mock, upload_artifact_mock, app):
+    app.config[WORKER_CONSOLE_LIMIT] = 20
+    executor = RunExecutor("uuid", "run_uuid")
+
+    executor.update_run_output("0123456789")
+    executor.update_run_output("abcdefghij")
+    executor.update_run_output("ABCDEFGHIJ")
+    # only the head of the output has been sent
+    assert [c[0][1]["std_out"] for c in send_json_mock.call_args_list] == [
+        "\n012345678"
+    ]
+
+    uploaded = []
+    upload_artifact_mock.side_effect = lambda name, path: uploaded.append(
+        (name, open(path).read())
+    )
+    executor.finish_output()
+    assert send_json_mock.call_args[0][1]["std_out"] == (
+        "\n... 13 characters omitted (see the console/std_out.log artifact) ..."
+        "\nABCDEFGHIJ"
+    )
+    assert uploaded == [("console/std_out.log", "\n0123456789\nabcdefghij\nABCDEFGHIJ")]
+    assert executor.console.directory is None
+
+
+@patch("app.tasks.CONSOLE_TAIL_INTERVAL", 0)
+@patch("app.tasks.RunExecutor._send_json")
+def test_update_run_output_tail(send_json_mock, app):
+    app.config[WORKER_CONSOLE_LIMIT] = 20
+    executor = RunExecutor("uuid", "run_uuid")
+
+    # past the head, the tail is sent (and replaced) as it changes
+    executor.update_run_output("0123456789")
+    executor.update_run_output("abc")
+    executor.update_run_output("", "an error")
+    assert [c[0][1] for c in send_json_mock.call_args_list] == [
+        {
+            "std_out": "\n0123456789",
+            "std_out_offset": 0,
+            "std_err": "",
+            "std_err_offset": 0,
+        },
+        {
+            "std_out": "9\nabc",
+            "std_out_offset": 10,
+            "std_err": "",
+            "std_err_offset": 0,
+        },
+        {
+            "std_out": "",
+            "std_out_offset": 15,
+            "std_err": "\nan error",
+            "std_err_offset": 0,
+        },
+    ]
+
+    # the tails are up to date already; output can only be finished once
+    executor.finish_output()
+    executor.finish_output()
+    assert send_json_mock.call_count == 3
+
+
+@patch("app.tasks.RunExecutor.update_run_metrics")
 @patch("app.tasks.RunExecutor.update_run_output")
 @patch("app.tasks.RunExecutor.update_run_status")
 @patch("app.tasks.RunExecutor.run")
+@patch("app.tasks.docker_image_digest")
 @patch("os.path.exists")
 def test_execute_pipeline_no_openfido(
     exists_mock,
+    digest_mock,
     run_mock,
     update_run_status_mock,
     update_run_output_mock,
+    update_run_metrics_mock,
     app,
 ):
     exists_mock.return_value = False
+    digest_mock.return_value = None
 
     execute_pipeline(
         "uuid",
@@ -147,6 +765,7 @@ def test_execute_pipeline_no_openfido(
     assert update_run_status_mock.call_args_list[1] == call(RunStateEnum.FAILED)
 
 
+@patch("app.tasks.RunExecutor.update_run_metrics")
 @patch("app.tasks.RunExecutor.update_run_output")
 @patch("app.tasks.RunExecutor.update_run_status")
 @patch("app.tasks.RunExecutor.run")
@@ -158,6 +777,7 @@ def test_execute_pipeline_urlerror(
     run_mock,
     update_run_status_mock,
     update_run_output_mock,
+    update_run_metrics_mock,
     app,
 ):
     update_run_status_mock.side_effect = URLError("an error")
@@ -182,6 +802,7 @@ def test_execute_pipeline_urlerror(
     assert update_run_status_mock.call_args_list[1] == call(RunStateEnum.FAILED)
 
 
+@patch("app.tasks.RunExecutor.update_run_metrics")
 @patch("app.tasks.RunExecutor.update_run_output")
 @patch("app.tasks.RunExecutor.update_run_status")
 @patch("app.tasks.RunExecutor.run")
@@ -193,6 +814,7 @@ def test_execute_pipeline_valueerror(
     run_mock,
     update_run_status_mock,
     update_run_output_mock,
+    update_run_metrics_mock,
     app,
 ):
     run_mock.side_effect = ValueError("an error")
@@ -217,6 +839,7 @@ def test_execute_pipeline_valueerror(
     assert update_run_status_mock.call_args_list[1] == call(RunStateEnum.FAILED)
 
 
+@patch("app.tasks.RunExecutor.update_run_metrics")
 @patch("app.tasks.RunExecutor.update_run_output")
 @patch("app.tasks.RunExecutor.update_run_status")
 @patch("app.tasks.RunExecutor.run")
@@ -228,6 +851,7 @@ def test_execute_pipeline_unexpectederror(
     run_mock,
     update_run_status_mock,
     update_run_output_mock,
+    update_run_metrics_mock,
     app,
 ):
     run_mock.side_effect = FileNotFoundError()
@@ -252,28 +876,36 @@ def test_execute_pipeline_unexpectederror(
     assert update_run_status_mock.call_args_list[1] == call(RunStateEnum.FAILED)
 
 
+@patch("app.tasks.ContainerWatchdog")
+@patch("app.tasks.ContainerStatsSampler")
+@patch("app.tasks.RunExecutor.update_run_metrics")
 @patch("app.tasks.RunExecutor.update_run_output")
 @patch("app.tasks.RunExecutor.update_run_status")
+@patch("app.tasks.RunExecutor.update_run_environment")
 @patch("app.tasks.RunExecutor.upload_artifact")
 @patch("app.tasks.RunExecutor.run")
+@patch("app.tasks.docker_image_digest")
 @patch("os.path.exists")
-@patch("os.listdir")
-@patch("os.path.isfile")
+@patch("app.tasks.find_outputs")
 @patch("app.tasks.urllib_request.urlretrieve")
 def test_execute_pipeline(
     retrieve_mock,
-    isfile_mock,
-    listdir_mock,
+    find_outputs_mock,
     exists_mock,
+    digest_mock,
     run_mock,
     upload_artifact_mock,
+    update_run_environment_mock,
     update_run_status_mock,
     update_run_output_mock,
+    update_run_metrics_mock,
+    sampler_mock,
+    watchdog_mock,
     app,
 ):
     exists_mock.return_value = True
-    listdir_mock.return_value = ["output.txt"]
-    isfile_mock.return_value = False
+    find_outputs_mock.return_value = [("output.txt", "/tmp/output/output.txt")]
+    digest_mock.return_value = "python@sha256:456"
 
     execute_pipeline(
         "uuid",
@@ -301,14 +933,522 @@ def test_execute_pipeline(
     assert run_mock.call_args_list[4][0][0] == "mkdir output"
     assert run_mock.call_args_list[5][0][0] == "chmod -R 777 ."
     assert run_mock.call_args_list[6][0][0].startswith("docker run --rm")
-    assert " script.sh" in run_mock.call_args_list[6][0][0]
+    assert " python@sha256:456 sh script.sh" in run_mock.call_args_list[6][0][0]
+    assert "--name openfido-run_uuid " in run_mock.call_args_list[6][0][0]
+    sampler_mock.assert_called_once_with("openfido-run_uuid", CONTAINER_STATS_INTERVAL)
+    assert sampler_mock.return_value.stop.call_count == 1
+    assert watchdog_mock.call_args[0][:2] == (
+        "openfido-run_uuid",
+        app.config[MAX_RUN_TIMEOUT],
+    )
+    assert watchdog_mock.return_value.stop.call_count == 1
+    assert run_mock.call_args_list[6][1] == {"stream": True}
+    update_run_environment_mock.assert_called_once_with("python@sha256:456")
 
     assert update_run_status_mock.call_count == 2
     assert update_run_status_mock.call_args_list[0] == call(RunStateEnum.RUNNING)
     assert update_run_status_mock.call_args_list[1] == call(RunStateEnum.COMPLETED)
 
+    assert update_run_metrics_mock.call_count == 1
+
     assert retrieve_mock.call_count == 1
     assert retrieve_mock.call_args_list[0][0][0] == "https://example.com/a%20file.pdf"
 
-    assert upload_artifact_mock.call_count == 1
-    assert upload_artifact_mock.call_args_list[0][0][0] == "output.txt"
+    assert find_outputs_mock.call_args[0][0].endswith("output")
+    upload_artifact_mock.assert_called_once_with("output.txt", "/tmp/output/output.txt")
+
+
+@patch("app.tasks.upload_outputs")
+@patch("app.tasks.OutputWatcher")
+@patch("app.tasks.ContainerWatchdog")
+@patch("app.tasks.ContainerStatsSampler")
+@patch("app.tasks.RunExecutor.update_run_metrics")
+@patch("app.tasks.RunExecutor.update_run_output")
+@patch("app.tasks.RunExecutor.update_run_status")
+@patch("app.tasks.RunExecutor.update_run_environment")
+@patch("app.tasks.RunExecutor.run")
+@patch("app.tasks.docker_image_digest")
+@patch("os.path.exists")
+def test_execute_pipeline_early_uploads(
+    exists_mock,
+    digest_mock,
+    run_mock,
+    update_run_environment_mock,
+    update_run_status_mock,
+    update_run_output_mock,
+    update_run_metrics_mock,
+    sampler_mock,
+    watchdog_mock,
+    watcher_mock,
+    upload_outputs_mock,
+    app,
+):
+    app.config[WORKER_EARLY_UPLOADS] = True
+    exists_mock.return_value = True
+    digest_mock.return_value = None
+    watcher_mock.return_value.stop.return_value = {"output.txt": (4, 1)}
+
+    execute_pipeline(
+        "uuid",
+        "run_uuid",
+        [],
+        "python:3",
+        "https://github.com/example",
+        "master",
+        "script.sh",
+    )
+
+    assert watcher_mock.call_args[0][1].endswith("output")
+    assert watcher_mock.return_value.start.call_count == 1
+    assert watcher_mock.return_value.stop.call_count == 1
+    assert upload_outputs_mock.call_args[0][3] == {"output.txt": (4, 1)}
+    assert update_run_status_mock.call_args == call(RunStateEnum.COMPLETED)
+
+
+@patch("app.tasks.ContainerWatchdog")
+@patch("app.tasks.ContainerStatsSampler")
+@patch("app.tasks.RunExecutor.update_run_metrics")
+@patch("app.tasks.RunExecutor.update_run_output")
+@patch("app.tasks.RunExecutor.update_run_status")
+@patch("app.tasks.RunExecutor.upload_artifact")
+@patch("app.tasks.RunExecutor.run")
+@patch("app.tasks.GitMirrorCache.clone")
+@patch("app.tasks.DockerImageCache.pull")
+@patch("app.tasks.docker_image_digest")
+@patch("os.path.exists")
+@patch("app.tasks.urllib_request.urlretrieve")
+def test_execute_pipeline_cache(
+    retrieve_mock,
+    exists_mock,
+    digest_mock,
+    pull_mock,
+    clone_mock,
+    run_mock,
+    upload_artifact_mock,
+    update_run_status_mock,
+    update_run_output_mock,
+    update_run_metrics_mock,
+    sampler_mock,
+    watchdog_mock,
+    app,
+):
+    app.config[WORKER_CACHE_DIR] = "/var/cache/openfido"
+    exists_mock.return_value = True
+    digest_mock.return_value = None
+
+    execute_pipeline(
+        "uuid",
+        "run_uuid",
+        [],
+        "python:3",
+        "https://github.com/example",
+        "master",
+        "script.sh",
+    )
+
+    assert pull_mock.call_args[0][1] == "python:3"
+    assert clone_mock.call_count == 1
+    (_, url, branch, destination) = clone_mock.call_args[0]
+    assert url == "https://github.com/example"
+    assert branch == "master"
+    assert destination.endswith("gitrepo")
+    assert run_mock.call_args_list[0][0][0] == "git checkout master"
+    assert update_run_status_mock.call_args_list[1] == call(RunStateEnum.COMPLETED)
+
+
+def fail_docker_run(command, directory, stream=False):
+    if command.startswith("docker run"):
+        raise ValueError("Command returned nonzero code: 137")
+
+
+@patch("app.tasks.ContainerWatchdog")
+@patch("app.tasks.ContainerStatsSampler")
+@patch("app.tasks.RunExecutor.update_run_metrics")
+@patch("app.tasks.RunExecutor.update_run_output")
+@patch("app.tasks.RunExecutor.update_run_status")
+@patch("app.tasks.RunExecutor.run")
+@patch("app.tasks.docker_image_digest")
+@patch("os.path.exists")
+def test_execute_pipeline_cancelled(
+    exists_mock,
+    digest_mock,
+    run_mock,
+    update_run_status_mock,
+    update_run_output_mock,
+    update_run_metrics_mock,
+    sampler_mock,
+    watchdog_mock,
+    app,
+):
+    exists_mock.return_value = True
+    digest_mock.return_value = None
+    run_mock.side_effect = fail_docker_run
+    watchdog_mock.return_value.stop.return_value = "cancelled"
+
+    execute_pipeline(
+        "uuid",
+        "run_uuid",
+        [],
+        "python:3",
+        "https://github.com/example",
+        "master",
+        "script.sh",
+    )
+
+    # the run is already CANCELLED: it isn't failed.
+    update_run_status_mock.assert_called_once_with(RunStateEnum.RUNNING)
+    update_run_output_mock.assert_called_with("", "Run cancelled")
+    assert update_run_metrics_mock.call_count == 1
+
+
+@patch("app.tasks.RUN_STATE_POLL_INTERVAL", 0.01)
+@patch("app.containers.kill_container")
+@patch("app.tasks.get_http_pool")
+@patch("app.tasks.ContainerStatsSampler")
+@patch("app.tasks.RunExecutor.update_run_metrics")
+@patch("app.tasks.RunExecutor.update_run_output")
+@patch("app.tasks.RunExecutor.update_run_status")
+@patch("app.tasks.RunExecutor.run")
+@patch("app.tasks.docker_image_digest")
+@patch("os.path.exists")
+def test_execute_pipeline_cancelled_watchdog(
+    exists_mock,
+    digest_mock,
+    run_mock,
+    update_run_status_mock,
+    update_run_output_mock,
+    update_run_metrics_mock,
+    sampler_mock,
+    pool_mock,
+    kill_mock,
+    app,
+):
+    exists_mock.return_value = True
+    digest_mock.return_value = None
+    pool_mock.return_value.request.return_value = Mock(
+        status=200, data=b'{"state": "CANCELLED"}'
+    )
+    killed = threading.Event()
+    kill_mock.side_effect = lambda name: killed.set()
+
+    def run_until_killed(command, directory, stream=False):
+        if command.startswith("docker run"):
+            assert killed.wait(5)
+            raise ValueError("Command returned nonzero code: 137")
+
+    run_mock.side_effect = run_until_killed
+
+    execute_pipeline(
+        "uuid",
+        "run_uuid",
+        [],
+        "python:3",
+        "https://github.com/example",
+        "master",
+        "script.sh",
+    )
+
+    # the watchdog's thread asked the API whether the run was cancelled:
+    kill_mock.assert_called_once_with("openfido-run_uuid")
+    update_run_status_mock.assert_called_once_with(RunStateEnum.RUNNING)
+    update_run_output_mock.assert_called_with("", "Run cancelled")
+
+
+@patch("app.tasks.kill_container")
+@patch("app.tasks.ContainerWatchdog")
+@patch("app.tasks.ContainerStatsSampler")
+@patch("app.tasks.RunExecutor.update_run_metrics")
+@patch("app.tasks.RunExecutor.update_run_output")
+@patch("app.tasks.RunExecutor.update_run_status")
+@patch("app.tasks.RunExecutor.run")
+@patch("app.tasks.docker_image_digest")
+@patch("os.path.exists")
+def test_execute_pipeline_run_error(
+    exists_mock,
+    digest_mock,
+    run_mock,
+    update_run_status_mock,
+    update_run_output_mock,
+    update_run_metrics_mock,
+    sampler_mock,
+    watchdog_mock,
+    kill_mock,
+    app,
+):
+    exists_mock.return_value = True
+    digest_mock.return_value = None
+    watchdog_mock.return_value.stop.return_value = None
+
+    def interrupt_docker_run(command, directory, stream=False):
+        if command.startswith("docker run"):
+            raise RuntimeError("an error")
+
+    run_mock.side_effect = interrupt_docker_run
+
+    execute_pipeline(
+        "uuid",
+        "run_uuid",
+        [],
+        "python:3",
+        "https://github.com/example",
+        "master",
+        "script.sh",
+    )
+
+    # the container doesn't outlive the failed run:
+    kill_mock.assert_called_once_with("openfido-run_uuid")
+    assert update_run_status_mock.call_args == call(RunStateEnum.FAILED)
+
+
+@patch("app.tasks.ContainerWatchdog")
+@patch("app.tasks.ContainerStatsSampler")
+@patch("app.tasks.RunExecutor.update_run_metrics")
+@patch("app.tasks.RunExecutor.update_run_output")
+@patch("app.tasks.RunExecutor.update_run_status")
+@patch("app.tasks.RunExecutor.run")
+@patch("app.tasks.docker_image_digest")
+@patch("os.path.exists")
+def test_execute_pipeline_timeout(
+    exists_mock,
+    digest_mock,
+    run_mock,
+    update_run_status_mock,
+    update_run_output_mock,
+    update_run_metrics_mock,
+    sampler_mock,
+    watchdog_mock,
+    app,
+):
+    app.config[WORKER_RUN_TIMEOUT] = 3600
+    exists_mock.return_value = True
+    digest_mock.return_value = None
+    run_mock.side_effect = fail_docker_run
+    watchdog_mock.return_value.stop.return_value = "timeout"
+
+    execute_pipeline(
+        "uuid",
+        "run_uuid",
+        [],
+        "python:3",
+        "https://github.com/example",
+        "master",
+        "script.sh",
+    )
+    assert watchdog_mock.call_args[0][:2] == ("openfido-run_uuid", 3600)
+    update_run_output_mock.assert_called_with("", "Run timed out after 3600 seconds")
+    assert update_run_status_mock.call_args == call(RunStateEnum.FAILED)
+
+    # pipelines can set their own timeout
+    execute_pipeline(
+        "uuid",
+        "run_uuid",
+        [],
+        "python:3",
+        "https://github.com/example",
+        "master",
+        "script.sh",
+        60,
+    )
+    assert watchdog_mock.call_args[0][:2] == ("openfido-run_uuid", 60)
+
+
+@patch("app.tasks.RunExecutor.update_run_output")
+@patch("app.tasks.RunExecutor.update_run_status")
+@patch("app.tasks.RunExecutor.run")
+def test_execute_pipeline_already_started(
+    run_mock, update_run_status_mock, update_run_output_mock, app
+):
+    # another worker started the run first
+    update_run_status_mock.side_effect = HTTPError("url", 400, "Bad Request", {}, None)
+
+    execute_pipeline(
+        "uuid",
+        "run_uuid",
+        [],
+        "python:3",
+        "https://github.com/example",
+        "master",
+        "openfido.sh",
+    )
+
+    update_run_status_mock.assert_called_once_with(RunStateEnum.RUNNING)
+    assert not run_mock.called
+    assert not update_run_output_mock.called
+
+
+@patch("app.tasks.kill_container")
+@patch("app.tasks.RunExecutor.update_run_metrics")
+@patch("app.tasks.RunExecutor.update_run_output")
+@patch("app.tasks.RunExecutor.restart_run")
+@patch("app.tasks.RunExecutor.get_run_status")
+@patch("app.tasks.RunExecutor.update_run_status")
+@patch("app.tasks.RunExecutor.run")
+def test_execute_pipeline_redelivered(
+    run_mock,
+    update_run_status_mock,
+    get_run_status_mock,
+    restart_run_mock,
+    update_run_output_mock,
+    update_run_metrics_mock,
+    kill_container_mock,
+    run_heartbeat_mock,
+    app,
+):
+    # the worker that started the run died
+    update_run_status_mock.side_effect = [
+        HTTPError("url", 400, "Bad Request", {}, None),
+        None,
+    ]
+    get_run_status_mock.return_value = RunStateEnum.RUNNING
+    run_mock.side_effect = ValueError("pull failed")
+
+    execute_pipeline(
+        "uuid",
+        "run_uuid",
+        [],
+        "python:3",
+        "https://github.com/example",
+        "master",
+        "openfido.sh",
+        redelivered=True,
+    )
+
+    assert restart_run_mock.call_count == 1
+    kill_container_mock.assert_called_once_with("openfido-run_uuid")
+    assert run_mock.call_args[0][0] == "docker pull python:3"
+    assert update_run_status_mock.call_args_list == [
+        call(RunStateEnum.RUNNING),
+        call(RunStateEnum.FAILED),
+    ]
+    assert run_heartbeat_mock.return_value.start.call_count == 1
+    assert run_heartbeat_mock.return_value.stop.call_count == 1
+
+
+@patch("app.tasks.kill_container")
+@patch("app.tasks.RunExecutor.restart_run")
+@patch("app.tasks.RunExecutor.get_run_status")
+@patch("app.tasks.RunExecutor.update_run_status")
+@patch("app.tasks.RunExecutor.run")
+def test_execute_pipeline_redelivered_alive(
+    run_mock,
+    update_run_status_mock,
+    get_run_status_mock,
+    restart_run_mock,
+    kill_container_mock,
+    run_heartbeat_mock,
+    app,
+):
+    update_run_status_mock.side_effect = HTTPError("url", 400, "Bad Request", {}, None)
+    get_run_status_mock.return_value = RunStateEnum.RUNNING
+    # the run's worker is still sending heartbeats
+    restart_run_mock.side_effect = HTTPError("url", 400, "Bad Request", {}, None)
+
+    execute_pipeline(
+        "uuid",
+        "run_uuid",
+        [],
+        "python:3",
+        "https://github.com/example",
+        "master",
+        "openfido.sh",
+        redelivered=True,
+    )
+
+    assert not kill_container_mock.called
+    assert not run_mock.called
+    assert not run_heartbeat_mock.called
+
+
+@patch("app.tasks.worker_ip", return_value="10.0.0.1")
+@patch("app.tasks.RunExecutor.send_heartbeat")
+def test_run_heartbeat(send_heartbeat_mock, worker_ip_mock, app):
+    executor = RunExecutor("uuid", "run_uuid")
+    heartbeat = RunHeartbeat(executor, 0.01)
+    heartbeat.start()
+    heartbeat.stop()
+    heartbeat.join(5)
+
+    assert not heartbeat.is_alive()
+    send_heartbeat_mock.assert_called_with("10.0.0.1")
+
+    # failed heartbeats are only logged
+    send_heartbeat_mock.side_effect = URLError("timed out")
+    heartbeat = RunHeartbeat(executor, 0.01)
+    heartbeat.start()
+    heartbeat.stop()
+    heartbeat.join(5)
+    assert not heartbeat.is_alive()
+
+
+@patch("app.tasks.RunExecutor._send_json")
+def test_send_heartbeat(send_json_mock, app):
+    RunExecutor("uuid", "run_uuid").send_heartbeat("10.0.0.1")
+    send_json_mock.assert_called_once_with("heartbeat", {"worker_ip": "10.0.0.1"})
+
+
+def test_run_cache_key(tmp_path):
+    (tmp_path / "a.csv").write_bytes(b"1,2")
+    key = run_cache_key("python@sha256:123", "abc123", "openfido.sh", str(tmp_path))
+    assert len(key) == 64
+    assert key == run_cache_key(
+        "python@sha256:123", "abc123", "openfido.sh", str(tmp_path)
+    )
+    assert key != run_cache_key(
+        "python@sha256:123", "abc124", "openfido.sh", str(tmp_path)
+    )
+
+    (tmp_path / "a.csv").write_bytes(b"1,3")
+    assert key != run_cache_key(
+        "python@sha256:123", "abc123", "openfido.sh", str(tmp_path)
+    )
+
+
+@patch("app.tasks.RunExecutor._send_json")
+def test_check_run_cache(send_json_mock, app):
+    send_json_mock.return_value = Mock(data=b'{"cached_run_uuid": "123"}')
+    assert RunExecutor("uuid", "run_uuid").check_run_cache("a" * 64) == "123"
+    send_json_mock.assert_called_once_with("cache", {"cache_key": "a" * 64})
+
+
+@patch("app.tasks.RunExecutor.check_run_cache")
+@patch("app.tasks.git_commit")
+@patch("app.tasks.RunExecutor.update_run_metrics")
+@patch("app.tasks.RunExecutor.update_run_output")
+@patch("app.tasks.RunExecutor.update_run_status")
+@patch("app.tasks.RunExecutor.update_run_environment")
+@patch("app.tasks.RunExecutor.run")
+@patch("app.tasks.docker_image_digest")
+@patch("os.path.exists")
+def test_execute_pipeline_cached(
+    exists_mock,
+    digest_mock,
+    run_mock,
+    update_run_environment_mock,
+    update_run_status_mock,
+    update_run_output_mock,
+    update_run_metrics_mock,
+    git_commit_mock,
+    check_run_cache_mock,
+    app,
+):
+    exists_mock.return_value = True
+    digest_mock.return_value = "python@sha256:456"
+    git_commit_mock.return_value = "abc123"
+    check_run_cache_mock.return_value = "cached_run_uuid"
+
+    execute_pipeline(
+        "uuid",
+        "run_uuid",
+        [],
+        "python:3",
+        "https://github.com/example",
+        "master",
+        "openfido.sh",
+        use_run_cache=True,
+    )
+
+    assert len(check_run_cache_mock.call_args[0][0]) == 64
+    # the API completed the run
+    update_run_status_mock.assert_called_once_with(RunStateEnum.RUNNING)
+    assert not any(c[0][0].startswith("docker run") for c in run_mock.call_args_list)
+    assert update_run_metrics_mock.call_count == 1
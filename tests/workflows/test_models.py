@@ -1,9 +1,12 @@
+from app.model_utils import RunStateEnum
 from app.workflows.models import (
     db,
     Workflow,
     WorkflowPipeline,
     WorkflowPipelineDependency,
+    WorkflowRun,
 )
+from app.workflows.services import create_workflow_run_state
 
 
 def test_workflow_pipeline(app, workflow):
@@ -33,3 +36,24 @@ def test_workflow_pipeline(app, workflow_line, pipeline):
 
     # the pipelines themselves can see all their associated workflow pipelines
     assert set(pipeline.workflow_pipelines) == set([pipeline_a, pipeline_b, pipeline_c])
+
+
+def test_workflow_run_current_state(app, workflow):
+    workflow_run = WorkflowRun(workflow=workflow)
+    workflow_run.workflow_run_states.append(
+        create_workflow_run_state(RunStateEnum.NOT_STARTED)
+    )
+    db.session.add(workflow_run)
+    db.session.commit()
+
+    assert workflow_run.run_state_enum() == RunStateEnum.NOT_STARTED
+
+    workflow_run.workflow_run_states.append(
+        create_workflow_run_state(RunStateEnum.FAILED)
+    )
+    db.session.commit()
+
+    assert workflow_run.run_state_enum() == RunStateEnum.FAILED
+    assert WorkflowRun.query.filter(
+        WorkflowRun.current_state == RunStateEnum.FAILED.value
+    ).all() == [workflow_run]
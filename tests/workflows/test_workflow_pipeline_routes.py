@@ -8,6 +8,39 @@ from app.workflows.services import create_workflow_pipeline
 from marshmallow.exceptions import ValidationError
 
 
+def test_list_workflow_pipelines_queries(
+    client, client_application, pipeline, workflow_line, count_queries
+):
+    db.session.commit()
+    # (read before commits expire them, so that reloading them isn't counted)
+    url = f"/v1/workflows/{workflow_line.uuid}/pipelines"
+    headers = {ROLES_KEY: client_application.api_key}
+
+    def list_workflow_pipelines():
+        with count_queries() as statements:
+            result = client.get(url, content_type="application/json", headers=headers)
+        assert result.status_code == 200
+        return statements
+
+    # (the first request also loads the run state types)
+    list_workflow_pipelines()
+    statements = list_workflow_pipelines()
+
+    last_uuid = workflow_line.workflow_pipelines[-1].uuid
+    for _ in range(3):
+        last_uuid = create_workflow_pipeline(
+            workflow_line.uuid,
+            {
+                "pipeline_uuid": pipeline.uuid,
+                "source_workflow_pipelines": [last_uuid],
+                "destination_workflow_pipelines": [],
+            },
+        ).uuid
+
+    # their pipelines and dependencies are loaded for the whole page at once:
+    assert len(list_workflow_pipelines()) == len(statements)
+
+
 @patch("app.workflows.workflow_pipeline_routes.create_workflow_pipeline")
 def test_create_workflow_pipeline_failure(
     create_workflow_pipeline_mock, client, client_application, workflow
@@ -190,6 +190,31 @@ def test_list_workflows(client, client_application):
     assert result.json[1]["name"] == p2.name
 
 
+def test_list_workflows_pages(client, client_application):
+    workflows = [
+        Workflow(name=f"workflow {i}", description="a description") for i in range(3)
+    ]
+    db.session.add_all(workflows)
+    db.session.commit()
+
+    result = client.get(
+        "/v1/workflows?limit=2",
+        content_type="application/json",
+        headers={ROLES_KEY: client_application.api_key},
+    )
+    assert result.status_code == 200
+    assert [w["uuid"] for w in result.json] == [w.uuid for w in workflows[:2]]
+
+    result = client.get(
+        f"/v1/workflows?limit=2&after={result.headers['X-Next-Cursor']}",
+        content_type="application/json",
+        headers={ROLES_KEY: client_application.api_key},
+    )
+    assert result.status_code == 200
+    assert [w["uuid"] for w in result.json] == [workflows[2].uuid]
+    assert "X-Next-Cursor" not in result.headers
+
+
 def test_search_workflows_validation(client, client_application, workflow):
     db.session.commit()
     result = client.post(
@@ -2,8 +2,9 @@ from unittest.mock import patch
 
 from app.model_utils import RunStateEnum
 from app.utils import to_iso8601
-from app.workflows.models import Workflow, db
+from app.workflows.models import Workflow, WorkflowPipeline, db
 from app.workflows.queries import find_workflow
+from app.workflows.services import create_workflow_run
 from marshmallow.exceptions import ValidationError
 from application_roles.decorators import ROLES_KEY
 
@@ -110,6 +111,10 @@ def test_start_workflow(client, client_application, workflow_pipeline):
                 "pipeline_run": {
                     "uuid": pipeline_run.uuid,
                     "sequence": pipeline_run.sequence,
+                    "priority": "NORMAL",
+                    "docker_image_digest": None,
+                    "started_at": None,
+                    "completed_at": None,
                     "inputs": [],
                     "states": [
                         {
@@ -126,6 +131,13 @@ def test_start_workflow(client, client_application, workflow_pipeline):
                         },
                     ],
                     "artifacts": [],
+                    "phases": [],
+                    "resources": {
+                        "peak_memory_bytes": None,
+                        "cpu_seconds": None,
+                        "block_read_bytes": None,
+                        "block_write_bytes": None,
+                    },
                     "created_at": to_iso8601(pipeline_run.created_at),
                 },
             }
@@ -157,6 +169,10 @@ def test_start_workflow(client, client_application, workflow_pipeline):
                 "pipeline_run": {
                     "uuid": pipeline_run.uuid,
                     "sequence": pipeline_run.sequence,
+                    "priority": "NORMAL",
+                    "docker_image_digest": None,
+                    "started_at": None,
+                    "completed_at": None,
                     "inputs": [],
                     "states": [
                         {
@@ -173,6 +189,13 @@ def test_start_workflow(client, client_application, workflow_pipeline):
                         },
                     ],
                     "artifacts": [],
+                    "phases": [],
+                    "resources": {
+                        "peak_memory_bytes": None,
+                        "cpu_seconds": None,
+                        "block_read_bytes": None,
+                        "block_write_bytes": None,
+                    },
                     "created_at": to_iso8601(pipeline_run.created_at),
                 },
             }
@@ -180,3 +203,37 @@ def test_start_workflow(client, client_application, workflow_pipeline):
         "created_at": to_iso8601(workflow_run.created_at),
         "updated_at": to_iso8601(workflow_run.updated_at),
     }
+
+
+@patch("app.pipelines.services.execute_pipeline")
+def test_get_workflow_run_queries(
+    execute_pipeline_mock,
+    client,
+    client_application,
+    pipeline,
+    workflow_line,
+    count_queries,
+):
+    single_workflow = Workflow(name="a single pipeline", description="a description")
+    db.session.add(WorkflowPipeline(workflow=single_workflow, pipeline=pipeline))
+    db.session.commit()
+
+    def get_run(workflow):
+        workflow_run = create_workflow_run(
+            workflow.uuid, {"callback_url": "https://example.com", "inputs": []}
+        )
+        db.session.commit()
+        # (read after the commit expires them, so that reloading them isn't
+        # counted)
+        url = f"/v1/workflows/{workflow.uuid}/runs/{workflow_run.uuid}"
+        headers = {ROLES_KEY: client_application.api_key}
+        with count_queries() as statements:
+            result = client.get(url, content_type="application/json", headers=headers)
+        assert result.status_code == 200
+        return statements
+
+    # (the first request also loads the run state types)
+    get_run(single_workflow)
+
+    # the pipeline runs of a workflow run are loaded at once:
+    assert len(get_run(workflow_line)) == len(get_run(single_workflow))